@@ -0,0 +1,145 @@
+"""
+Benchmark del chunker nativo frente a RecursiveCharacterTextSplitter
+
+Uso:
+    python benchmarks/bench_chunking.py --mb 20
+    python benchmarks/bench_chunking.py --file documento.txt --chunk-size 2000 --chunk-overlap 200
+
+Compara el camino anterior (espacios colapsados con ' '.join(text.split()) y
+RecursiveCharacterTextSplitter a chunk_size × 4 caracteres), el mismo splitter
+midiendo en tokens y el nuevo (normalize_text + split_text, tamaño en tokens). El texto sintético imita un
+PDF extraído: párrafos, frases y líneas cortadas a ~90 caracteres. Los tamaños
+de chunk se miden en tokens con el mismo estimador para ambos.
+
+Requiere langchain-text-splitters (requirements-dev.txt).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+from helpers.chunking import SENTENCE_END, estimate_tokens, iter_text_chunks, normalize_text, split_text  # noqa: E402
+
+
+WORDS = (
+    "el la los las de del que en un una por para con sobre entre documento contrato cliente factura "
+    "importe vencimiento cláusula servicio proveedor responsabilidad información procesamiento "
+    "confidencialidad indemnización 2024 15 3,5 % S.A. art. núm. anexo"
+).split()
+
+
+def synthetic_text(megabytes: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    pages, size = [], 0
+    while size < target:
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = [
+                ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 35))).capitalize() + rng.choice('..?!:')
+                for _ in range(rng.randint(2, 9))
+            ]
+            paragraph, line, lines = ' '.join(sentences), '', []
+            for word in paragraph.split(' '):
+                if len(line) + len(word) > 90:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}" if line else word
+            lines.append(line)
+            paragraphs.append('\n'.join(lines))
+        page = '\n\n'.join(paragraphs)
+        pages.append(page)
+        size += len(page)
+    return '\n'.join(pages)
+
+
+def legacy_chunks(text, chunk_size, chunk_overlap):
+    text = ' '.join(text.replace('\x00', '').split())
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size * 4,
+        chunk_overlap=chunk_overlap * 4,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    return splitter.split_text(text)
+
+
+def legacy_token_chunks(text, chunk_size, chunk_overlap):
+    # El mismo splitter midiendo en tokens: la alternativa directa dentro de LangChain
+    text = ' '.join(text.replace('\x00', '').split())
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=estimate_tokens,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    return splitter.split_text(text)
+
+
+def native_chunks(text, chunk_size, chunk_overlap):
+    return [chunk.text for chunk in split_text(normalize_text(text), chunk_size, chunk_overlap)]
+
+
+def iter_pages(text, page_chars=3000):
+    # "Páginas" de ~3000 caracteres cortadas en un salto de línea, como llegan de iter_pdf_pages
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start + page_chars)
+        end = len(text) if end == -1 else end
+        yield text[start:end]
+        start = end + 1
+
+
+def native_stream_chunks(text, chunk_size, chunk_overlap):
+    pages = (normalize_text(page) for page in iter_pages(text))
+    return [chunk.text for chunk in iter_text_chunks(pages, chunk_size, chunk_overlap)]
+
+
+def describe(name, chunks, elapsed, text_chars, chunk_size):
+    sizes = sorted(estimate_tokens(chunk) for chunk in chunks)
+    quantile = lambda q: sizes[min(len(sizes) - 1, int(q * len(sizes)))]  # noqa: E731
+    sentence_ends = sum(1 for chunk in chunks if chunk.rstrip()[-1:] in SENTENCE_END)
+    over = sum(1 for size in sizes if size > chunk_size)
+    print(f"{name:<16} {elapsed:>7.2f} {text_chars / elapsed / 1e6:>7.1f} {len(chunks) / elapsed:>9.0f} {len(chunks):>7} "
+          f"{quantile(0.05):>5} {quantile(0.5):>5} {quantile(0.95):>5} {sizes[-1]:>5} {statistics.pstdev(sizes):>6.0f} "
+          f"{100 * over / len(sizes):>6.1f}% {100 * sentence_ends / len(chunks):>6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=float, default=20, help='Tamaño del texto sintético')
+    parser.add_argument('--file', help='Texto real en lugar del sintético')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Tokens (PDF_CHUNK_SIZE)')
+    parser.add_argument('--chunk-overlap', type=int, default=200, help='Tokens (PDF_CHUNK_OVERLAP)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding='utf-8', errors='replace') as text_file:
+            text = text_file.read()
+    else:
+        text = synthetic_text(args.mb)
+    print(f"Texto: {len(text) / 1e6:.1f} M caracteres, ~{estimate_tokens(text) / 1e6:.2f} M tokens; "
+          f"chunk {args.chunk_size} tokens, solape {args.chunk_overlap}")
+    print(f"{'splitter':<16} {'seg':>7} {'MB/s':>7} {'chunks/s':>9} {'chunks':>7} "
+          f"{'p5':>5} {'p50':>5} {'p95':>5} {'max':>5} {'desv':>6} {'>tam':>7} {'frase':>7}")
+
+    for name, function in (
+        ('langchain', legacy_chunks),
+        ('langchain tokens', legacy_token_chunks),
+        ('nativo', native_chunks),
+        ('nativo stream', native_stream_chunks),
+    ):
+        start = time.perf_counter()
+        chunks = function(text, args.chunk_size, args.chunk_overlap)
+        elapsed = time.perf_counter() - start
+        describe(name, chunks, elapsed, len(text), args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark del motor de embeddings concurrente contra un cliente Bedrock falso
+
+Uso:
+    python benchmarks/bench_embedding_engine.py --chunks 300 --latency 0.12 --quota 16
+
+El cliente falso simula la latencia de invoke_model y devuelve ThrottlingException
+cuando se supera la cuota de peticiones simultáneas, igual que Bedrock bajo carga.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+from helpers.embedding_engine import run_embedding_jobs, invoke_titan_embedding  # noqa: E402
+
+
+class FakeThrottlingException(Exception):
+
+    def __init__(self):
+        super().__init__("Too many requests, please wait before trying again.")
+        self.response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+class FakeBedrockClient:
+
+    def __init__(self, latency: float, quota: int, dimensions: int = 1024):
+        self.latency = latency
+        self.quota = quota
+        self.dimensions = dimensions
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        with self._lock:
+            self.calls += 1
+            if self.quota and self.in_flight >= self.quota:
+                self.throttled += 1
+                raise FakeThrottlingException()
+            self.in_flight += 1
+
+        try:
+            time.sleep(self.latency)
+            payload = json.loads(body)
+            seed = len(payload.get('inputText', ''))
+            embedding = [((seed + i) % 97) / 97.0 for i in range(self.dimensions)]
+            return {'body': io.BytesIO(json.dumps({'embedding': embedding}).encode('utf-8'))}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run(chunks: int, latency: float, quota: int, concurrency: int) -> dict:
+    client = FakeBedrockClient(latency, quota)
+    payloads = [
+        {"inputText": f"chunk {i} " * (i % 50 + 1), "embeddingConfig": {"outputEmbeddingLength": 1024}}
+        for i in range(chunks)
+    ]
+
+    start = time.perf_counter()
+    embeddings = run_embedding_jobs(
+        payloads,
+        lambda payload: invoke_titan_embedding(client, "amazon.titan-embed-image-v1", payload),
+        concurrency=concurrency,
+        base_delay=latency / 2
+    )
+    elapsed = time.perf_counter() - start
+
+    assert len(embeddings) == chunks and all(embeddings), "Faltan embeddings"
+    for payload, embedding in zip(payloads, embeddings):
+        assert embedding[0] == (len(payload['inputText']) % 97) / 97.0, "Orden de resultados incorrecto"
+
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "chunks_per_second": chunks / elapsed,
+        "calls": client.calls,
+        "throttled": client.throttled
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1, help="Latencia simulada por llamada (s)")
+    parser.add_argument('--quota', type=int, default=16, help="Peticiones simultáneas antes de throttling (0 = sin límite)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    print(f"{'concurrencia':>12} {'segundos':>9} {'chunks/s':>9} {'speedup':>8} {'llamadas':>9} {'throttled':>9}")
+    baseline = None
+    for concurrency in args.concurrency:
+        result = run(args.chunks, args.latency, args.quota, concurrency)
+        baseline = baseline or result['chunks_per_second']
+        print(
+            f"{result['concurrency']:>12} {result['seconds']:>9.2f} {result['chunks_per_second']:>9.1f} "
+            f"{result['chunks_per_second'] / baseline:>7.1f}x {result['calls']:>9} {result['throttled']:>9}"
+        )
+
+
+if __name__ == '__main__':
+    main()
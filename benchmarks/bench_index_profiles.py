@@ -0,0 +1,204 @@
+"""
+Benchmark de perfiles de índice vectorial: recall@10, latencia y memoria frente a fuerza bruta exacta
+
+Uso (requiere faiss-cpu, el mismo motor HNSW que usa OpenSearch con engine faiss):
+    pip install faiss-cpu
+    python benchmarks/bench_index_profiles.py --docs 20000 --queries 200
+    python benchmarks/bench_index_profiles.py --profiles faiss-fp16,compact --ef-search 32,64,128
+
+Cada perfil de helpers.index_profiles se construye sobre un corpus sintético
+agrupado en temas (como los chunks de un tenant) con su propia dimensión, y
+los vectores pasan por encode_vectors igual que en la indexación real. El
+recall se mide contra el top-10 exacto en NumPy (float32, coseno) de ese
+mismo corpus, así que refleja la pérdida del grafo HNSW y de la cuantización;
+la pérdida semántica de pedir a Titan 384 o 256 dimensiones solo se ve
+evaluando con embeddings reales (--embeddings, matriz .npy de 1024-d).
+
+El perfil default (nmslib) se aproxima con HNSW plano de faiss: mismo
+algoritmo y memoria; OpenSearch Serverless no expone nmslib fuera del servicio.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+from helpers.index_profiles import INDEX_PROFILES, encode_vectors, estimate_index_memory, vector_spec_from_profile  # noqa: E402
+
+K = 10
+
+
+def build_synthetic_corpus(docs, queries, topics, dimensions, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    assignments = rng.integers(0, topics, size=docs)
+    corpus = centers[assignments] + 1.5 * rng.standard_normal((docs, dimensions)).astype(np.float32)
+    # Preguntas cercanas a documentos existentes, como las de los usuarios
+    targets = rng.choice(docs, size=queries, replace=False)
+    questions = corpus[targets] + 1.0 * rng.standard_normal((queries, dimensions)).astype(np.float32)
+    return corpus, questions
+
+
+def exact_top_k(corpus, questions, k):
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    questions = questions / np.linalg.norm(questions, axis=1, keepdims=True)
+    latencies = []
+    results = []
+    for question in questions:
+        start = time.perf_counter()
+        scores = corpus @ question
+        top = np.argpartition(-scores, k)[:k]
+        results.append(top[np.argsort(-scores[top])])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(results), latencies
+
+
+def build_faiss_index(faiss, profile, vectors):
+    dimensions = profile["dimension"]
+    metric = faiss.METRIC_INNER_PRODUCT
+    if profile["encoder"] == 'fp16':
+        index = faiss.IndexHNSWSQ(dimensions, faiss.ScalarQuantizer.QT_fp16, profile["m"], metric)
+    elif profile["data_type"] == 'byte':
+        # Lo que hace OpenSearch con data_type byte en faiss: SQ int8 directo, sin reescalar
+        index = faiss.IndexHNSWSQ(dimensions, faiss.ScalarQuantizer.QT_8bit_direct_signed, profile["m"], metric)
+    else:
+        index = faiss.IndexHNSWFlat(dimensions, profile["m"], metric)
+
+    index.hnsw.efConstruction = profile["ef_construction"]
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def recall(found, expected):
+    return np.mean([len(set(row) & set(truth)) / len(truth) for row, truth in zip(found, expected)])
+
+
+def run_profile(faiss, name, profile, corpus, questions, truth, ef_search_values):
+    spec = vector_spec_from_profile(profile)
+    if spec["space_type"] == 'cosinesimil':
+        # nmslib normaliza internamente; aquí se emula con producto interno sobre vectores unitarios
+        spec = dict(spec, space_type='innerproduct')
+    start = time.perf_counter()
+    index = build_faiss_index(faiss, profile, encode_vectors(corpus, spec))
+    build_seconds = time.perf_counter() - start
+    serialized_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+
+    encoded_questions = np.ascontiguousarray(encode_vectors(questions, spec), dtype=np.float32)
+    rows = []
+    for ef_search in ef_search_values or [profile["ef_search"]]:
+        index.hnsw.efSearch = ef_search
+        latencies = []
+        found = []
+        for question in encoded_questions:
+            start = time.perf_counter()
+            _, ids = index.search(question.reshape(1, -1), K)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append(ids[0])
+        rows.append({
+            "profile": name,
+            "dim": profile["dimension"],
+            "m": profile["m"],
+            "ef_search": ef_search,
+            f"recall@{K}": round(float(recall(found, truth)), 3),
+            "p50_ms": round(percentile(latencies, 0.5), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "build_s": round(build_seconds, 1),
+            "index_mb": round(serialized_mb, 1),
+            "est_mb": round(estimate_index_memory(profile, len(corpus)) / 1024 / 1024, 1)
+        })
+    return rows
+
+
+def print_table(rows):
+    headers = list(rows[0].keys())
+    widths = {header: max(len(header), *(len(str(row[header])) for row in rows)) for header in headers}
+    print("  ".join(f"{header:>{widths[header]}}" for header in headers))
+    for row in rows:
+        print("  ".join(f"{str(row[header]):>{widths[header]}}" for header in headers))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', default=','.join(INDEX_PROFILES), help='Perfiles separados por coma')
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--topics', type=int, default=50)
+    parser.add_argument('--ef-search', default='', help='Valores de ef_search a barrer (por defecto el del perfil)')
+    parser.add_argument('--m', type=int, help='Sobrescribe m en todos los perfiles')
+    parser.add_argument('--ef-construction', type=int, help='Sobrescribe ef_construction en todos los perfiles')
+    parser.add_argument('--embeddings', help='Matriz .npy de embeddings reales (1024-d) en lugar del corpus sintético')
+    parser.add_argument('--threads', type=int, default=1, help='Hilos de faiss (1 = latencia por consulta comparable)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    try:
+        import faiss
+    except ImportError:
+        parser.error('este benchmark necesita faiss-cpu: pip install faiss-cpu')
+    faiss.omp_set_num_threads(args.threads)
+
+    ef_search_values = [int(value) for value in args.ef_search.split(',') if value]
+    names = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    for name in names:
+        if name not in INDEX_PROFILES:
+            parser.error(f"perfil desconocido: {name}. Opciones: {', '.join(INDEX_PROFILES)}")
+
+    real_embeddings = np.load(args.embeddings).astype(np.float32) if args.embeddings else None
+    corpora = {}
+    rows = []
+    baseline = []
+    for name in names:
+        profile = dict(INDEX_PROFILES[name])
+        if args.m:
+            profile["m"] = args.m
+        if args.ef_construction:
+            profile["ef_construction"] = args.ef_construction
+
+        dimensions = profile["dimension"]
+        if dimensions not in corpora:
+            if real_embeddings is not None:
+                if real_embeddings.shape[1] != dimensions:
+                    print(f"⚠️ {name}: embeddings de {real_embeddings.shape[1]} dimensiones, el perfil pide {dimensions}; se omite")
+                    continue
+                rng = np.random.default_rng(args.seed)
+                picks = rng.choice(len(real_embeddings), size=min(args.queries, len(real_embeddings) // 10), replace=False)
+                mask = np.ones(len(real_embeddings), dtype=bool)
+                mask[picks] = False
+                corpus, questions = real_embeddings[mask], real_embeddings[picks]
+            else:
+                corpus, questions = build_synthetic_corpus(args.docs, args.queries, args.topics, dimensions, args.seed)
+            truth, latencies = exact_top_k(corpus, questions, K)
+            corpora[dimensions] = (corpus, questions, truth)
+            baseline.append({
+                "dim": dimensions,
+                "docs": len(corpus),
+                "p50_ms": round(percentile(latencies, 0.5), 3),
+                "p95_ms": round(percentile(latencies, 0.95), 3),
+                "mb": round(corpus.astype(np.float32).nbytes / 1024 / 1024, 1)
+            })
+
+        corpus, questions, truth = corpora[dimensions]
+        print(f"🔨 {name}: {len(corpus)} vectores de {dimensions} dimensiones")
+        rows.extend(run_profile(faiss, name, profile, corpus, questions, truth, ef_search_values))
+
+    if baseline:
+        print("\nFuerza bruta exacta (NumPy, float32)")
+        print_table(baseline)
+    if rows:
+        print(f"\nPerfiles HNSW (recall@{K} frente a la fuerza bruta de su dimensión)")
+        print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
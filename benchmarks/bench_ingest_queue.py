@@ -0,0 +1,254 @@
+"""
+Harness local de la ingesta encolada: cola SQS en memoria + poller que imita el event source mapping
+
+Uso:
+    python benchmarks/bench_ingest_queue.py --files 2000 --batch-size 4 --max-concurrency 10
+    python benchmarks/bench_ingest_queue.py --files 2000 --mode direct   # una Lambda por archivo
+
+Se invoca el lambda_handler real de process.py con eventos SQS que envuelven
+notificaciones de S3; solo process_file se sustituye por una carga simulada:
+cada archivo tarda un tiempo log-normal y ocupa una "ranura" de Bedrock. Con
+más archivos en vuelo que --bedrock-capacity, el archivo falla por throttling
+(como cuando se agotan los reintentos de boto3). Los archivos con "corrupto"
+en el nombre fallan siempre y deben terminar en la DLQ.
+
+Los tiempos se expresan en segundos simulados; --time-scale los comprime
+(0.01 = un segundo simulado dura 10 ms) y los resultados se reportan en
+archivos/minuto simulados.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+import process  # noqa: E402
+
+
+class InMemorySQSQueue:
+    """
+    Semántica mínima de SQS estándar: visibilidad, recuento de recepciones y redrive a DLQ
+    """
+
+    def __init__(self, visibility_timeout, max_receive_count, clock):
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.clock = clock
+        self.messages = deque()
+        self.in_flight = {}
+        self.dead_letters = []
+        self.lock = threading.Lock()
+
+    def send(self, body):
+        with self.lock:
+            self.messages.append({"messageId": str(uuid.uuid4()), "body": body, "receive_count": 0, "visible_at": 0.0})
+
+    def receive(self, max_messages):
+        now = self.clock()
+        batch = []
+        with self.lock:
+            # Los mensajes cuya visibilidad expiró vuelven a la cola
+            for message_id, message in list(self.in_flight.items()):
+                if message["visible_at"] <= now:
+                    del self.in_flight[message_id]
+                    self.messages.append(message)
+
+            for _ in range(len(self.messages)):
+                if len(batch) >= max_messages:
+                    break
+                message = self.messages.popleft()
+                if message["visible_at"] > now:
+                    self.messages.append(message)
+                    continue
+                if message["receive_count"] >= self.max_receive_count:
+                    self.dead_letters.append(message)
+                    continue
+                message["receive_count"] += 1
+                message["visible_at"] = now + self.visibility_timeout
+                self.in_flight[message["messageId"]] = message
+                batch.append(message)
+        return batch
+
+    def delete(self, message_id):
+        with self.lock:
+            self.in_flight.pop(message_id, None)
+
+    def pending(self):
+        with self.lock:
+            return len(self.messages) + len(self.in_flight)
+
+
+class SimulatedWorkload:
+    """
+    Sustituto de process_file: duración log-normal y capacidad limitada de Bedrock
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.active = 0
+        self.lock = threading.Lock()
+        self.stats = {"processed": 0, "throttled": 0, "poison": 0, "attempts": 0}
+        self.processed_keys = set()
+        self.last_success = None
+
+    def process_file(self, s3_client, bucket_name, object_key, tenant_id, document_type, filename, extension, object_size=None, extraction_workers=None):
+        with self.lock:
+            self.stats["attempts"] += 1
+            self.active += 1
+            throttled = self.active > self.args.bedrock_capacity
+        try:
+            if 'corrupto' in filename:
+                time.sleep(0.5 * self.args.time_scale)
+                with self.lock:
+                    self.stats["poison"] += 1
+                return {"success": False, "message": "PDF corrupto"}
+            if throttled:
+                # boto3 reintenta con backoff antes de rendirse
+                time.sleep(self.args.throttle_seconds * self.args.time_scale)
+                with self.lock:
+                    self.stats["throttled"] += 1
+                return {"success": False, "message": "ThrottlingException"}
+            seconds = random.lognormvariate(self.args.file_seconds_mu, 0.6)
+            time.sleep(seconds * self.args.time_scale)
+            with self.lock:
+                self.stats["processed"] += 1
+                self.processed_keys.add(object_key)
+                self.last_success = time.monotonic()
+            return {"success": True, "message": "Archivo procesado correctamente"}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def s3_notification(key, size=250000):
+    return json.dumps({"Records": [{
+        "eventSource": "aws:s3",
+        "s3": {"bucket": {"name": "bench"}, "object": {"key": key, "size": size}}
+    }]})
+
+
+def make_keys(args):
+    keys = []
+    for index in range(args.files):
+        name = f"corrupto-{index:05d}.pdf" if index < args.poison else f"doc-{index:05d}.pdf"
+        keys.append(f"uploads/cliente_{index % args.tenants:03d}/general/{name}")
+    random.shuffle(keys)
+    return keys
+
+
+def run_sqs(args, workload):
+    clock = lambda: time.monotonic() / args.time_scale  # noqa: E731
+    queue = InMemorySQSQueue(args.visibility_timeout, args.max_receive_count, clock)
+    for key in make_keys(args):
+        queue.send(s3_notification(key))
+
+    invocations = {"count": 0, "failed_items": 0}
+    lock = threading.Lock()
+
+    def poller():
+        # Cada poller es una "invocación concurrente" del event source mapping
+        while queue.pending():
+            deadline = clock() + args.batching_window
+            batch = queue.receive(args.batch_size)
+            while len(batch) < args.batch_size and clock() < deadline and queue.pending() > len(batch):
+                time.sleep(0.05 * args.time_scale)
+                batch += queue.receive(args.batch_size - len(batch))
+            if not batch:
+                time.sleep(0.5 * args.time_scale)
+                continue
+
+            event = {"Records": [
+                {"messageId": message["messageId"], "body": message["body"], "eventSource": "aws:sqs"}
+                for message in batch
+            ]}
+            try:
+                response = process.lambda_handler(event, None)
+                failed = {item["itemIdentifier"] for item in response.get("batchItemFailures", [])}
+            except Exception:
+                failed = {message["messageId"] for message in batch}
+            for message in batch:
+                if message["messageId"] not in failed:
+                    queue.delete(message["messageId"])
+            with lock:
+                invocations["count"] += 1
+                invocations["failed_items"] += len(failed)
+
+    with ThreadPoolExecutor(max_workers=args.max_concurrency) as executor:
+        for _ in range(args.max_concurrency):
+            executor.submit(poller)
+
+    return {"invocations": invocations["count"], "failed_items": invocations["failed_items"], "dlq": len(queue.dead_letters)}
+
+
+def run_direct(args, workload):
+    # Notificación S3 → Lambda asíncrona: todos los archivos a la vez, 2 reintentos y se descartan
+    lost = []
+    lock = threading.Lock()
+
+    def invoke(key):
+        for attempt in range(3):
+            if attempt:
+                time.sleep(60 * attempt * args.time_scale)
+            process.lambda_handler(json.loads(s3_notification(key)), None)
+            if key in workload.processed_keys:
+                return
+        with lock:
+            lost.append(key)
+
+    keys = make_keys(args)
+    with ThreadPoolExecutor(max_workers=min(len(keys), args.direct_concurrency)) as executor:
+        list(executor.map(invoke, keys))
+    return {"invocations": workload.stats["attempts"], "lost": len(lost)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=('sqs', 'direct'), default='sqs')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--poison', type=int, default=5, help='Archivos que fallan siempre')
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--max-concurrency', type=int, default=10)
+    parser.add_argument('--batching-window', type=float, default=10, help='Segundos simulados')
+    parser.add_argument('--visibility-timeout', type=float, default=300, help='Segundos simulados')
+    parser.add_argument('--max-receive-count', type=int, default=3)
+    parser.add_argument('--bedrock-capacity', type=int, default=48, help='Archivos en vuelo antes de throttling')
+    parser.add_argument('--file-seconds-mu', type=float, default=2.5, help='Media log-normal (ln s) por archivo: 2.5 ≈ 12 s')
+    parser.add_argument('--throttle-seconds', type=float, default=20)
+    parser.add_argument('--direct-concurrency', type=int, default=1000)
+    parser.add_argument('--time-scale', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    workload = SimulatedWorkload(args)
+    # Sin AWS: el cliente S3 no se usa porque process_file está simulado; se silencian los logs por archivo
+    with mock.patch.object(process, 'process_file', workload.process_file), \
+            mock.patch.object(process, 'get_s3_client', lambda: None), \
+            mock.patch('builtins.print'):
+        start = time.monotonic()
+        result = run_sqs(args, workload) if args.mode == 'sqs' else run_direct(args, workload)
+        elapsed = (time.monotonic() - start) / args.time_scale
+
+    processed = workload.stats["processed"]
+    # El ritmo sostenido se mide hasta el último archivo bueno; la cola final son los corruptos agotando reintentos
+    busy = ((workload.last_success or start) - start) / args.time_scale
+    print(f"Modo {args.mode}: {args.files} archivos ({args.poison} corruptos)")
+    if args.mode == 'sqs':
+        print(f"  Lotes de {args.batch_size}, concurrencia máxima {args.max_concurrency} → hasta {args.batch_size * args.max_concurrency} archivos en vuelo")
+    print(f"  Procesados: {processed}  throttled: {workload.stats['throttled']}  intentos: {workload.stats['attempts']}")
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+    print(f"  Tiempo simulado: {busy / 60:.1f} min procesando ({elapsed / 60:.1f} min hasta vaciar) → {processed / max(busy, 1e-9) * 60:.0f} archivos/min sostenidos")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Harness de corpus para comparar backends de extracción PDF
+
+Uso:
+    python benchmarks/bench_pdf_backends.py                       # corpus sintético
+    python benchmarks/bench_pdf_backends.py --corpus ./pdfs       # PDFs reales
+    python benchmarks/bench_pdf_backends.py --backends pypdf2 pypdfium2
+
+Cada backend extrae cada PDF en un intérprete nuevo para que el pico de RSS
+sea comparable. Se reportan páginas/segundo, pico de RSS y paridad de texto
+frente al backend de referencia (número de caracteres y solapamiento de palabras).
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..', 'functions'))
+
+
+def run_extraction(backend: str, pdf_path: str, text_path: str):
+    # Modo worker: se ejecuta en un proceso limpio lanzado por main()
+    from helpers.pdf_extraction import iter_pdf_pages
+
+    start = time.perf_counter()
+    pages = list(iter_pdf_pages(pdf_path, workers=1, backend=backend))
+    elapsed = time.perf_counter() - start
+
+    with open(text_path, 'w', encoding='utf-8') as text_file:
+        text_file.write('\n'.join(pages))
+
+    print(json.dumps({
+        "pages": len(pages),
+        "seconds": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def word_overlap(reference: str, candidate: str) -> float:
+    reference_words = Counter(reference.split())
+    candidate_words = Counter(candidate.split())
+    total = max(sum(reference_words.values()), sum(candidate_words.values()))
+    if not total:
+        return 1.0
+    return sum((reference_words & candidate_words).values()) / total
+
+
+def build_synthetic_corpus(directory: str):
+    from synthetic_pdf import build_synthetic_pdf
+
+    paths = []
+    for pages in (20, 150, 500):
+        path = os.path.join(directory, f"synthetic_{pages}p.pdf")
+        with open(path, 'wb') as pdf_file:
+            pdf_file.write(build_synthetic_pdf(pages, seed=pages))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help="Directorio con PDFs (por defecto se genera un corpus sintético)")
+    parser.add_argument('--backends', nargs='+', default=['pypdf2', 'pypdfium2', 'pdfminer'])
+    parser.add_argument('--reference', default='pypdf2', help="Backend contra el que se mide la paridad")
+    parser.add_argument('--worker', nargs=3, metavar=('BACKEND', 'PDF', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_extraction(*args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf_paths = sorted(glob.glob(os.path.join(args.corpus, '*.pdf'))) if args.corpus else build_synthetic_corpus(work_dir)
+        backends = [args.reference] + [backend for backend in args.backends if backend != args.reference]
+
+        print(f"{'archivo':<28} {'backend':<10} {'páginas':>7} {'pág/s':>8} {'RSS MB':>7} {'caracteres':>11} {'ratio chars':>11} {'palabras':>9}")
+        totals = {backend: {"pages": 0, "seconds": 0.0, "peak_rss_mb": 0.0} for backend in backends}
+
+        for pdf_path in pdf_paths:
+            reference_text = None
+            for backend in backends:
+                text_path = os.path.join(work_dir, f"{backend}.txt")
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--worker', backend, pdf_path, text_path],
+                    capture_output=True, text=True
+                )
+                if completed.returncode != 0:
+                    error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'error'
+                    print(f"{os.path.basename(pdf_path)[:28]:<28} {backend:<10} ERROR: {error}")
+                    continue
+
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                with open(text_path, encoding='utf-8') as text_file:
+                    text = text_file.read()
+                reference_text = text if reference_text is None else reference_text
+
+                totals[backend]["pages"] += result["pages"]
+                totals[backend]["seconds"] += result["seconds"]
+                totals[backend]["peak_rss_mb"] = max(totals[backend]["peak_rss_mb"], result["peak_rss_mb"])
+
+                char_ratio = len(text) / len(reference_text) if reference_text else 0.0
+                print(
+                    f"{os.path.basename(pdf_path)[:28]:<28} {backend:<10} {result['pages']:>7} "
+                    f"{result['pages'] / max(result['seconds'], 1e-9):>8.1f} {result['peak_rss_mb']:>7.0f} "
+                    f"{len(text):>11} {char_ratio:>11.3f} {word_overlap(reference_text, text):>9.3f}"
+                )
+
+        print("\nResumen")
+        for backend, total in totals.items():
+            if total["seconds"]:
+                print(f"  {backend:<10} {total['pages'] / total['seconds']:>8.1f} pág/s  pico RSS {total['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
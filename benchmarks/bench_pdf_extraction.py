@@ -0,0 +1,55 @@
+"""
+Benchmark de extracción de texto PDF en paralelo frente a número de procesos
+
+Uso:
+    python benchmarks/bench_pdf_extraction.py --pages 400 --workers 1 2 4 8
+
+Genera un PDF sintético, lo escribe en un fichero temporal (igual que
+process_pdf_streaming) y mide páginas/segundo para cada número de workers.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+from helpers.pdf_extraction import iter_pdf_pages  # noqa: E402
+from synthetic_pdf import build_synthetic_pdf  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--pages-per-range', type=int, default=16)
+    parser.add_argument('--backend', default='pypdf2')
+    args = parser.parse_args()
+
+    pdf_bytes = build_synthetic_pdf(args.pages)
+    print(f"PDF sintético: {args.pages} páginas, {len(pdf_bytes) / 1024:.0f} KB, {os.cpu_count()} CPUs")
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf_file:
+        pdf_file.write(pdf_bytes)
+        pdf_file.flush()
+
+        print(f"{'workers':>8} {'segundos':>9} {'páginas/s':>10} {'speedup':>8} {'caracteres':>11}")
+        baseline = None
+        reference_text = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            pages = list(iter_pdf_pages(pdf_file.name, workers, args.backend, args.pages_per_range))
+            elapsed = time.perf_counter() - start
+
+            text = '\n'.join(pages)
+            reference_text = reference_text or text
+            assert len(pages) == args.pages, "Número de páginas incorrecto"
+            assert text == reference_text, "El texto paralelo no coincide con la extracción en serie"
+
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {args.pages / elapsed:>10.1f} {baseline / elapsed:>7.1f}x {len(text):>11}")
+
+
+if __name__ == '__main__':
+    main()
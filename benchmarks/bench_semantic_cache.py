@@ -0,0 +1,74 @@
+"""
+Benchmark de la caché semántica de respuestas con preguntas parafraseadas sintéticas
+
+Uso:
+    python benchmarks/bench_semantic_cache.py --intents 200 --queries 5000 --noise 0.25
+
+Cada "intención" es un vector base; sus paráfrasis son el vector más ruido
+gaussiano. Se mide hit-rate, falsos aciertos (respuesta de otra intención) y
+la latencia de búsqueda frente a la generación simulada del LLM.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+from helpers.semantic_cache import SemanticAnswerCache  # noqa: E402
+
+
+def run(intents: int, queries: int, noise: float, threshold: float, max_entries: int, dimensions: int, llm_latency: float, seed: int):
+    rng = np.random.default_rng(seed)
+    bases = rng.standard_normal((intents, dimensions)).astype(np.float32)
+    bases /= np.linalg.norm(bases, axis=1, keepdims=True)
+
+    cache = SemanticAnswerCache(dimensions, max_entries=max_entries, max_age_seconds=3600)
+    # Popularidad tipo Zipf: unas pocas preguntas concentran la mayoría del tráfico
+    popularity = 1 / np.arange(1, intents + 1)
+    popularity /= popularity.sum()
+
+    hits = 0
+    false_hits = 0
+    lookup_seconds = 0.0
+    for intent in rng.choice(intents, size=queries, p=popularity):
+        embedding = bases[intent] + rng.standard_normal(dimensions).astype(np.float32) * noise / np.sqrt(dimensions)
+
+        start = time.perf_counter()
+        hit = cache.lookup(embedding, 'sources', threshold)
+        lookup_seconds += time.perf_counter() - start
+
+        if hit:
+            hits += 1
+            false_hits += hit['answer'] != f"respuesta-{intent}"
+        else:
+            cache.put(embedding, 'sources', f"respuesta-{intent}")
+
+    misses = queries - hits
+    uncached_seconds = queries * llm_latency
+    cached_seconds = misses * llm_latency + lookup_seconds
+    print(f"Intenciones: {intents}, consultas: {queries}, ruido: {noise}, umbral: {threshold}, capacidad: {max_entries}")
+    print(f"Hit-rate: {hits / queries:.1%} ({hits} aciertos, {false_hits} falsos)")
+    print(f"Búsqueda media: {lookup_seconds / queries * 1000:.3f} ms")
+    print(f"Tiempo LLM estimado: {uncached_seconds:.1f}s sin caché → {cached_seconds:.1f}s con caché")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--intents', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--noise', type=float, default=0.25)
+    parser.add_argument('--threshold', type=float, default=0.92)
+    parser.add_argument('--max-entries', type=int, default=512)
+    parser.add_argument('--dimensions', type=int, default=1024)
+    parser.add_argument('--llm-latency', type=float, default=2.5, help='Segundos por generación con Nova Pro')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    run(args.intents, args.queries, args.noise, args.threshold, args.max_entries, args.dimensions, args.llm_latency, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Evaluación offline de recuperación: recall@k y latencia de kNN frente a híbrido (BM25 + kNN)
+
+Uso con un corpus sintético en memoria (sin AWS):
+    python benchmarks/eval_retrieval.py --synthetic --docs 2000 --queries 400
+
+Uso contra un índice real (requiere OPENSEARCH_ENDPOINT y credenciales):
+    python benchmarks/eval_retrieval.py --eval-set eval.jsonl --tenant-id cliente_abc
+
+Cada línea de eval.jsonl: {"question": "...", "relevant": ["uploads/.../factura.pdf", "FAC-00123"]}.
+Un documento recuperado es relevante si su source_file coincide o su contenido
+contiene alguno de los valores de "relevant".
+
+En el modo sintético cada documento tiene un identificador exacto (como un
+número de factura) y un vector propio. Las preguntas por identificador tienen
+un embedding que solo captura el tema, como ocurre con los modelos reales, y
+las parafraseadas no comparten palabras con el documento.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+
+from helpers.retrieval import fuse_results  # noqa: E402
+
+MODES = ('knn', 'hybrid')
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+class InMemoryIndex:
+    """
+    Réplica local de las dos ramas de búsqueda: coseno exacto y BM25 (k1=1.2, b=0.75)
+    """
+
+    def __init__(self, documents, embeddings, k1=1.2, b=0.75):
+        self.documents = documents
+        self.embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for doc_index, document in enumerate(documents):
+            terms = Counter(tokenize(document['content']))
+            self.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((doc_index, frequency))
+        self.average_length = sum(self.lengths) / max(len(self.lengths), 1)
+
+    def _hit(self, doc_index, score):
+        return {"_id": str(doc_index), "_score": float(score), "_source": self.documents[doc_index]}
+
+    def knn(self, embedding, size):
+        scores = self.embeddings @ (embedding / np.linalg.norm(embedding))
+        top = np.argsort(-scores)[:size]
+        return [self._hit(doc_index, scores[doc_index]) for doc_index in top]
+
+    def lexical(self, question, size):
+        scores = defaultdict(float)
+        total = len(self.documents)
+        for term in set(tokenize(question)):
+            postings = self.postings.get(term, [])
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_index, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_index] / self.average_length)
+                scores[doc_index] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:size]
+        return [self._hit(doc_index, score) for doc_index, score in top]
+
+
+def build_synthetic_corpus(docs, queries, topics, dimensions, seed):
+    rng = np.random.default_rng(seed)
+    topic_vectors = rng.standard_normal((topics, dimensions))
+    topic_words = [f"tema{topic} materia{topic} asunto{topic}" for topic in range(topics)]
+
+    documents = []
+    embeddings = np.zeros((docs, dimensions), dtype=np.float32)
+    for doc_index in range(docs):
+        topic = doc_index % topics
+        embeddings[doc_index] = topic_vectors[topic] + 0.6 * rng.standard_normal(dimensions)
+        documents.append({
+            "content": f"Factura FAC-{doc_index:05d} {topic_words[topic]} detalle{doc_index} importe pendiente de pago",
+            "source_file": f"uploads/sintetico/general/doc-{doc_index:05d}.pdf"
+        })
+
+    eval_set = []
+    for query_index, doc_index in enumerate(rng.choice(docs, size=queries, replace=False)):
+        topic = doc_index % topics
+        if query_index % 2 == 0:
+            # Identificador exacto: el embedding solo refleja el tema
+            question = f"cuánto vale la FAC-{doc_index:05d}"
+            embedding = topic_vectors[topic] + 0.6 * rng.standard_normal(dimensions)
+        else:
+            # Paráfrasis sin palabras en común: solo la rama vectorial puede acertar
+            question = "qué saldo queda por abonar de aquel comprobante"
+            embedding = embeddings[doc_index] + 0.3 * rng.standard_normal(dimensions)
+        eval_set.append({
+            "question": question,
+            "embedding": embedding,
+            "relevant": [documents[doc_index]["source_file"]],
+            "kind": "identifier" if query_index % 2 == 0 else "paraphrase"
+        })
+
+    return documents, embeddings, eval_set
+
+
+def is_relevant(document, relevant):
+    return any(value == document.get('source_file') or value in document.get('content', '') for value in relevant)
+
+
+def recall_at_k(documents, relevant, k):
+    return 1.0 if any(is_relevant(document, relevant) for document in documents[:k]) else 0.0
+
+
+def summarize(results, ks):
+    rows = []
+    for mode in MODES:
+        mode_results = [result for result in results if result["mode"] == mode]
+        if not mode_results:
+            continue
+        latencies = sorted(result["latency_ms"] for result in mode_results)
+        row = {"mode": mode, "queries": len(mode_results)}
+        for k in ks:
+            row[f"recall@{k}"] = round(sum(result[f"recall@{k}"] for result in mode_results) / len(mode_results), 3)
+        row["p50_ms"] = round(latencies[len(latencies) // 2], 2)
+        row["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2)
+        rows.append(row)
+    return rows
+
+
+def print_table(title, rows):
+    if not rows:
+        return
+    print(f"\n{title}")
+    headers = list(rows[0].keys())
+    print("  ".join(f"{header:>10}" for header in headers))
+    for row in rows:
+        print("  ".join(f"{str(row[header]):>10}" for header in headers))
+
+
+def run_synthetic(args, config, ks):
+    documents, embeddings, eval_set = build_synthetic_corpus(args.docs, args.queries, args.topics, args.dimensions, args.seed)
+    index = InMemoryIndex(documents, embeddings)
+    size = max(ks)
+    candidates = max(size, config["candidates"])
+
+    results = []
+    for item in eval_set:
+        for mode in MODES:
+            start = time.perf_counter()
+            if mode == 'knn':
+                hits = index.knn(item["embedding"], size)
+            else:
+                hits = fuse_results(index.knn(item["embedding"], candidates), index.lexical(item["question"], candidates), config)[:size]
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            retrieved = [hit["_source"] for hit in hits]
+            result = {"mode": mode, "kind": item["kind"], "latency_ms": latency_ms}
+            for k in ks:
+                result[f"recall@{k}"] = recall_at_k(retrieved, item["relevant"], k)
+            results.append(result)
+    return results
+
+
+def run_live(args, ks):
+    from helpers.rag_helpers import get_multimodal_embeddings
+    from helpers.opensearch_indexing import opensearch_query, get_tenant_vector_spec
+
+    with open(args.eval_set, encoding='utf-8') as eval_file:
+        eval_set = [json.loads(line) for line in eval_file if line.strip()]
+
+    dimensions = get_tenant_vector_spec(args.tenant_id)["dimension"]
+
+    results = []
+    for item in eval_set:
+        # El embedding se calcula una vez: solo se compara el coste de la búsqueda
+        embedding = get_multimodal_embeddings(base64_image=None, input_text=item["question"], dimensions=dimensions)[0]
+        for mode in MODES:
+            start = time.perf_counter()
+            search_result = opensearch_query(embedding, args.tenant_id, args.document_type, question=item["question"], mode=mode, size=max(ks))
+            latency_ms = (time.perf_counter() - start) * 1000
+            if not search_result.get('success'):
+                raise ValueError(search_result.get('message'))
+
+            result = {"mode": mode, "kind": item.get("kind", "all"), "latency_ms": latency_ms}
+            for k in ks:
+                result[f"recall@{k}"] = recall_at_k(search_result["documents"], item["relevant"], k)
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--synthetic', action='store_true', help='Corpus sintético en memoria (sin AWS)')
+    parser.add_argument('--eval-set', help='JSONL con question y relevant para evaluar contra OpenSearch')
+    parser.add_argument('--tenant-id')
+    parser.add_argument('--document-type')
+    parser.add_argument('--k', default='1,5,10', help='Valores de k separados por coma')
+    parser.add_argument('--fusion', choices=('rrf', 'weighted'), default='rrf')
+    parser.add_argument('--knn-weight', type=float, default=1.0)
+    parser.add_argument('--lexical-weight', type=float, default=1.0)
+    parser.add_argument('--rrf-k', type=int, default=60)
+    parser.add_argument('--candidates', type=int, default=20)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=400)
+    parser.add_argument('--topics', type=int, default=20)
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    ks = [int(k) for k in args.k.split(',')]
+
+    if args.eval_set:
+        if not args.tenant_id:
+            parser.error('--eval-set requiere --tenant-id')
+        # La configuración de fusión del tenant (TENANT_SETTINGS / entorno) es la que aplica opensearch_query
+        results = run_live(args, ks)
+    else:
+        config = {
+            "fusion": args.fusion,
+            "knn_weight": args.knn_weight,
+            "lexical_weight": args.lexical_weight,
+            "rrf_k": args.rrf_k,
+            "candidates": args.candidates
+        }
+        print(f"Corpus sintético: {args.docs} documentos, {args.queries} preguntas, fusión {args.fusion}")
+        results = run_synthetic(args, config, ks)
+
+    print_table("Global", summarize(results, ks))
+    for kind in sorted({result["kind"] for result in results}):
+        if kind != "all":
+            print_table(f"Preguntas {kind}", summarize([result for result in results if result["kind"] == kind], ks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Generador de PDFs sintéticos de texto para benchmarks (sin dependencias externas)
+"""
+import random
+
+WORDS = (
+    "contrato cliente factura plazo pago importe servicio proveedor cláusula anexo "
+    "documento fecha entrega garantía condiciones vigencia penalización responsable "
+    "artículo sección informe resultado trimestre ventas inventario producto referencia"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_lines(page_number: int, lines_per_page: int, rng: random.Random):
+    yield f"Pagina {page_number} - Informe sintetico"
+    for line in range(lines_per_page - 1):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 14))]
+        if line % 9 == 0:
+            words.append(f"REF-{page_number:04d}-{line:02d}")
+        yield ' '.join(words) + '.'
+
+
+def build_synthetic_pdf(pages: int, lines_per_page: int = 45, seed: int = 7) -> bytes:
+    """
+    Construye un PDF de `pages` páginas con texto Latin-1 (fuente Helvetica estándar)
+    """
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for page_number in range(1, pages + 1):
+        commands = ["BT", "/F1 10 Tf", "13 TL", "40 800 Td"]
+        for line in _page_lines(page_number, lines_per_page, rng):
+            commands.append(f"({_escape(line)}) Tj T*")
+        commands.append("ET")
+        stream = '\n'.join(commands).encode('latin-1')
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>".encode('latin-1')
+        ))
+
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode('latin-1')
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('latin-1')
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for object_id, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return bytes(output)
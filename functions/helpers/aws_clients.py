@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+from opensearchpy import OpenSearch, RequestsHttpConnection
+from requests_aws4auth import AWS4Auth
+
+
+DEFAULT_REGION = 'us-east-1'
+
+# Sin credenciales refrescables (p.ej. variables de entorno) se reconstruye el firmante por precaución
+STATIC_CREDENTIALS_MAX_AGE_SECONDS = 45 * 60
+
+# Registro a nivel de módulo: sobrevive entre invocaciones en contenedores calientes
+_clients: Dict[tuple, object] = {}
+_lock = threading.Lock()
+
+_session: Optional[boto3.Session] = None
+
+_opensearch_client: Optional[OpenSearch] = None
+_opensearch_created_at = 0.0
+_opensearch_refreshable = False
+
+
+def _reset_after_fork():
+    # Los procesos hijos (extracción PDF en paralelo) no deben compartir sockets ni locks del padre
+    global _session, _lock, _opensearch_client
+    _clients.clear()
+    _session = None
+    _opensearch_client = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_session() -> boto3.Session:
+    global _session
+    if _session is None:
+        _session = boto3.Session()
+    return _session
+
+
+def get_client(service_name: str, region: str = DEFAULT_REGION, config: Config = None, config_key: str = 'default', endpoint_url: str = None):
+    """
+    Devuelve un cliente boto3 reutilizable para el servicio indicado
+
+    Los clientes boto3 son thread-safe, así que una misma instancia se comparte
+    entre hilos y entre invocaciones de la Lambda caliente.
+
+    Args:
+        service_name: Servicio AWS (bedrock-runtime, s3, rekognition...)
+        region: Región AWS
+        config: Configuración botocore usada solo al crear el cliente
+        config_key: Nombre que distingue clientes del mismo servicio con distinta configuración
+        endpoint_url: Endpoint explícito (p.ej. la API de gestión de WebSocket de un stage)
+    """
+    key = (service_name, region, config_key, endpoint_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            base_config = Config(tcp_keepalive=True)
+            client = _get_session().client(
+                service_name,
+                region_name=region,
+                endpoint_url=endpoint_url,
+                config=base_config.merge(config) if config else base_config
+            )
+            _clients[key] = client
+            print(f"🔌 Cliente {service_name} ({config_key}) creado")
+    return client
+
+
+def get_bedrock_runtime_client(config: Config = None, config_key: str = 'default'):
+    return get_client('bedrock-runtime', config=config, config_key=config_key)
+
+
+def get_rekognition_client():
+    return get_client('rekognition')
+
+
+def get_s3_client():
+    return get_client('s3', region=os.environ.get('AWS_REGION', DEFAULT_REGION))
+
+
+def get_stepfunctions_client():
+    return get_client('stepfunctions', region=os.environ.get('AWS_REGION', DEFAULT_REGION))
+
+
+def _build_opensearch_client(region: str) -> OpenSearch:
+    global _opensearch_refreshable
+
+    credentials = _get_session().get_credentials()
+
+    # Con credenciales refrescables (rol STS) AWS4Auth pide credenciales congeladas
+    # en cada petición y botocore las renueva antes de que caduquen
+    _opensearch_refreshable = hasattr(credentials, 'refresh_needed')
+    if _opensearch_refreshable:
+        awsauth = AWS4Auth(
+            region=region,
+            service='aoss',  # Amazon OpenSearch Serverless
+            refreshable_credentials=credentials
+        )
+    else:
+        awsauth = AWS4Auth(
+            credentials.access_key,
+            credentials.secret_key,
+            region,
+            'aoss',
+            session_token=credentials.token
+        )
+
+    opensearch_endpoint = os.environ.get('OPENSEARCH_ENDPOINT')
+    if not opensearch_endpoint:
+        raise ValueError("Variable OPENSEARCH_ENDPOINT no configurada")
+
+    return OpenSearch(
+        hosts=[{'host': opensearch_endpoint.replace('https://', ''), 'port': 443}],
+        http_auth=awsauth,
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=int(os.environ.get('OPENSEARCH_POOL_MAXSIZE', '16')),  # Conexiones keep-alive reutilizadas
+        timeout=60
+    )
+
+
+def get_opensearch_client(region: str = DEFAULT_REGION) -> OpenSearch:
+    """
+    Devuelve el cliente OpenSearch compartido del contenedor
+
+    La conexión HTTP (y su handshake TLS) se reutiliza entre invocaciones.
+    """
+    global _opensearch_client, _opensearch_created_at
+
+    expired = (
+        not _opensearch_refreshable
+        and time.time() - _opensearch_created_at > STATIC_CREDENTIALS_MAX_AGE_SECONDS
+    )
+    if _opensearch_client is not None and not expired:
+        return _opensearch_client
+
+    with _lock:
+        if _opensearch_client is None or expired:
+            print(f"🔐 Inicializando cliente OpenSearch para región {region}")
+            _opensearch_client = _build_opensearch_client(region)
+            _opensearch_created_at = time.time()
+            print(f"✅ Cliente OpenSearch creado exitosamente")
+    return _opensearch_client
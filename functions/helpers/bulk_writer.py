@@ -0,0 +1,188 @@
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from opensearchpy import OpenSearch
+from opensearchpy.exceptions import ConnectionError as OpenSearchConnectionError, TransportError
+
+
+# OpenSearch Serverless rechaza peticiones bulk demasiado grandes: se cortan lotes por bytes y documentos
+BULK_MAX_BYTES = int(os.environ.get('BULK_MAX_BYTES', str(5 * 1024 * 1024)))
+BULK_MAX_DOCS = int(os.environ.get('BULK_MAX_DOCS', '500'))
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', '4'))
+BULK_MAX_RETRIES = int(os.environ.get('BULK_MAX_RETRIES', '5'))
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# Una operación bulk: (línea de acción, documento o None para delete)
+BulkOperation = Tuple[Dict, Optional[Dict]]
+
+
+def _serialize(operation: BulkOperation) -> bytes:
+    action, source = operation
+    lines = json.dumps(action, ensure_ascii=False) + '\n'
+    if source is not None:
+        lines += json.dumps(source, ensure_ascii=False) + '\n'
+    return lines.encode('utf-8')
+
+
+def split_bulk_batches(
+    operations: List[BulkOperation],
+    max_bytes: int = BULK_MAX_BYTES,
+    max_docs: int = BULK_MAX_DOCS
+) -> List[List[Tuple[BulkOperation, bytes]]]:
+    """
+    Corta las operaciones en lotes que no superan max_bytes ni max_docs
+
+    Cada operación se serializa una sola vez; el payload se reutiliza en los reintentos.
+    """
+    batches = []
+    current = []
+    current_bytes = 0
+
+    for operation in operations:
+        payload = _serialize(operation)
+        if current and (current_bytes + len(payload) > max_bytes or len(current) >= max_docs):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append((operation, payload))
+        current_bytes += len(payload)
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _is_retryable_exception(error: Exception) -> bool:
+    if isinstance(error, OpenSearchConnectionError):
+        return True
+    return isinstance(error, TransportError) and error.status_code in RETRYABLE_STATUS
+
+
+def _backoff(attempt: int, base_delay: float = 0.5, max_delay: float = 20.0):
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    time.sleep(random.uniform(delay / 2, delay))
+
+
+def _send_batch(client: OpenSearch, batch: List[Tuple[BulkOperation, bytes]], batch_number: int, max_retries: int) -> Dict:
+    """
+    Envía un lote y reintenta solo los items fallidos con estado reintentable
+    """
+    start = time.perf_counter()
+    pending = batch
+    errors = []
+    succeeded = 0
+    attempt = 0
+    payload_bytes = sum(len(payload) for _, payload in batch)
+
+    while pending:
+        body = b''.join(payload for _, payload in pending).decode('utf-8')
+        try:
+            response = client.bulk(body=body)
+        except Exception as e:
+            if _is_retryable_exception(e) and attempt < max_retries:
+                print(f"⚠️ Lote {batch_number}: petición rechazada ({str(e)}), reintento {attempt + 1}")
+                _backoff(attempt)
+                attempt += 1
+                continue
+            errors.extend(f"Error: {str(e)}" for _ in pending)
+            break
+
+        retry = []
+        for item_operation, item in zip(pending, response.get('items', [])):
+            result = next(iter(item.values()), {})
+            if 'error' not in result:
+                succeeded += 1
+            elif result.get('status') in RETRYABLE_STATUS and attempt < max_retries:
+                retry.append(item_operation)
+            else:
+                errors.append(f"ID: {result.get('_id')}, Error: {result['error']}")
+
+        if retry:
+            print(f"⚠️ Lote {batch_number}: {len(retry)} items reintentables, reintento {attempt + 1}")
+            _backoff(attempt)
+            attempt += 1
+        pending = retry
+
+    elapsed = time.perf_counter() - start
+    return {
+        "batch": batch_number,
+        "documents": len(batch),
+        "bytes": payload_bytes,
+        "succeeded": succeeded,
+        "failed": len(errors),
+        "errors": errors,
+        "retries": attempt,
+        "latency_ms": round(elapsed * 1000, 1)
+    }
+
+
+def bulk_write(
+    client: OpenSearch,
+    operations: List[BulkOperation],
+    operation_name: str = "indexing",
+    max_bytes: int = BULK_MAX_BYTES,
+    max_docs: int = BULK_MAX_DOCS,
+    concurrency: int = BULK_CONCURRENCY,
+    max_retries: int = BULK_MAX_RETRIES
+) -> Dict:
+    """
+    Escribe operaciones bulk en lotes acotados enviados en paralelo
+
+    Args:
+        client: Cliente OpenSearch
+        operations: Lista de (acción, documento); documento None para delete
+        operation_name: Nombre para los logs
+        max_bytes: Tamaño máximo de cada petición bulk
+        max_docs: Documentos máximos por petición
+        concurrency: Peticiones bulk simultáneas
+        max_retries: Reintentos por item ante 429/5xx
+
+    Returns:
+        Diccionario con success, contadores, errores y métricas por lote
+    """
+    if not operations:
+        return {"success": True, "succeeded": 0, "failed": 0, "errors": [], "batches": []}
+
+    start = time.perf_counter()
+    batches = split_bulk_batches(operations, max_bytes, max_docs)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+        results = list(executor.map(
+            lambda numbered: _send_batch(client, numbered[1], numbered[0], max_retries),
+            enumerate(batches, 1)
+        ))
+
+    elapsed = time.perf_counter() - start
+    succeeded = sum(result["succeeded"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    total_bytes = sum(result["bytes"] for result in results)
+
+    for result in results:
+        print(
+            f"📦 Lote {result['batch']}: {result['documents']} docs, {result['bytes'] / 1024:.0f} KB, "
+            f"{result['latency_ms']} ms, {result['retries']} reintentos"
+        )
+    print(
+        f"✅ Bulk {operation_name}: {succeeded}/{len(operations)} documentos en {len(batches)} lotes, "
+        f"{elapsed:.2f}s ({len(operations) / max(elapsed, 1e-9):.0f} docs/s, {total_bytes / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s)"
+    )
+
+    errors = [error for result in results for error in result["errors"]]
+    for error in errors[:10]:
+        print(f"❌ Error en {operation_name}: {error}")
+    if failed:
+        print(f"⚠️ {failed} documentos fallaron en {operation_name}")
+
+    return {
+        "success": failed == 0,
+        "succeeded": succeeded,
+        "failed": failed,
+        "errors": errors,
+        "batches": [{key: value for key, value in result.items() if key != "errors"} for result in results],
+        "seconds": round(elapsed, 3)
+    }
@@ -0,0 +1,219 @@
+import re
+from bisect import bisect_left
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+
+
+# Fronteras candidatas: fin de frase seguido de espacio, o salto de línea
+_BREAK = re.compile(r'[.!?…]\s+|\n\s*')
+# Pre-tokens de las frases largas: palabras (letras, dígitos, _) o signos sueltos, con el espacio que los precede.
+# Las "palabras" de más de 48 caracteres (base64, hashes) se parten para poder cortarlas
+_PRE_TOKEN = re.compile(r'(\s*)(\w{1,48}|[^\w\s])')
+_HYPHEN_WRAP = re.compile(r'-\n(?=[a-záéíóúüñ])')
+
+SENTENCE_END = frozenset('.!?…')
+
+# Dónde se puede cortar antes de una unidad, de más a menos preferible
+PARAGRAPH, SENTENCE, LINE, WORD, NONE = 4, 3, 2, 1, 0
+
+# Un chunk se corta en la mejor frontera que deje al menos esta fracción del tamaño
+MIN_CHUNK_FILL = 0.5
+
+# Caracteres por token de una palabra en el estimador. El tokenizador de Titan no es público:
+# quien tenga el del modelo puede pasarlo como count_tokens
+CHARS_PER_WORD_TOKEN = 6
+# Unidades del estimador: cada signo y cada tramo de hasta CHARS_PER_WORD_TOKEN caracteres de una palabra
+_TOKEN_UNIT = re.compile(rf'\w{{1,{CHARS_PER_WORD_TOKEN}}}|[^\w\s]')
+
+# Frases de más de esta fracción del solape se parten en palabras, así siempre hay dónde cortar
+LONG_SEGMENT_FRACTION = 0.25
+
+# Tamaño (en chunks) de la ventana de texto que se acumula antes de partir en el stream
+STREAM_WINDOW_CHUNKS = 4
+
+
+class Chunk(NamedTuple):
+    """
+    Chunk con su posición en el texto normalizado: text == texto[start:end]
+    """
+    text: str
+    start: int
+    end: int
+    tokens: int
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza texto extraído conservando la estructura
+
+    Colapsa espacios y tabuladores dentro de cada línea, une palabras cortadas
+    con guion al final de línea y deja los párrafos como una línea en blanco
+    ("\\n\\n") y los saltos de línea como "\\n", que el chunker usa como fronteras.
+    """
+    text = text.replace('\x00', '').replace('\r\n', '\n').replace('\r', '\n')
+    if '-\n' in text:
+        # Solo si el guion va pegado a una palabra: "infor-\nmación" → "información"
+        text = _HYPHEN_WRAP.sub(lambda match: '' if match.start() and text[match.start() - 1].isalnum() else match.group(), text)
+    text = '\n'.join(' '.join(line.split()) for line in text.split('\n'))
+    while '\n\n\n' in text:
+        text = text.replace('\n\n\n', '\n\n')
+    return text.strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Aproximación de un tokenizador BPE: cada signo es un token y cada palabra uno
+    por cada CHARS_PER_WORD_TOKEN caracteres (las cortas, uno)
+    """
+    return _TOKEN_UNIT.subn('', text)[1]
+
+
+def _build_units(text: str, split_above: int, count_tokens: Callable[[str], int]):
+    """
+    Un solo recorrido del texto: frases o líneas con su coste en tokens y la frontera que las precede
+
+    Las frases de más de split_above tokens se sustituyen por sus palabras.
+    Cada unidad guarda el inicio de su frase para poder retomar el stream ahí.
+    """
+    starts, ends, costs, levels, segments = [], [], [], [], []
+    position = len(text) - len(text.lstrip())
+    level = PARAGRAPH
+    for gap in chain(_BREAK.finditer(text), (None,)):
+        if gap:
+            separator = gap.group()
+            # El signo de fin de frase se queda en la frase
+            segment_end = gap.start() + (separator[0] != '\n')
+        else:
+            segment_end = len(text)
+        if segment_end > position:
+            cost = count_tokens(text[position:segment_end])
+            if cost <= split_above:
+                starts.append(position)
+                ends.append(segment_end)
+                costs.append(cost)
+                levels.append(level)
+                segments.append(position)
+            else:
+                for word in _PRE_TOKEN.finditer(text, position, segment_end):
+                    starts.append(word.start(2))
+                    ends.append(word.end())
+                    costs.append(count_tokens(word.group(2)))
+                    levels.append((WORD if word.group(1) else NONE) if word.start(2) > position else level)
+                    segments.append(position)
+        if gap is None:
+            break
+
+        if separator.count('\n') >= 2:
+            level = PARAGRAPH
+        elif separator[0] != '\n':
+            level = SENTENCE
+        else:
+            level = LINE
+        position = gap.end()
+    return starts, ends, costs, levels, segments
+
+
+def _split(text: str, chunk_size: int, chunk_overlap: int, count_tokens: Callable[[str], int],
+           offset: int = 0, resume_at: int = 0) -> Tuple[List[Chunk], int]:
+    """
+    Parte el texto en una pasada lineal
+
+    Cada chunk crece frase a frase hasta chunk_size tokens y se corta en la
+    frontera más fuerte (párrafo > frase > línea > palabra) que lo deje al menos
+    medio lleno. El siguiente empieza hasta chunk_overlap tokens antes, en la
+    frontera más fuerte de ese tramo, así el solape es texto repetido
+    literalmente al final de uno y al principio del otro.
+
+    Returns:
+        (chunks, inicio de la frase del último chunk) para retomar el stream
+    """
+    split_above = max(1, int(min(chunk_size, chunk_overlap or chunk_size) * LONG_SEGMENT_FRACTION))
+    starts, ends, costs, levels, segments = _build_units(text, split_above, count_tokens)
+    count = len(starts)
+    min_fill = max(1, int(chunk_size * MIN_CHUNK_FILL))
+    chunks = []
+
+    first = bisect_left(starts, resume_at)
+    while first < count:
+        # best[level] = última unidad antes de la que se puede cortar con ese nivel
+        best = [0] * 5
+        total = 0
+        position = first
+        while position < count and (total + costs[position] <= chunk_size or position == first):
+            total += costs[position]
+            position += 1
+            if position < count and total >= min_fill:
+                best[levels[position]] = position
+
+        if position < count:
+            cut = next((best[level] for level in (PARAGRAPH, SENTENCE, LINE, WORD, NONE) if best[level]), position)
+        else:
+            cut = count
+        if cut != position:
+            total = sum(costs[first:cut])
+
+        chunks.append(Chunk(text[starts[first]:ends[cut - 1]], offset + starts[first], offset + ends[cut - 1], total))
+        if cut >= count:
+            break
+
+        # Solape: se retrocede desde el corte mientras quepa en chunk_overlap tokens
+        next_first, next_level = cut, -1
+        overlap = 0
+        candidate = cut - 1
+        while candidate > first and overlap + costs[candidate] <= chunk_overlap:
+            overlap += costs[candidate]
+            if levels[candidate] >= next_level and levels[candidate] > NONE:
+                next_first, next_level = candidate, levels[candidate]
+            candidate -= 1
+        first = next_first
+
+    return chunks, segments[first] if chunks else 0
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int, count_tokens: Callable[[str], int] = estimate_tokens) -> List[Chunk]:
+    """
+    Chunks de un texto completo, con tamaño y solape en tokens
+
+    Args:
+        count_tokens: Tokens de un tramo de texto; por defecto estimate_tokens.
+            Se puede pasar el tokenizador real del modelo de embedding.
+    """
+    return _split(text, chunk_size, chunk_overlap, count_tokens)[0]
+
+
+def iter_text_chunks(
+    text_pieces: Iterable[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> Iterator[Chunk]:
+    """
+    Versión en streaming de split_text: las piezas (páginas, secciones) se unen con "\\n"
+
+    Solo se retiene una ventana acotada de texto. El último chunk de cada
+    ventana se vuelve a partir junto con el texto siguiente, así el resultado
+    es idéntico a partir el documento entero, offsets incluidos.
+    """
+    window_chars = chunk_size * CHARS_PER_WORD_TOKEN * STREAM_WINDOW_CHUNKS
+    buffer = ''
+    offset = 0
+    resume_at = 0
+
+    for piece in text_pieces:
+        if not piece:
+            continue
+
+        buffer = f"{buffer}\n{piece}" if buffer else piece
+        if len(buffer) < window_chars:
+            continue
+
+        chunks, restart = _split(buffer, chunk_size, chunk_overlap, count_tokens, offset, resume_at)
+        yield from chunks[:-1]
+        if chunks:
+            # Se retoma desde el inicio de la frase del último chunk: las frases largas se parten igual
+            resume_at = chunks[-1].start - offset - restart
+            buffer = buffer[restart:]
+            offset += restart
+
+    if buffer:
+        yield from _split(buffer, chunk_size, chunk_overlap, count_tokens, offset, resume_at)[0]
@@ -0,0 +1,205 @@
+import re
+from typing import Dict, List, Sequence
+
+from helpers.settings import get_setting
+from helpers.chunking import estimate_tokens, CHARS_PER_WORD_TOKEN
+
+
+# Tokens medidos con el mismo estimador que el tamaño de los chunks (helpers.chunking)
+CONTEXT_TOKEN_BUDGET = 2000
+ELISION = '[…]'
+# Una frase que no cabe entera se recorta si quedan al menos estos tokens; menos no aporta contexto
+MIN_TRUNCATED_TOKENS = 32
+
+# Palabras que no aportan al decidir qué frase responde la pregunta
+STOPWORDS = {
+    'que', 'qué', 'cual', 'cuál', 'cuales', 'cuáles', 'como', 'cómo', 'donde', 'dónde', 'cuando', 'cuándo',
+    'cuanto', 'cuánto', 'para', 'por', 'con', 'sin', 'los', 'las', 'del', 'una', 'uno', 'unos', 'unas',
+    'este', 'esta', 'estos', 'estas', 'ese', 'esa', 'son', 'hay', 'sobre', 'entre', 'mis', 'sus', 'nuestro',
+    'the', 'and', 'for', 'what', 'which', 'how'
+}
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:])\s+|\n+')
+_WORD = re.compile(r'\S+')
+
+
+_ACCENTS = str.maketrans('áéíóúüàèìòùâêîôû', 'aeiouuaeiouaeiou')
+
+
+def _terms(text: str) -> set:
+    # Sin tildes: "cuál" y "cual" o "emisión" y "emision" cuentan como el mismo término
+    words = re.findall(r'\w+', text.lower().translate(_ACCENTS))
+    return {word for word in words if len(word) > 2 and word not in STOPWORDS}
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence and sentence.strip()]
+
+
+def truncate_to_budget(sentence: str, token_budget: int) -> str:
+    """
+    Recorta la frase en un límite de palabra para que, con la marca de elisión, quepa en token_budget
+
+    Las unidades del estimador no cruzan espacios: los tokens de la frase son la suma de los de sus palabras.
+    """
+    if estimate_tokens(sentence) <= token_budget:
+        return sentence
+    suffix = f" {ELISION}"
+    available = token_budget - estimate_tokens(suffix)
+    end = 0
+    for word in _WORD.finditer(sentence):
+        tokens = estimate_tokens(word.group())
+        if tokens > available:
+            if not end:
+                # Ni la primera palabra cabe (tabla sin espacios, base64): se corta dentro de ella
+                end = word.start() + max(0, available) * CHARS_PER_WORD_TOKEN
+                while end > word.start() and estimate_tokens(sentence[word.start():end]) > available:
+                    end -= CHARS_PER_WORD_TOKEN
+            break
+        available -= tokens
+        end = word.end()
+    else:
+        end = len(sentence)
+    return sentence[:end].rstrip() + suffix
+
+
+def _join_overlapping(previous: str, following: str, max_overlap: int = 4000, probe_size: int = 32) -> str:
+    # Chunks consecutivos comparten el solape de get_chunks (hasta chunk_overlap tokens, literal):
+    # se busca el inicio del siguiente en la cola del anterior y se pega sin la parte repetida
+    probe = following[:probe_size]
+    if len(probe) < probe_size:
+        return previous + '\n' + following
+
+    position = previous.find(probe, max(0, len(previous) - max_overlap))
+    while position != -1:
+        if following.startswith(previous[position:]):
+            return previous[:position] + following
+        position = previous.find(probe, position + 1)
+    return previous + '\n' + following
+
+
+def merge_adjacent_passages(documents: Sequence[Dict]) -> List[Dict]:
+    """
+    Une chunks del mismo source_file con chunk_index consecutivos en un solo pasaje
+    """
+    by_file = {}
+    for document in documents:
+        by_file.setdefault(document.get('source_file', ''), []).append(document)
+
+    passages = []
+    for source_file, file_documents in by_file.items():
+        file_documents = sorted(file_documents, key=lambda document: document.get('chunk_index', 0))
+        current = None
+        for document in file_documents:
+            chunk_index = document.get('chunk_index', 0)
+            if current and chunk_index == current['last_index'] + 1:
+                current['content'] = _join_overlapping(current['content'], document.get('content', ''))
+                current['last_index'] = chunk_index
+                current['score'] = max(current['score'], document.get('score', 0))
+                continue
+            if current:
+                passages.append(current)
+            current = {
+                'source_file': source_file,
+                'content': document.get('content', ''),
+                'first_index': chunk_index,
+                'last_index': chunk_index,
+                'score': document.get('score', 0)
+            }
+        if current:
+            passages.append(current)
+
+    return sorted(passages, key=lambda passage: passage['score'], reverse=True)
+
+
+def pack_context(question: str, documents: Sequence[Dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Dict:
+    """
+    Construye el contexto del LLM dentro de un presupuesto de tokens
+
+    Los pasajes se ordenan por score, los chunks adyacentes de un mismo archivo
+    se fusionan y de cada pasaje se conservan las frases que comparten más
+    términos con la pregunta (en su orden original). Cada pasaje conserva al
+    menos su mejor frase (recortada si por sí sola no cabe en lo que queda);
+    el resto del presupuesto se reparte por relevancia.
+
+    Returns:
+        Diccionario con context y las métricas de tokens (original, empaquetado, ahorrado)
+    """
+    original_tokens = sum(estimate_tokens(document.get('content', '')) for document in documents)
+    passages = merge_adjacent_passages(documents)
+    question_terms = _terms(question)
+
+    candidates = []
+    for passage_rank, passage in enumerate(passages):
+        passage['sentences'] = split_sentences(passage['content'])
+        passage['keep'] = set()
+        for sentence_index, sentence in enumerate(passage['sentences']):
+            overlap = len(question_terms & _terms(sentence)) / max(len(question_terms), 1)
+            # Desempate: pasajes mejor puntuados y frases iniciales primero
+            candidates.append((overlap, -passage_rank, -sentence_index, passage_rank, sentence_index))
+    candidates.sort(reverse=True)
+
+    used_tokens = 0
+    truncated = []
+    # Primera pasada: la mejor frase de cada pasaje, para no perder ninguna fuente
+    for passage_rank, passage in enumerate(passages):
+        best = next((candidate for candidate in candidates if candidate[3] == passage_rank), None)
+        if best is None:
+            continue
+        sentence = passage['sentences'][best[4]]
+        tokens = estimate_tokens(sentence)
+        remaining = token_budget - used_tokens
+        if tokens > remaining and remaining >= MIN_TRUNCATED_TOKENS:
+            # Una frase más larga que el presupuesto (tabla, texto sin puntuación) no debe vaciar el contexto;
+            # se recorta a una parte igual de lo que queda para no dejar sin hueco a los pasajes siguientes
+            share = max(MIN_TRUNCATED_TOKENS, remaining // (len(passages) - passage_rank))
+            truncated.append((passage, best[4], sentence))
+            sentence = passage['sentences'][best[4]] = truncate_to_budget(sentence, share)
+            tokens = estimate_tokens(sentence)
+        if tokens <= remaining:
+            passage['keep'].add(best[4])
+            used_tokens += tokens
+
+    # Segunda pasada: el presupuesto restante por relevancia global
+    for _, _, _, passage_rank, sentence_index in candidates:
+        passage = passages[passage_rank]
+        if sentence_index in passage['keep']:
+            continue
+        tokens = estimate_tokens(passage['sentences'][sentence_index])
+        if used_tokens + tokens <= token_budget:
+            passage['keep'].add(sentence_index)
+            used_tokens += tokens
+
+    # Lo que sobre vuelve a las frases recortadas, por orden de pasaje
+    for passage, sentence_index, sentence in truncated:
+        current_tokens = estimate_tokens(passage['sentences'][sentence_index])
+        extended = truncate_to_budget(sentence, current_tokens + token_budget - used_tokens)
+        used_tokens += estimate_tokens(extended) - current_tokens
+        passage['sentences'][sentence_index] = extended
+
+    context_chunks = []
+    for passage in passages:
+        if not passage['keep']:
+            continue
+        parts = []
+        previous = None
+        for sentence_index in sorted(passage['keep']):
+            if previous is not None and sentence_index != previous + 1:
+                parts.append(ELISION)
+            parts.append(passage['sentences'][sentence_index])
+            previous = sentence_index
+        context_chunks.append(f"[Documento {len(context_chunks) + 1}]: {' '.join(parts)}")
+
+    context = "\n\n".join(context_chunks)
+    packed_tokens = estimate_tokens(context)
+    return {
+        "context": context,
+        "original_tokens": original_tokens,
+        "packed_tokens": packed_tokens,
+        "tokens_saved": max(0, original_tokens - packed_tokens),
+        "passages": len(context_chunks)
+    }
+
+
+def get_context_token_budget(tenant_id: str = None) -> int:
+    return int(get_setting('CONTEXT_TOKEN_BUDGET', CONTEXT_TOKEN_BUDGET, tenant_id))
@@ -0,0 +1,349 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+CACHE_KEY_VERSION = 'v1'
+
+# Contadores por invocación (se reinician en cada lambda_handler)
+_stats = {
+    "memory_hits": 0,
+    "persistent_hits": 0,
+    "misses": 0
+}
+_stats_lock = threading.Lock()
+
+_cache = None
+
+
+def normalize_text_for_cache(text: str) -> str:
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+
+def make_cache_key(text: Optional[str], model_id: str, dimensions: int, image: Optional[str] = None) -> str:
+    """
+    Clave direccionada por contenido: hash del texto normalizado, modelo y dimensiones
+    """
+    digest = hashlib.sha256()
+    for part in (CACHE_KEY_VERSION, model_id, str(dimensions), normalize_text_for_cache(text)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x1f')
+    if image:
+        digest.update(hashlib.sha256(image.encode('utf-8')).digest())
+    return digest.hexdigest()
+
+
+def encode_embedding(embedding: List[float]) -> bytes:
+    return array('f', embedding).tobytes()
+
+
+def decode_embedding(data: bytes) -> List[float]:
+    values = array('f')
+    values.frombytes(data)
+    return values.tolist()
+
+
+def _record(counter: str, amount: int = 1):
+    if amount:
+        with _stats_lock:
+            _stats[counter] += amount
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+def get_cache_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+    stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+    return stats
+
+
+class LRUEmbeddingCache:
+    """
+    Nivel en memoria: sobrevive entre invocaciones del mismo contenedor
+
+    Cada entrada se guarda como array('f') (4 KB a 1024 dimensiones frente a
+    ~32 KB de una lista de floats de Python), la misma precisión float32 que
+    los backends persistentes.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+        return embedding.tolist() if embedding is not None else None
+
+    def put(self, key: str, embedding: List[float]):
+        with self._lock:
+            self._entries[key] = array('f', embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class S3EmbeddingCacheBackend:
+
+    def __init__(self, bucket: str, prefix: str = 'embedding-cache/', max_workers: int = 16):
+        from helpers.aws_clients import get_s3_client
+        self.s3_client = get_s3_client()
+        self.bucket = bucket
+        self.prefix = prefix
+        self.max_workers = max_workers
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key}"
+
+    def _get_one(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self._key(key))
+            return response['Body'].read()
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if code in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as executor:
+            values = list(executor.map(self._get_one, keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def put_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+
+        def put_one(item):
+            key, value = item
+            self.s3_client.put_object(Bucket=self.bucket, Key=self._key(key), Body=value)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            list(executor.map(put_one, items.items()))
+
+
+class DynamoDBEmbeddingCacheBackend:
+    """
+    Tabla con clave de partición 'cache_key' (string) y atributo binario 'embedding'
+    """
+
+    def __init__(self, table_name: str):
+        from helpers.aws_clients import get_client
+        self.dynamodb = get_client('dynamodb', region=os.environ.get('AWS_REGION', 'us-east-1'))
+        self.table_name = table_name
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), 100):  # Límite de BatchGetItem
+            request = {
+                self.table_name: {
+                    'Keys': [{'cache_key': {'S': key}} for key in unique_keys[start:start + 100]],
+                    'ProjectionExpression': 'cache_key, embedding'
+                }
+            }
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    found[item['cache_key']['S']] = item['embedding']['B']
+                request = response.get('UnprocessedKeys') or None
+        return found
+
+    def put_many(self, items: Dict[str, bytes]):
+        entries = list(items.items())
+        for start in range(0, len(entries), 25):  # Límite de BatchWriteItem
+            request = {
+                self.table_name: [
+                    {'PutRequest': {'Item': {'cache_key': {'S': key}, 'embedding': {'B': value}}}}
+                    for key, value in entries[start:start + 25]
+                ]
+            }
+            while request:
+                response = self.dynamodb.batch_write_item(RequestItems=request)
+                request = response.get('UnprocessedItems') or None
+
+
+class SQLiteEmbeddingCacheBackend:
+    """
+    Backend local en fichero para pruebas y benchmarks
+    """
+
+    def __init__(self, path: str = '/tmp/embedding-cache.sqlite3'):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (cache_key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT cache_key, embedding FROM embeddings WHERE cache_key IN ({placeholders})",
+                    batch
+                )
+                found.update({key: bytes(value) for key, value in rows})
+        return found
+
+    def put_many(self, items: Dict[str, bytes]):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (cache_key, embedding) VALUES (?, ?)",
+                list(items.items())
+            )
+            self._connection.commit()
+
+
+class EmbeddingCache:
+    """
+    Caché de dos niveles: LRU en memoria delante de un backend persistente opcional
+    """
+
+    def __init__(self, memory: LRUEmbeddingCache, persistent=None):
+        self.memory = memory
+        self.persistent = persistent
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                found[key] = embedding
+            else:
+                missing.append(key)
+
+        memory_hits = len(found)
+        if missing and self.persistent:
+            try:
+                for key, value in self.persistent.get_many(missing).items():
+                    embedding = decode_embedding(value)
+                    self.memory.put(key, embedding)
+                    found[key] = embedding
+            except Exception as e:
+                # La caché nunca debe bloquear la ingesta
+                print(f"⚠️ Error leyendo caché persistente de embeddings: {str(e)}")
+
+        _record("memory_hits", memory_hits)
+        _record("persistent_hits", len(found) - memory_hits)
+        _record("misses", len(missing) - (len(found) - memory_hits))
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        for key, embedding in items.items():
+            self.memory.put(key, embedding)
+
+        if items and self.persistent:
+            try:
+                self.persistent.put_many({key: encode_embedding(embedding) for key, embedding in items.items()})
+            except Exception as e:
+                print(f"⚠️ Error escribiendo caché persistente de embeddings: {str(e)}")
+
+
+def create_persistent_backend(backend: str):
+    backend = (backend or 'none').lower()
+
+    if backend == 's3':
+        bucket = os.environ.get('EMBEDDING_CACHE_BUCKET')
+        if not bucket:
+            raise ValueError("Variable EMBEDDING_CACHE_BUCKET no configurada")
+        return S3EmbeddingCacheBackend(bucket, os.environ.get('EMBEDDING_CACHE_PREFIX', 'embedding-cache/'))
+
+    if backend == 'dynamodb':
+        table_name = os.environ.get('EMBEDDING_CACHE_TABLE')
+        if not table_name:
+            raise ValueError("Variable EMBEDDING_CACHE_TABLE no configurada")
+        return DynamoDBEmbeddingCacheBackend(table_name)
+
+    if backend == 'sqlite':
+        return SQLiteEmbeddingCacheBackend(os.environ.get('EMBEDDING_CACHE_PATH', '/tmp/embedding-cache.sqlite3'))
+
+    if backend == 'none':
+        return None
+
+    raise ValueError(f"Backend de caché no soportado: {backend}")
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Devuelve la caché del contenedor configurada con EMBEDDING_CACHE_BACKEND (none, s3, dynamodb, sqlite)
+    """
+    global _cache
+    if _cache is None:
+        persistent = None
+        try:
+            persistent = create_persistent_backend(os.environ.get('EMBEDDING_CACHE_BACKEND', 'none'))
+        except Exception as e:
+            print(f"⚠️ Caché persistente deshabilitada: {str(e)}")
+
+        _cache = EmbeddingCache(
+            LRUEmbeddingCache(int(os.environ.get('EMBEDDING_CACHE_MEMORY_ENTRIES', '5000'))),
+            persistent
+        )
+    return _cache
+
+
+def get_or_compute_embeddings(
+    texts: Sequence[str],
+    model_id: str,
+    dimensions: int,
+    compute_fn: Callable[[List[str]], List[Optional[List[float]]]],
+    image: Optional[str] = None
+) -> List[Optional[List[float]]]:
+    """
+    Resuelve embeddings desde la caché y calcula solo los que faltan
+
+    Args:
+        texts: Textos a embeber
+        model_id: Modelo de Bedrock (forma parte de la clave)
+        dimensions: Dimensiones del vector (forma parte de la clave)
+        compute_fn: Recibe los textos no cacheados y devuelve sus vectores en orden
+        image: Imagen base64 asociada (solo para embeddings multimodales)
+
+    Returns:
+        Lista de vectores alineada con texts (None si compute_fn no pudo generarlo)
+    """
+    cache = get_embedding_cache()
+    keys = [make_cache_key(text, model_id, dimensions, image) for text in texts]
+    found = cache.get_many(keys)
+
+    # Textos repetidos dentro del mismo lote se calculan una sola vez
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in pending:
+            pending[key] = text
+
+    if pending:
+        computed = compute_fn(list(pending.values()))
+        new_items = {
+            key: embedding
+            for key, embedding in zip(pending.keys(), computed)
+            if embedding
+        }
+        cache.put_many(new_items)
+        found.update(new_items)
+
+    return [found.get(key) for key in keys]
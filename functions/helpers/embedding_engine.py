@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+DEFAULT_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', '8'))
+DEFAULT_MAX_RETRIES = int(os.environ.get('EMBEDDING_MAX_RETRIES', '8'))
+
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException'
+}
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Indica si una excepción de Bedrock corresponde a throttling o saturación temporal
+    """
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code', '')
+        if code in THROTTLING_ERROR_CODES:
+            return True
+
+    return type(error).__name__ in THROTTLING_ERROR_CODES
+
+
+def invoke_titan_embedding(bedrock_runtime, model_id: str, payload: Dict) -> List[float]:
+    """
+    Ejecuta una única llamada invoke_model de embedding y devuelve el vector
+
+    Las excepciones del cliente se propagan sin envolver para que el motor
+    pueda distinguir throttling de errores definitivos.
+    """
+    response = bedrock_runtime.invoke_model(
+        modelId=model_id,
+        contentType="application/json",
+        accept="application/json",
+        body=json.dumps(payload)
+    )
+
+    response_body = json.loads(response['body'].read())
+    embedding = response_body.get('embedding', [])
+
+    if not embedding:
+        raise ValueError(f"{model_id} no devolvió embedding")
+
+    return embedding
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limitador AIMD: reduce a la mitad las peticiones en vuelo ante throttling
+    y las recupera de forma aditiva con cada respuesta exitosa.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttle_events += 1
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+def run_embedding_jobs(
+    inputs: Sequence[Any],
+    embed_fn: Callable[[Any], List[float]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    skip_errors: bool = False,
+    base_delay: float = 0.25,
+    max_delay: float = 20.0
+) -> List[Optional[List[float]]]:
+    """
+    Genera embeddings con un pool acotado manteniendo N peticiones en vuelo
+
+    Args:
+        inputs: Elementos a embeber (texto, payload, etc.)
+        embed_fn: Función que recibe un elemento y devuelve su vector
+        concurrency: Máximo de peticiones simultáneas a Bedrock
+        max_retries: Reintentos por elemento ante throttling
+        skip_errors: Si es True los elementos fallidos devuelven None en vez de abortar
+        base_delay: Espera inicial del backoff exponencial (segundos)
+        max_delay: Espera máxima del backoff (segundos)
+
+    Returns:
+        Lista de vectores en el mismo orden que inputs
+    """
+    if not inputs:
+        return []
+
+    concurrency = max(1, min(concurrency, len(inputs)))
+    limiter = AdaptiveConcurrencyLimiter(concurrency)
+    results: List[Optional[List[float]]] = [None] * len(inputs)
+
+    def worker(position: int):
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                embedding = embed_fn(inputs[position])
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                limiter.release(throttled=throttled)
+
+                if throttled and attempt < max_retries:
+                    delay = min(max_delay, base_delay * (2 ** attempt))
+                    time.sleep(random.uniform(delay / 2, delay))  # Full jitter acotado
+                    attempt += 1
+                    continue
+
+                if skip_errors:
+                    print(f"❌ Error en elemento {position + 1}: {str(e)}")
+                    return
+                raise
+
+            limiter.release()
+            results[position] = embedding
+            return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker, position) for position in range(len(inputs))]
+        first_error = None
+        for future in futures:
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error and first_error is None:
+                first_error = error
+                for pending in futures:
+                    pending.cancel()
+
+    if first_error:
+        raise first_error
+
+    if limiter.throttle_events:
+        print(f"⚠️ Throttling de Bedrock: {limiter.throttle_events} eventos, concurrencia final {int(limiter.limit)}")
+
+    return results
@@ -0,0 +1,555 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from helpers.settings import get_setting
+from helpers.aws_clients import get_client, get_s3_client, get_stepfunctions_client
+from helpers.s3_reader import S3Location
+from helpers.pdf_extraction import get_pdf_page_count, iter_pdf_pages, get_extraction_workers
+from helpers.rag_helpers import (
+    clean_extracted_text,
+    iter_chunks,
+    get_chunks,
+    batched,
+    create_opensearch_client,
+    index_document_bulk,
+    delete_documents_bulk,
+    generate_content_hash,
+    generate_chunk_id,
+    get_source_document
+)
+from helpers.strategies import embed_new_chunks, INGEST_BATCH_SIZE, PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP
+from helpers.opensearch_indexing import opensearch_indexing_batches, get_existing_chunks, get_tenant_vector_spec
+from helpers.index_placement import get_placement, rebalance_tenant
+from helpers.query_cache import invalidate_tenant_queries
+
+
+# off: cada PDF en una sola invocación (comportamiento original)
+# local: los segmentos corren en hilos de la misma invocación (pruebas, scripts)
+# stepfunctions: un Map de Step Functions lanza una invocación por segmento y después el finalizador
+FANOUT_MODES = ('off', 'local', 'stepfunctions')
+
+FANOUT_MODE = os.environ.get('FANOUT_MODE', 'off')
+# PDFs con menos páginas siguen el camino de una sola invocación
+FANOUT_MIN_PAGES = int(os.environ.get('FANOUT_MIN_PAGES', '150'))
+FANOUT_PAGES_PER_SEGMENT = int(os.environ.get('FANOUT_PAGES_PER_SEGMENT', '50'))
+# Con más segmentos se agrandan: acota invocaciones y fronteras que coser
+FANOUT_MAX_SEGMENTS = int(os.environ.get('FANOUT_MAX_SEGMENTS', '40'))
+FANOUT_LOCAL_CONCURRENCY = int(os.environ.get('FANOUT_LOCAL_CONCURRENCY', '4'))
+# Timeout de la máquina de estados: un intento "running" más antiguo murió sin pasar por el Catch
+FANOUT_EXECUTION_TIMEOUT_SECONDS = int(os.environ.get('FANOUT_EXECUTION_TIMEOUT_SECONDS', str(6 * 3600)))
+
+_store = None
+
+
+def get_fanout_mode(tenant_id: Optional[str] = None) -> str:
+    mode = str(get_setting('FANOUT_MODE', FANOUT_MODE, tenant_id)).lower()
+    if mode not in FANOUT_MODES:
+        raise ValueError(f"FANOUT_MODE no soportado: {mode}. Opciones: {', '.join(FANOUT_MODES)}")
+    return mode
+
+
+class S3FanoutStore:
+    """
+    Estado de cada trabajo compartido entre invocaciones: {prefix}{job_id}/{nombre}.json
+
+    Step Functions solo pasa job_id y número de segmento; los chunk_ids y los
+    textos de frontera no caben en los 256 KB de estado de una ejecución.
+    """
+
+    def __init__(self, bucket: str, prefix: str = 'fanout-jobs/'):
+        self.s3_client = get_s3_client()
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, job_id: str, name: str) -> Optional[Dict]:
+        try:
+            body = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{job_id}/{name}.json")['Body'].read()
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if code in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(body)
+
+    def put(self, job_id: str, name: str, data: Dict):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{job_id}/{name}.json",
+            Body=json.dumps(data, ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+
+class MemoryFanoutStore:
+    """
+    Estado en memoria del proceso: suficiente para el ejecutor local
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def get(self, job_id: str, name: str) -> Optional[Dict]:
+        with self.lock:
+            data = self.objects.get((job_id, name))
+        return json.loads(data) if data is not None else None
+
+    def put(self, job_id: str, name: str, data: Dict):
+        with self.lock:
+            self.objects[(job_id, name)] = json.dumps(data, ensure_ascii=False)
+
+
+def get_fanout_store():
+    global _store
+    if _store is None:
+        bucket = os.environ.get('FANOUT_BUCKET')
+        _store = S3FanoutStore(bucket, os.environ.get('FANOUT_PREFIX', 'fanout-jobs/')) if bucket else MemoryFanoutStore()
+    return _store
+
+
+def plan_segments(total_pages: int, pages_per_segment: int = FANOUT_PAGES_PER_SEGMENT,
+                  max_segments: int = FANOUT_MAX_SEGMENTS) -> List[Tuple[int, int]]:
+    """
+    Rangos de páginas [inicio, fin) de cada segmento
+    """
+    pages_per_segment = max(1, pages_per_segment, -(-total_pages // max(1, max_segments)))
+    return [(start, min(start + pages_per_segment, total_pages)) for start in range(0, total_pages, pages_per_segment)]
+
+
+def build_job_id(bucket: str, object_key: str, version: str, segments: List[Tuple[int, int]]) -> str:
+    # Determinista: una re-entrega del mismo archivo reutiliza el trabajo; otro reparto de
+    # páginas es otro trabajo y no mezcla resultados de segmentos. Cada ejecución añade su intento
+    plan = ','.join(f"{start}-{end}" for start, end in segments)
+    return hashlib.sha256(f"{bucket}/{object_key}@{version}#{plan}".encode('utf-8')).hexdigest()[:40]
+
+
+def plan_fanout(s3_client, bucket_name: str, object_key: str, tenant_id: str, document_type: str,
+                filename: str) -> Optional[Dict]:
+    """
+    Coordinador: decide si el PDF se reparte y deja el manifiesto del trabajo en el almacén
+
+    Returns:
+        El manifiesto, o None si el PDF se procesa en una sola invocación
+    """
+    mode = get_fanout_mode(tenant_id)
+    if mode == 'off':
+        return None
+
+    head = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+    object_size = head['ContentLength']
+    backend = get_setting('PDF_EXTRACTOR', 'pypdf2', tenant_id)
+    # Solo se leen el xref y el árbol de páginas (unos pocos GETs por rangos)
+    total_pages = get_pdf_page_count(S3Location(bucket_name, object_key, object_size), backend)
+
+    min_pages = int(get_setting('FANOUT_MIN_PAGES', FANOUT_MIN_PAGES, tenant_id))
+    segments = plan_segments(total_pages)
+    if total_pages < min_pages or len(segments) < 2:
+        return None
+
+    job_id = build_job_id(bucket_name, object_key, head.get('ETag', str(object_size)), segments)
+    job = {
+        "job_id": job_id,
+        "mode": mode,
+        "bucket": bucket_name,
+        "object_key": object_key,
+        "object_size": object_size,
+        "tenant_id": tenant_id,
+        "document_type": document_type,
+        "filename": filename,
+        "backend": backend,
+        "dimensions": get_tenant_vector_spec(tenant_id)["dimension"],
+        "total_pages": total_pages,
+        "segments": segments,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+    store = get_fanout_store()
+    if is_attempt_running(store.get(job_id, 'status')):
+        # Re-entrega del mensaje con una ejecución en curso: no se pisa su estado
+        return store.get(job_id, 'manifest') or job
+
+    # Los chunks ya indexados se leen una vez: los workers no re-embeben contenido conocido
+    # y el finalizador borra los que ya no aparecen
+    store.put(job_id, 'existing', get_existing_chunks(tenant_id, object_key))
+    store.put(job_id, 'manifest', job)
+    print(f"🧩 Fan-out {job_id}: {total_pages} páginas en {len(segments)} segmentos ({mode})")
+    return job
+
+
+def _load_job(store, job_id: str) -> Tuple[Dict, Dict]:
+    job = store.get(job_id, 'manifest')
+    if job is None:
+        raise ValueError(f"Trabajo de fan-out no encontrado: {job_id}")
+    return job, store.get(job_id, 'existing') or {}
+
+
+def _known_content_hashes(existing_chunks: Dict) -> set:
+    return {chunk['content_hash'] for chunk in existing_chunks.values() if chunk.get('content_hash')}
+
+
+def _hold_back_edges(chunks: Iterable[str], edges: Dict, head: bool, tail: bool) -> Iterator[str]:
+    """
+    Deja pasar los chunks interiores y guarda en edges el primero (head) y el último (tail)
+
+    Son los que el límite de páginas puede haber cortado: el finalizador los
+    vuelve a partir junto con los del segmento vecino.
+    """
+    iterator = iter(chunks)
+    if head:
+        edges["head"] = next(iterator, '')
+    previous = None
+    for chunk in iterator:
+        if previous is not None:
+            yield previous
+        previous = chunk
+    if previous is not None:
+        if tail:
+            edges["tail"] = previous
+        else:
+            yield previous
+
+
+def process_segment(job_id: str, segment: int, extraction_workers: Optional[int] = None) -> Dict:
+    """
+    Worker: extrae, parte, embebe e indexa las páginas de un segmento
+
+    Los chunks quedan con chunk_index relativo al segmento; el finalizador los
+    renumera cuando conoce cuántos chunks produjo cada segmento.
+    """
+    try:
+        store = get_fanout_store()
+        job, existing_chunks = _load_job(store, job_id)
+        known_content_hashes = _known_content_hashes(existing_chunks)
+        start_page, end_page = job["segments"][segment]
+        print(f"📄 Segmento {segment + 1}/{len(job['segments'])} de {job['object_key']}: páginas {start_page + 1}-{end_page}")
+
+        pages = (
+            clean_extracted_text(page_text)
+            for page_text in iter_pdf_pages(
+                S3Location(job["bucket"], job["object_key"], job["object_size"]),
+                workers=extraction_workers,
+                backend=job["backend"],
+                start_page=start_page,
+                end_page=end_page
+            )
+        )
+        edges = {"head": '', "tail": ''}
+        chunks = _hold_back_edges(
+            iter_chunks(pages, PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP),
+            edges,
+            head=segment > 0,
+            tail=segment < len(job["segments"]) - 1
+        )
+
+        def batches():
+            start_index = 0
+            for batch in batched(chunks, INGEST_BATCH_SIZE):
+                yield start_index, batch, embed_new_chunks(batch, known_content_hashes, job["dimensions"])
+                start_index += len(batch)
+
+        chunk_positions = {}
+        result = opensearch_indexing_batches(
+            batches(),
+            job["tenant_id"],
+            job["document_type"],
+            job["object_key"],
+            job["filename"],
+            existing_chunks,
+            chunk_positions=chunk_positions,
+            finalize=False
+        )
+        if not result.get('success'):
+            return {"success": False, "message": f"Segmento {segment}: {result.get('message')}"}
+
+        store.put(job_id, f"segment-{segment:04d}", {
+            "segment": segment,
+            "pages": [start_page, end_page],
+            "chunks": list(chunk_positions.items()),
+            "chunks_count": result["details"]["chunks_count"],
+            "head": edges["head"],
+            "tail": edges["tail"]
+        })
+        return {
+            "success": True,
+            "message": f"Segmento {segment} indexado",
+            "details": {"segment": segment, **result["details"]}
+        }
+
+    except Exception as e:
+        print(f"❌ Error en segmento {segment} de {job_id}: {str(e)}")
+        return {"success": False, "message": f"Error en segmento {segment}: {str(e)}"}
+
+
+def finalize_fanout(job_id: str) -> Dict:
+    """
+    Finalizador: cose las fronteras entre segmentos y deja el documento como una ingesta normal
+
+    - La cola del segmento k y la cabeza del k+1 se vuelven a partir juntas, así
+      los chunks cruzan el límite de páginas como en el camino secuencial.
+    - chunk_index pasa a ser global: desplazamiento del segmento + índice local.
+    - Los chunks del documento que ya no aparecen se borran y el tenant se reubica.
+    """
+    try:
+        store = get_fanout_store()
+        job, existing_chunks = _load_job(store, job_id)
+        tenant_id = job["tenant_id"]
+        source_document = get_source_document(job["object_key"])
+
+        segments = []
+        for segment in range(len(job["segments"])):
+            result = store.get(job_id, f"segment-{segment:04d}")
+            if result is None:
+                return {"success": False, "message": f"Falta el resultado del segmento {segment}"}
+            segments.append(result)
+
+        boundaries = []
+        for left, right in zip(segments, segments[1:]):
+            text = '\n'.join(part for part in (left["tail"], right["head"]) if part)
+            boundaries.append(get_chunks(text, PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP) if text else [])
+
+        # chunk_id → chunk_index definitivo (primera aparición) y el que dejó escrito su worker
+        final_positions = {}
+        written_positions = {}
+
+        def place(chunk_id, final_index, written_index):
+            if chunk_id in final_positions:
+                # Contenido repetido entre partes: no se sabe qué escritura ganó, se fija siempre
+                written_positions[chunk_id] = None
+                return
+            final_positions[chunk_id] = final_index
+            written_positions[chunk_id] = written_index
+
+        boundary_batches = []
+        offset = 0
+        for segment, result in enumerate(segments):
+            for chunk_id, local_index in result["chunks"]:
+                place(chunk_id, offset + local_index, local_index)
+            offset += result["chunks_count"]
+
+            boundary_chunks = boundaries[segment] if segment < len(boundaries) else []
+            if boundary_chunks:
+                boundary_batches.append((offset, boundary_chunks))
+                for index, chunk in enumerate(boundary_chunks, offset):
+                    place(generate_chunk_id(tenant_id, source_document, generate_content_hash(chunk)), index, index)
+                offset += len(boundary_chunks)
+
+        if not final_positions:
+            return {"success": False, "message": "No se generaron chunks para indexar"}
+
+        known_content_hashes = _known_content_hashes(existing_chunks)
+        result = opensearch_indexing_batches(
+            (
+                (start_index, chunks, embed_new_chunks(chunks, known_content_hashes, job["dimensions"]))
+                for start_index, chunks in boundary_batches
+            ),
+            tenant_id,
+            job["document_type"],
+            job["object_key"],
+            job["filename"],
+            existing_chunks,
+            finalize=False
+        )
+        if not result.get('success'):
+            return result
+
+        opensearch_client = create_opensearch_client()
+        index_name = get_placement(opensearch_client, tenant_id)["index"]
+
+        # Solo metadatos: los chunks de los segmentos posteriores al primero cambian de posición
+        renumbered = [
+            {
+                "chunk_id": chunk_id,
+                "chunk_index": final_index,
+                "source_file": job["object_key"],
+                "document_type": job["document_type"],
+                "file_format": '.pdf'
+            }
+            for chunk_id, final_index in final_positions.items()
+            if written_positions[chunk_id] != final_index
+        ]
+        if renumbered and not index_document_bulk(opensearch_client, index_name, renumbered, tenant_id):
+            return {"success": False, "message": "Error renumerando chunks del documento"}
+
+        stale_ids = [chunk_id for chunk_id in existing_chunks if chunk_id not in final_positions]
+        if not delete_documents_bulk(opensearch_client, index_name, stale_ids):
+            return {"success": False, "message": "Error eliminando chunks obsoletos"}
+
+        invalidate_tenant_queries(tenant_id)
+        try:
+            rebalance_tenant(opensearch_client, tenant_id)
+        except Exception as e:
+            print(f"⚠️ No se pudo reubicar el tenant {tenant_id}, se reintentará en la próxima ingesta: {str(e)}")
+
+        details = {
+            "job_id": job_id,
+            "tenant_id": tenant_id,
+            "index_name": index_name,
+            "filename": job["filename"],
+            "document_type": job["document_type"],
+            "total_pages": job["total_pages"],
+            "segments": len(segments),
+            "chunks_count": offset,
+            "boundary_chunks": sum(len(chunks) for _, chunks in boundary_batches),
+            "chunks_renumbered": len(renumbered),
+            "chunks_deleted": len(stale_ids)
+        }
+        store.put(job_id, 'result', details)
+        status = store.get(job_id, 'status')
+        if status:
+            store.put(job_id, 'status', dict(status, state="succeeded", finished_at=time.time()))
+        print(f"🎉 Fan-out {job_id} finalizado: {offset} chunks de {len(segments)} segmentos")
+        return {
+            "success": True,
+            "message": f"Documento procesado e indexado: {offset} elementos",
+            "details": details
+        }
+
+    except Exception as e:
+        print(f"❌ Error finalizando fan-out {job_id}: {str(e)}")
+        return {"success": False, "message": f"Error finalizando fan-out: {str(e)}"}
+
+
+class LocalFanoutExecutor:
+    """
+    Ejecuta los segmentos en hilos del proceso actual y después el finalizador
+
+    Mismo contrato que la máquina de estados: cada segmento es independiente y
+    el finalizador solo ve lo que dejaron en el almacén.
+    """
+
+    def __init__(self, max_workers: int = FANOUT_LOCAL_CONCURRENCY, extraction_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self.extraction_workers = extraction_workers
+
+    def run(self, job: Dict) -> Dict:
+        segments = range(len(job["segments"]))
+        workers = max(1, min(self.max_workers, len(segments)))
+        # Los procesos de extracción se reparten entre los segmentos simultáneos
+        extraction_workers = max(1, (self.extraction_workers or get_extraction_workers()) // workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda segment: process_segment(job["job_id"], segment, extraction_workers),
+                segments
+            ))
+
+        failed = [result for result in results if not result.get('success')]
+        if failed:
+            return {"success": False, "message": f"{len(failed)} segmentos fallaron: {failed[0]['message']}"}
+        return finalize_fanout(job["job_id"])
+
+
+def is_attempt_running(status: Optional[Dict]) -> bool:
+    return bool(status) and status.get("state") == 'running' and \
+        time.time() - status.get("started_at", 0) < FANOUT_EXECUTION_TIMEOUT_SECONDS
+
+
+def start_fanout(job: Dict, extraction_workers: Optional[int] = None) -> Dict:
+    """
+    Lanza los workers del trabajo según su modo (local o Step Functions)
+
+    Cada ejecución de Step Functions se llama {job_id}-{intento}: tras un fallo,
+    volver a subir el mismo archivo (o reenviarlo desde la DLQ) lanza un intento
+    nuevo. Mientras un intento está en curso, las re-entregas no lanzan otro.
+    """
+    if job["mode"] == 'local':
+        return LocalFanoutExecutor(extraction_workers=extraction_workers).run(job)
+
+    state_machine_arn = os.environ.get('FANOUT_STATE_MACHINE_ARN')
+    if not state_machine_arn:
+        raise ValueError("Variable FANOUT_STATE_MACHINE_ARN no configurada")
+
+    store = get_fanout_store()
+    status = store.get(job["job_id"], 'status')
+    details = {"job_id": job["job_id"], "total_pages": job["total_pages"], "segments": len(job["segments"])}
+    if is_attempt_running(status):
+        print(f"ℹ️ La ejecución {status['execution']} sigue en curso (re-entrega del mismo archivo)")
+        return {"success": True, "message": f"Procesamiento distribuido en curso: {len(job['segments'])} segmentos", "details": details}
+
+    attempt = (status or {}).get("attempt", 0) + 1
+    execution_name = f"{job['job_id']}-{attempt:03d}"
+    store.put(job["job_id"], 'status', {
+        "state": "running", "attempt": attempt, "execution": execution_name, "started_at": time.time()
+    })
+
+    try:
+        get_stepfunctions_client().start_execution(
+            stateMachineArn=state_machine_arn,
+            name=execution_name,
+            input=json.dumps({"job_id": job["job_id"], "segments": list(range(len(job["segments"])))})
+        )
+        print(f"🚀 Ejecución {execution_name} iniciada con {len(job['segments'])} segmentos")
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ExecutionAlreadyExists':
+            raise
+        # Dos contenedores con el mismo mensaje han llegado al mismo intento
+        print(f"ℹ️ La ejecución {execution_name} ya existe (re-entrega del mismo archivo)")
+
+    return {
+        "success": True,
+        "message": f"Procesamiento distribuido iniciado: {len(job['segments'])} segmentos",
+        "details": dict(details, execution=execution_name)
+    }
+
+
+def fail_fanout(job_id: str, execution_name: str, error: Optional[Dict] = None) -> Dict:
+    """
+    Catch de la máquina de estados: marca el intento como fallido y reenvía el PDF a la DLQ de ingesta
+
+    El mensaje de SQS original ya se confirmó al arrancar la ejecución. El
+    registro de S3 que se deja en la DLQ avisa del fallo (alarmas de la cola)
+    y, redirigido a la cola de ingesta, lanza un intento nuevo.
+    """
+    store = get_fanout_store()
+    status = store.get(job_id, 'status') or {}
+    if status.get("execution") not in (None, execution_name):
+        # Ya hay un intento posterior: su estado no se toca
+        print(f"ℹ️ Fallo de {execution_name} ignorado: el intento en curso es {status['execution']}")
+        return {"success": True, "message": "Intento anterior fallido"}
+
+    error = error or {}
+    cause = str(error.get("Cause", ''))[:2000]
+    store.put(job_id, 'status', dict(status, state="failed", failed_at=time.time(), error=error.get("Error"), cause=cause))
+    print(f"❌ Fan-out {execution_name} fallido: {error.get('Error')} {cause[:300]}")
+
+    job = store.get(job_id, 'manifest')
+    dead_letter_url = os.environ.get('INGEST_DLQ_URL')
+    if job and dead_letter_url:
+        record = {"s3": {
+            "bucket": {"name": job["bucket"]},
+            "object": {"key": urllib.parse.quote_plus(job["object_key"], safe='/'), "size": job["object_size"]}
+        }}
+        get_client('sqs').send_message(
+            QueueUrl=dead_letter_url,
+            MessageBody=json.dumps({"Records": [record], "fanout_failure": {"job_id": job_id, "execution": execution_name}})
+        )
+        print(f"📮 {job['object_key']} enviado a la DLQ de ingesta")
+    return {"success": True, "message": f"Fan-out {execution_name} marcado como fallido"}
+
+
+def handle_fanout_stage(event: Dict) -> Dict:
+    """
+    Estados de la máquina de fan-out (process.lambda_handler delega aquí)
+
+    Un fallo se lanza como ValueError para que Step Functions reintente el estado.
+    """
+    stage = event.get('fanout_stage')
+    if stage == 'segment':
+        result = process_segment(event['job_id'], int(event['segment']))
+    elif stage == 'finalize':
+        result = finalize_fanout(event['job_id'])
+    elif stage == 'failed':
+        result = fail_fanout(event['job_id'], event.get('execution'), event.get('error'))
+    else:
+        raise ValueError(f"Etapa de fan-out desconocida: {stage}")
+
+    if not result.get('success'):
+        raise ValueError(result.get('message'))
+    return result
@@ -0,0 +1,131 @@
+import io
+import os
+from typing import Dict, Optional
+
+
+# Lado mayor (px) con el que se envía la imagen a cada modelo. Rekognition detecta
+# texto pequeño mejor con algo más de resolución; el embedding no gana nada con fotos de 12 MP
+IMAGE_REKOGNITION_MAX_SIDE = int(os.environ.get('IMAGE_REKOGNITION_MAX_SIDE', '1920'))
+IMAGE_EMBEDDING_MAX_SIDE = int(os.environ.get('IMAGE_EMBEDDING_MAX_SIDE', '1024'))
+IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', '85'))
+
+# Límite de Rekognition para imágenes en línea (Image.Bytes); por encima se usa Image.S3Object
+REKOGNITION_MAX_INLINE_BYTES = 5 * 1024 * 1024
+
+EXIF_ORIENTATION = 0x0112
+
+# Formatos de imagen que acepta /upload; todos se normalizan a JPEG (o PNG tal cual) antes de los modelos
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Formatos que Rekognition y Titan aceptan directamente
+MODEL_NATIVE_FORMATS = ('JPEG', 'PNG')
+
+
+def _load_pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def _to_rgb(Image, image):
+    # Transparencias sobre fondo blanco: convert('RGB') las dejaría en negro
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image if image.mode == 'RGB' else image.convert('RGB')
+
+
+def _encode_jpeg(Image, image, max_side: int) -> bytes:
+    resized = image.copy()
+    resized.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = io.BytesIO()
+    resized.save(output, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def sniff_image_format(image_bytes: bytes) -> Optional[str]:
+    """
+    Formato por la firma del archivo (sin decodificar, y sin Pillow)
+    """
+    if image_bytes[:3] == b'\xff\xd8\xff':
+        return 'JPEG'
+    if image_bytes[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'PNG'
+    if image_bytes[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def prepare_image_variants(image_bytes: bytes) -> Dict:
+    """
+    Versiones de la imagen para Rekognition y para el embedding de Titan
+
+    La imagen se decodifica una sola vez; en JPEG el decodificador ya reduce por
+    DCT (1/2, 1/4, 1/8) y no llega a cargar la resolución completa en memoria.
+    Se aplica la orientación EXIF de las fotos de móvil. GIF (primer fotograma)
+    y WebP se convierten a JPEG; un JPEG o PNG que ya cabe en el tamaño de un
+    modelo se envía tal cual, sin recomprimir.
+
+    Sin Pillow, o si la imagen no se puede decodificar, se devuelven los bytes
+    originales cuando los modelos los aceptan (JPEG, PNG); si no, ValueError.
+
+    Returns:
+        {"rekognition": bytes, "embedding": bytes, "width", "height"} (dimensiones originales)
+    """
+    original = {"rekognition": image_bytes, "embedding": image_bytes, "width": None, "height": None}
+    image_format = sniff_image_format(image_bytes)
+
+    def fallback(reason):
+        if image_format not in MODEL_NATIVE_FORMATS:
+            raise ValueError(f"Imagen {image_format or 'de formato desconocido'} no convertible: {reason}")
+        print(f"⚠️ {reason}: la imagen se envía sin reducir")
+        return original
+
+    pillow = _load_pillow()
+    if pillow is None:
+        return fallback("Pillow no disponible")
+    Image, ImageOps = pillow
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+            keep_original = image.format in MODEL_NATIVE_FORMATS and image.getexif().get(EXIF_ORIENTATION, 1) == 1
+
+            largest = max(IMAGE_REKOGNITION_MAX_SIDE, IMAGE_EMBEDDING_MAX_SIDE)
+            image.draft('RGB', (largest, largest))
+            image = _to_rgb(Image, ImageOps.exif_transpose(image))
+
+            variants = {"width": width, "height": height}
+            for name, max_side in (("rekognition", IMAGE_REKOGNITION_MAX_SIDE), ("embedding", IMAGE_EMBEDDING_MAX_SIDE)):
+                if keep_original and max(width, height) <= max_side:
+                    variants[name] = image_bytes
+                else:
+                    variants[name] = _encode_jpeg(Image, image, max_side)
+
+    except Exception as e:
+        return fallback(f"No se pudo preprocesar la imagen ({str(e)})")
+
+    print(f"🪄 Imagen {width}x{height} ({len(image_bytes) // 1024} KB) → Rekognition {len(variants['rekognition']) // 1024} KB, "
+          f"embedding {len(variants['embedding']) // 1024} KB")
+    return variants
+
+
+def build_rekognition_image(image_bytes: bytes, s3_object: Optional[Dict] = None) -> Dict:
+    """
+    Parámetro Image de Rekognition: bytes en línea o, por encima del límite, el objeto S3 original
+
+    Args:
+        s3_object: {"Bucket": ..., "Name": ...} del archivo subido
+    """
+    if len(image_bytes) <= REKOGNITION_MAX_INLINE_BYTES:
+        return {'Bytes': image_bytes}
+    if s3_object:
+        print(f"📎 Imagen de {len(image_bytes) // 1024} KB: Rekognition la lee desde s3://{s3_object['Bucket']}/{s3_object['Name']}")
+        return {'S3Object': s3_object}
+    raise ValueError(f"Imagen de {len(image_bytes)} bytes supera el límite en línea de Rekognition y no hay referencia S3")
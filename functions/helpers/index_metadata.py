@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from opensearchpy import OpenSearch
+from opensearchpy.exceptions import NotFoundError, TransportError
+
+from helpers.index_profiles import vector_spec_from_mapping
+
+
+# Metadatos de índices rag-documents-* en el contenedor caliente: evita un round-trip firmado por consulta
+INDEX_METADATA_TTL_SECONDS = float(os.environ.get('INDEX_METADATA_TTL_SECONDS', '300'))
+# Un índice ausente se vuelve a comprobar antes: la primera ingesta del tenant lo crea
+MISSING_INDEX_TTL_SECONDS = float(os.environ.get('MISSING_INDEX_TTL_SECONDS', '30'))
+
+_metadata: Dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+def is_index_not_found(error: Exception) -> bool:
+    if isinstance(error, NotFoundError):
+        return True
+    return isinstance(error, TransportError) and error.error == 'index_not_found_exception'
+
+
+def _store(index_name: str, metadata: Dict, ttl_seconds: float) -> Dict:
+    with _lock:
+        _metadata[index_name] = (time.time() + ttl_seconds, metadata)
+    return metadata
+
+
+def remember_index(index_name: str, vector: Optional[Dict], fields: Iterable[str]) -> Dict:
+    return _store(
+        index_name,
+        {"exists": True, "dimension": (vector or {}).get("dimension"), "vector": vector, "fields": frozenset(fields)},
+        INDEX_METADATA_TTL_SECONDS
+    )
+
+
+def forget_index(index_name: str) -> Dict:
+    """
+    Marca el índice como inexistente (p.ej. tras un index_not_found en una búsqueda)
+    """
+    return _store(index_name, {"exists": False, "dimension": None, "vector": None, "fields": frozenset()}, MISSING_INDEX_TTL_SECONDS)
+
+
+def invalidate_index(index_name: str):
+    with _lock:
+        _metadata.pop(index_name, None)
+
+
+def get_index_metadata(client: OpenSearch, index_name: str) -> Dict:
+    """
+    Existencia, campo vectorial (dimensión, motor, tipo) y campos mapeados de un índice (cacheados con TTL)
+
+    Un solo get_mapping responde a las tres preguntas; con la caché caliente no hay round-trip.
+    """
+    with _lock:
+        entry = _metadata.get(index_name)
+    if entry and entry[0] > time.time():
+        return entry[1]
+
+    try:
+        response = client.indices.get_mapping(index=index_name)
+    except Exception as e:
+        if is_index_not_found(e):
+            return forget_index(index_name)
+        raise
+
+    properties = response.get(index_name, {}).get('mappings', {}).get('properties', {})
+    embedding_mapping = properties.get('embedding')
+    return remember_index(index_name, vector_spec_from_mapping(embedding_mapping) if embedding_mapping else None, properties.keys())
@@ -0,0 +1,441 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from opensearchpy import OpenSearch
+
+from helpers.settings import get_setting
+from helpers.aws_clients import get_client, get_opensearch_client
+from helpers.query_cache import TTLCache
+from helpers.index_metadata import get_index_metadata, forget_index, is_index_not_found
+from helpers.index_profiles import get_index_profile, encode_vector
+from helpers.bulk_writer import bulk_write
+
+
+# dedicated: un índice rag-documents-{tenant} por tenant (comportamiento original)
+# shared: tenants pequeños en índices compartidos por niveles de tamaño, filtrados por tenant_id
+TENANCY_MODES = ('dedicated', 'shared')
+
+# Niveles de índices compartidos, de menor a mayor. Un tenant empieza en el primero, sube
+# cuando supera max_chunks y pasado el último se promociona a un índice propio
+DEFAULT_SHARED_TIERS = [
+    {"name": "small", "max_chunks": 5000, "shards": 4},
+    {"name": "medium", "max_chunks": 50000, "shards": 2}
+]
+
+# Los índices compartidos filtran por tenant dentro del kNN: necesitan un motor con filtrado eficiente
+SHARED_INDEX_PROFILE = os.environ.get('SHARED_INDEX_PROFILE', 'faiss-fp32')
+
+# Cada cuánto se vuelve a leer la ubicación de un tenant (retraso máximo tras una migración)
+PLACEMENT_TTL_SECONDS = float(os.environ.get('PLACEMENT_TTL_SECONDS', '60'))
+
+MIGRATION_PAGE_SIZE = 500
+
+# Segundos de copia como máximo por paso de migración; el resto continúa en un mensaje nuevo
+MIGRATION_STEP_SECONDS = float(os.environ.get('MIGRATION_STEP_SECONDS', '300'))
+# Una migración sin avances en este tiempo (p.ej. su mensaje acabó en la DLQ) se re-encola en la próxima ingesta
+MIGRATION_STALL_SECONDS = float(os.environ.get('MIGRATION_STALL_SECONDS', '1800'))
+
+_placements = TTLCache(max_entries=10000)
+_store = None
+
+
+def get_tenancy_mode(tenant_id: Optional[str] = None) -> str:
+    mode = str(get_setting('TENANCY_MODE', 'dedicated', tenant_id)).lower()
+    if mode not in TENANCY_MODES:
+        raise ValueError(f"TENANCY_MODE no soportado: {mode}. Opciones: {', '.join(TENANCY_MODES)}")
+    return mode
+
+
+def get_shared_tiers() -> List[Dict]:
+    try:
+        tiers = json.loads(os.environ.get('SHARED_INDEX_TIERS', '') or 'null') or DEFAULT_SHARED_TIERS
+    except json.JSONDecodeError as e:
+        print(f"⚠️ SHARED_INDEX_TIERS no es JSON válido, se usan los niveles por defecto: {str(e)}")
+        tiers = DEFAULT_SHARED_TIERS
+    return sorted(tiers, key=lambda tier: tier["max_chunks"])
+
+
+def dedicated_index_name(tenant_id: str) -> str:
+    return f"rag-documents-{tenant_id}"
+
+
+def shared_index_name(tier: Dict, tenant_id: str) -> str:
+    # Reparto estable: un tenant siempre cae en el mismo shard de su nivel
+    shard = int(hashlib.sha256(tenant_id.encode('utf-8')).hexdigest(), 16) % max(1, tier["shards"])
+    return f"rag-shared-{tier['name']}-{shard:02d}"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _dedicated_placement(tenant_id: str) -> Dict:
+    return {"tenant_id": tenant_id, "tier": "dedicated", "index": dedicated_index_name(tenant_id), "shared": False}
+
+
+def _shared_placement(tenant_id: str, tier: Dict) -> Dict:
+    return {"tenant_id": tenant_id, "tier": tier["name"], "index": shared_index_name(tier, tenant_id), "shared": True}
+
+
+class S3PlacementStore:
+    """
+    Ubicación de cada tenant compartida entre Lambdas: {prefix}{tenant_id}.json
+    """
+
+    def __init__(self, bucket: str, prefix: str = 'index-placement/'):
+        from helpers.aws_clients import get_s3_client
+        self.s3_client = get_s3_client()
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, tenant_id: str) -> Optional[Dict]:
+        try:
+            body = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{tenant_id}.json")['Body'].read()
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if code in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(body)
+
+    def put(self, tenant_id: str, placement: Dict):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{tenant_id}.json",
+            Body=json.dumps(placement, ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+
+def get_placement_store() -> Optional[S3PlacementStore]:
+    global _store
+    bucket = os.environ.get('PLACEMENT_BUCKET')
+    if _store is None and bucket:
+        _store = S3PlacementStore(bucket, os.environ.get('PLACEMENT_PREFIX', 'index-placement/'))
+    return _store
+
+
+def _save_placement(tenant_id: str, placement: Dict):
+    placement = dict(placement, updated_at=_now())
+    store = get_placement_store()
+    if store:
+        store.put(tenant_id, placement)
+    _placements.put(tenant_id, placement, PLACEMENT_TTL_SECONDS)
+    return placement
+
+
+def get_placement(client: OpenSearch, tenant_id: str) -> Dict:
+    """
+    Índice físico del tenant: único punto donde se decide dónde leer y escribir
+
+    Returns:
+        Diccionario con tier, index y shared (más previous_index durante una migración)
+    """
+    if get_tenancy_mode(tenant_id) == 'dedicated':
+        return _dedicated_placement(tenant_id)
+
+    placement = _placements.get(tenant_id)
+    if placement:
+        return placement
+
+    store = get_placement_store()
+    placement = store.get(tenant_id) if store else None
+    if placement is None:
+        if get_index_metadata(client, dedicated_index_name(tenant_id))["exists"]:
+            # Tenants con índice propio anterior al modo compartido lo conservan
+            placement = _dedicated_placement(tenant_id)
+        else:
+            placement = _shared_placement(tenant_id, get_shared_tiers()[0])
+        placement["persisted"] = False
+
+    _placements.put(tenant_id, placement, PLACEMENT_TTL_SECONDS)
+    return placement
+
+
+def get_placement_profile(placement: Dict, tenant_id: str) -> Dict:
+    """
+    Perfil con el que se crea el índice de una ubicación (el compartido no depende del tenant)
+    """
+    if placement["shared"]:
+        return get_index_profile(name=SHARED_INDEX_PROFILE)
+    return get_index_profile(tenant_id)
+
+
+def count_tenant_chunks(client: OpenSearch, index_name: str, tenant_id: str) -> int:
+    try:
+        response = client.search(index=index_name, body={
+            "size": 0,
+            "track_total_hits": True,
+            "query": {"term": {"tenant_id": tenant_id}}
+        })
+    except Exception as e:
+        if is_index_not_found(e):
+            forget_index(index_name)
+            return 0
+        raise
+    return response.get('hits', {}).get('total', {}).get('value', 0)
+
+
+def _iter_tenant_hits(client: OpenSearch, index_name: str, tenant_id: str, source=True, extra_filters=None,
+                      search_after=None) -> Iterator[List[Dict]]:
+    # Los índices compartidos solo contienen chunks con chunk_id (escritos por la ingesta incremental)
+    while True:
+        body = {
+            "size": MIGRATION_PAGE_SIZE,
+            "query": {"bool": {"filter": [{"term": {"tenant_id": tenant_id}}] + (extra_filters or [])}},
+            "sort": [{"chunk_id": "asc"}],
+            "_source": source
+        }
+        if search_after:
+            body["search_after"] = search_after
+        try:
+            hits = client.search(index=index_name, body=body).get('hits', {}).get('hits', [])
+        except Exception as e:
+            if is_index_not_found(e):
+                return
+            raise
+        if hits:
+            yield hits
+        if len(hits) < MIGRATION_PAGE_SIZE:
+            return
+        search_after = hits[-1]['sort']
+
+
+def _copy_hits(client: OpenSearch, hits: List[Dict], target_index: str, source_vector: Dict, target_vector: Dict) -> bool:
+    operations = []
+    for hit in hits:
+        document = hit['_source']
+        if source_vector != target_vector and document.get('embedding') is not None:
+            document['embedding'] = encode_vector(document['embedding'], target_vector)
+        operations.append(({"index": {"_index": target_index, "_id": hit['_id']}}, document))
+    return bulk_write(client, operations, "migración")["success"]
+
+
+def _prepare_migration_target(client: OpenSearch, tenant_id: str, source_index: str, target: Dict):
+    # Crea el índice destino con la dimensión de los vectores de origen; devuelve (vector origen, vector destino)
+    from helpers.rag_helpers import create_index_if_not_exists
+
+    source_vector = get_index_metadata(client, source_index)["vector"]
+    target_profile = get_placement_profile(target, tenant_id)
+    if source_vector and target_profile["dimension"] != source_vector["dimension"]:
+        # Los vectores existentes no sirven en otra dimensión: el índice destino hereda la de origen
+        print(f"⚠️ El perfil {target_profile['name']} pide {target_profile['dimension']} dimensiones; se mantienen {source_vector['dimension']}")
+        target_profile["dimension"] = source_vector["dimension"]
+
+    if not create_index_if_not_exists(client, target["index"], profile=target_profile):
+        raise ValueError(f"No se pudo crear el índice destino {target['index']}")
+    target_vector = get_index_metadata(client, target["index"])["vector"]
+    if source_vector and target_vector and source_vector["dimension"] != target_vector["dimension"]:
+        raise ValueError(
+            f"{target['index']} tiene {target_vector['dimension']} dimensiones y {source_index} {source_vector['dimension']}: "
+            f"hay que re-ingestar el tenant"
+        )
+    return source_vector, target_vector
+
+
+def enqueue_migration(tenant_id: str) -> bool:
+    """
+    Encola un paso de la migración del tenant en la cola de ingesta (lo consume la Lambda de proceso)
+    """
+    queue_url = os.environ.get('PLACEMENT_MIGRATION_QUEUE_URL')
+    if not queue_url:
+        print(f"⚠️ Sin PLACEMENT_MIGRATION_QUEUE_URL no se puede encolar la migración de {tenant_id}")
+        return False
+    get_client('sqs').send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps({"placement_migration": {"tenant_id": tenant_id}})
+    )
+    return True
+
+
+def start_migration(tenant_id: str, placement: Dict, target: Dict) -> Dict:
+    """
+    Registra la migración pendiente en la ubicación del tenant y encola su primer paso
+
+    La ingesta solo llama a esto: la copia corre en pasos asíncronos (migrate_tenant).
+    Hasta el cambio final se sigue leyendo y escribiendo en el índice de origen.
+    """
+    # Se relee la ubicación: otro contenedor puede haber empezado ya la migración
+    current = get_placement_store().get(tenant_id) or placement
+    if current.get("migration") or current["index"] != placement["index"]:
+        return current
+
+    migration = {"target": target, "started_at": _now(), "search_after": None, "copied": 0, "updated_at": time.time()}
+    placement = _save_placement(tenant_id, dict(current, migration=migration))
+    enqueue_migration(tenant_id)
+    print(f"📨 Migración de {tenant_id} encolada: {placement['index']} → {target['index']}")
+    return placement
+
+
+def migrate_tenant(client: OpenSearch, tenant_id: str, deadline: float) -> Optional[Dict]:
+    """
+    Un paso de la migración pendiente del tenant: copia chunks hasta deadline y la activa al terminar
+
+    Los vectores se copian (recodificados si el tipo del índice destino es
+    otro), sin volver a llamar a Bedrock. Tras cada página se guarda el
+    search_after en la ubicación, así un paso interrumpido (timeout, error) se
+    retoma desde ahí. La copia en el índice de origen se borra más adelante
+    (finish_migration), cuando ningún contenedor pueda seguir usando la
+    ubicación anterior. Copiar dos veces la misma página es idempotente:
+    mismos _id y mismo destino.
+
+    Returns:
+        Ubicación resultante; conserva "migration" si queda trabajo
+    """
+    store = get_placement_store()
+    placement = store.get(tenant_id) if store else None
+    if not placement or not placement.get("migration"):
+        return placement
+
+    migration = placement["migration"]
+    target = migration["target"]
+    source_index = placement["index"]
+    source_vector, target_vector = _prepare_migration_target(client, tenant_id, source_index, target)
+
+    start = time.perf_counter()
+    copied = 0
+    print(f"🚚 Migrando tenant {tenant_id}: {source_index} → {target['index']} (ya copiados {migration['copied']})")
+    for hits in _iter_tenant_hits(client, source_index, tenant_id, search_after=migration["search_after"]):
+        if not _copy_hits(client, hits, target["index"], source_vector, target_vector):
+            raise ValueError(f"Error copiando chunks de {tenant_id} a {target['index']}")
+        copied += len(hits)
+        migration = dict(migration, search_after=hits[-1]['sort'], copied=migration["copied"] + len(hits), updated_at=time.time())
+        placement = _save_placement(tenant_id, dict(placement, migration=migration))
+        if time.time() >= deadline:
+            print(f"⏸️ Migración de {tenant_id} pausada: {migration['copied']} chunks copiados, continúa en otro paso")
+            return placement
+
+    placement = _save_placement(tenant_id, dict(
+        target, previous_index=source_index, migration_started_at=migration["started_at"], switched_at=time.time()
+    ))
+    print(f"✅ Tenant {tenant_id} en {target['index']}: {migration['copied']} chunks ({copied} en {time.perf_counter() - start:.1f}s)")
+    return placement
+
+
+def handle_migration_message(message: Dict, deadline: float) -> bool:
+    """
+    Mensaje {"placement_migration": {"tenant_id": ...}} de la cola de ingesta
+
+    Ejecuta un paso acotado a MIGRATION_STEP_SECONDS y, si queda trabajo,
+    encola el siguiente: cada paso es un mensaje nuevo, así los reintentos de
+    SQS (y la DLQ) solo cuentan fallos de un mismo paso.
+
+    Returns:
+        False si el paso falló y el mensaje debe reintentarse
+    """
+    tenant_id = message["tenant_id"]
+    try:
+        placement = migrate_tenant(get_opensearch_client(), tenant_id, min(deadline, time.time() + MIGRATION_STEP_SECONDS))
+    except Exception as e:
+        print(f"❌ Error migrando tenant {tenant_id}, se reintentará desde el último punto guardado: {str(e)}")
+        return False
+    if placement and placement.get("migration"):
+        return enqueue_migration(tenant_id)
+    return True
+
+
+def _present_ids(client: OpenSearch, index_name: str, tenant_id: str, ids: List[str], extra_filters=None) -> set:
+    # Cuáles de estos chunk_id tiene el tenant en index_name
+    hits = client.search(index=index_name, body={
+        "size": len(ids),
+        "query": {"bool": {"filter": [{"term": {"tenant_id": tenant_id}}, {"terms": {"chunk_id": ids}}] + (extra_filters or [])}},
+        "_source": ["chunk_id"]
+    }).get('hits', {}).get('hits', [])
+    return {hit['_id'] for hit in hits}
+
+
+def finish_migration(client: OpenSearch, tenant_id: str, placement: Dict) -> Dict:
+    """
+    Cierra una migración: lleva al destino lo que se escribió o borró en el
+    origen durante la copia y la ventana de caché de ubicaciones, y borra allí
+    los chunks del tenant
+
+    Las escrituras en el destino posteriores al cambio (created_at >= switched_at)
+    son las más recientes y no se tocan.
+    """
+    source_index = placement["previous_index"]
+    if time.time() - placement.get("switched_at", 0) < 2 * PLACEMENT_TTL_SECONDS:
+        return placement
+
+    target_index = placement["index"]
+    source_vector = get_index_metadata(client, source_index)["vector"]
+    target_vector = get_index_metadata(client, target_index)["vector"]
+    switched_at = datetime.fromtimestamp(placement["switched_at"], timezone.utc).isoformat()
+    after_switch = [{"range": {"created_at": {"gte": switched_at}}}]
+
+    # Chunks escritos o actualizados en el origen desde que empezó la copia
+    late_filter = [{"range": {"created_at": {"gte": placement["migration_started_at"]}}}]
+    for hits in _iter_tenant_hits(client, source_index, tenant_id, extra_filters=late_filter):
+        newer_ids = _present_ids(client, target_index, tenant_id, [hit['_id'] for hit in hits], after_switch)
+        late = [hit for hit in hits if hit['_id'] not in newer_ids]
+        if late and not _copy_hits(client, late, target_index, source_vector, target_vector):
+            raise ValueError(f"Error recuperando chunks tardíos de {tenant_id}")
+
+    # Chunks copiados que el origen borró después (chunks obsoletos de una re-ingesta)
+    removed_ids = []
+    before_switch = [{"range": {"created_at": {"lt": switched_at}}}]
+    for hits in _iter_tenant_hits(client, target_index, tenant_id, source=False, extra_filters=before_switch):
+        ids = [hit['_id'] for hit in hits]
+        present_ids = _present_ids(client, source_index, tenant_id, ids)
+        removed_ids.extend(chunk_id for chunk_id in ids if chunk_id not in present_ids)
+    if removed_ids:
+        operations = [({"delete": {"_index": target_index, "_id": chunk_id}}, None) for chunk_id in removed_ids]
+        if not bulk_write(client, operations, "borrados tardíos de migración")["success"]:
+            raise ValueError(f"Error propagando borrados de {tenant_id} a {target_index}")
+        print(f"🗑️ {len(removed_ids)} chunks de {tenant_id} borrados en el origen durante la migración")
+
+    stale_ids = [hit['_id'] for hits in _iter_tenant_hits(client, source_index, tenant_id, source=False) for hit in hits]
+    operations = [({"delete": {"_index": source_index, "_id": chunk_id}}, None) for chunk_id in stale_ids]
+    if not bulk_write(client, operations, "limpieza de migración")["success"]:
+        raise ValueError(f"Error borrando chunks de {tenant_id} en {source_index}")
+
+    print(f"🧹 {len(stale_ids)} chunks de {tenant_id} eliminados de {source_index}")
+    cleaned = {key: value for key, value in placement.items() if key not in ("previous_index", "migration_started_at", "switched_at")}
+    return _save_placement(tenant_id, cleaned)
+
+
+def rebalance_tenant(client: OpenSearch, tenant_id: str) -> Optional[Dict]:
+    """
+    Tras una ingesta: encola la subida del tenant de nivel (o a índice propio) si ha crecido
+
+    Nunca baja de nivel. La copia no corre aquí: un timeout a mitad de la
+    ingesta la dejaría a medias y reintentaría el archivo. Sin PLACEMENT_BUCKET las ubicaciones no se pueden
+    compartir entre Lambdas y el tenant se queda en el primer nivel.
+    """
+    if get_tenancy_mode(tenant_id) != 'shared':
+        return None
+
+    store = get_placement_store()
+    if store is None:
+        print("⚠️ TENANCY_MODE=shared sin PLACEMENT_BUCKET: no hay promoción de tenants")
+        return None
+
+    placement = get_placement(client, tenant_id)
+    migration = placement.get("migration")
+    if migration:
+        if time.time() - migration.get("updated_at", 0) > MIGRATION_STALL_SECONDS:
+            print(f"⚠️ Migración de {tenant_id} sin avances desde hace {MIGRATION_STALL_SECONDS:.0f}s: se vuelve a encolar")
+            placement = _save_placement(tenant_id, dict(placement, migration=dict(migration, updated_at=time.time())))
+            enqueue_migration(tenant_id)
+        return placement
+    if placement.get("previous_index"):
+        placement = finish_migration(client, tenant_id, placement)
+    if placement.pop("persisted", True) is False:
+        placement = _save_placement(tenant_id, placement)
+    if not placement["shared"]:
+        return placement
+
+    tiers = get_shared_tiers()
+    chunks = count_tenant_chunks(client, placement["index"], tenant_id)
+    current = next((position for position, tier in enumerate(tiers) if tier["name"] == placement["tier"]), 0)
+    target_position = next((position for position, tier in enumerate(tiers) if chunks <= tier["max_chunks"]), len(tiers))
+    if target_position <= current:
+        return placement
+
+    target = _shared_placement(tenant_id, tiers[target_position]) if target_position < len(tiers) else _dedicated_placement(tenant_id)
+    print(f"📈 Tenant {tenant_id} con {chunks} chunks supera el nivel {placement['tier']} → {target['tier']}")
+    return start_migration(tenant_id, placement, target)
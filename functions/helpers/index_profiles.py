@@ -0,0 +1,175 @@
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from helpers.settings import get_setting
+
+
+# Perfiles de índice vectorial. default reproduce el mapping original (nmslib, fp32, 1024-d);
+# los perfiles faiss usan producto interno sobre vectores normalizados (equivalente a coseno)
+INDEX_PROFILES = {
+    "default": {
+        "engine": "nmslib",
+        "space_type": "cosinesimil",
+        "data_type": "float",
+        "encoder": None,
+        "dimension": 1024,
+        "m": 16,
+        "ef_construction": 100,
+        "ef_search": 100
+    },
+    "faiss-fp32": {
+        "engine": "faiss",
+        "space_type": "innerproduct",
+        "data_type": "float",
+        "encoder": None,
+        "dimension": 1024,
+        "m": 16,
+        "ef_construction": 128,
+        "ef_search": 100
+    },
+    # Cuantización escalar fp16 dentro de faiss: la mitad de memoria, recall prácticamente igual
+    "faiss-fp16": {
+        "engine": "faiss",
+        "space_type": "innerproduct",
+        "data_type": "float",
+        "encoder": "fp16",
+        "dimension": 1024,
+        "m": 16,
+        "ef_construction": 128,
+        "ef_search": 100
+    },
+    # Vectores byte (int8) cuantizados en el cliente: una cuarta parte de memoria
+    "faiss-byte": {
+        "engine": "faiss",
+        "space_type": "innerproduct",
+        "data_type": "byte",
+        "encoder": None,
+        "dimension": 1024,
+        "m": 16,
+        "ef_construction": 128,
+        "ef_search": 100
+    },
+    # Tenants grandes: fp16 con embeddings de 384 dimensiones y un grafo más ligero
+    "compact": {
+        "engine": "faiss",
+        "space_type": "innerproduct",
+        "data_type": "float",
+        "encoder": "fp16",
+        "dimension": 384,
+        "m": 12,
+        "ef_construction": 96,
+        "ef_search": 64
+    }
+}
+
+# Dimensiones que ofrece Titan Multimodal
+SUPPORTED_DIMENSIONS = (1024, 384, 256)
+
+# Rango de recorte en desviaciones típicas de una componente de un vector unitario (1/√d)
+BYTE_QUANTIZATION_SIGMAS = 4.0
+
+BYTES_PER_VALUE = {"float": 4, "fp16": 2, "byte": 1}
+
+
+def get_index_profile(tenant_id: Optional[str] = None, name: Optional[str] = None) -> Dict:
+    """
+    Perfil del índice del tenant: INDEX_PROFILE (o el perfil name) más overrides de dimensión y parámetros HNSW
+
+    Solo se aplica al crear el índice; uno existente conserva su mapping hasta reindexar.
+    """
+    name = str(name or get_setting('INDEX_PROFILE', 'default', tenant_id)).lower()
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"INDEX_PROFILE no soportado: {name}. Opciones: {', '.join(INDEX_PROFILES)}")
+
+    profile = dict(INDEX_PROFILES[name], name=name)
+    for key, setting in (("dimension", 'INDEX_DIMENSIONS'), ("m", 'INDEX_HNSW_M'),
+                         ("ef_construction", 'INDEX_EF_CONSTRUCTION'), ("ef_search", 'INDEX_EF_SEARCH')):
+        value = get_setting(setting, None, tenant_id)
+        if value not in (None, ''):
+            profile[key] = int(value)
+
+    if profile["dimension"] not in SUPPORTED_DIMENSIONS:
+        raise ValueError(f"INDEX_DIMENSIONS no soportado: {profile['dimension']}. Opciones: {', '.join(map(str, SUPPORTED_DIMENSIONS))}")
+    return profile
+
+
+def build_vector_mapping(profile: Dict) -> Dict:
+    """
+    Mapping knn_vector del campo embedding para un perfil
+    """
+    parameters = {
+        "m": profile["m"],
+        "ef_construction": profile["ef_construction"]
+    }
+    if profile["engine"] == 'faiss':
+        # En faiss ef_search es parámetro del método; en nmslib es setting del índice
+        parameters["ef_search"] = profile["ef_search"]
+    if profile["encoder"]:
+        parameters["encoder"] = {"name": "sq", "parameters": {"type": profile["encoder"]}}
+
+    mapping = {
+        "type": "knn_vector",
+        "dimension": profile["dimension"],
+        "method": {
+            "name": "hnsw",
+            "space_type": profile["space_type"],
+            "engine": profile["engine"],
+            "parameters": parameters
+        }
+    }
+    if profile["data_type"] != 'float':
+        mapping["data_type"] = profile["data_type"]
+    return mapping
+
+
+def vector_spec_from_mapping(embedding_mapping: Dict) -> Dict:
+    """
+    Lo necesario para codificar vectores contra un índice existente, leído de su mapping
+    """
+    method = embedding_mapping.get('method', {})
+    return {
+        "dimension": embedding_mapping.get('dimension'),
+        "engine": method.get('engine', 'nmslib'),
+        "space_type": method.get('space_type', 'cosinesimil'),
+        "data_type": embedding_mapping.get('data_type', 'float')
+    }
+
+
+def vector_spec_from_profile(profile: Dict) -> Dict:
+    return {key: profile[key] for key in ("dimension", "engine", "space_type", "data_type")}
+
+
+def encode_vectors(embeddings, spec: Dict) -> np.ndarray:
+    """
+    Adapta embeddings de Titan (una fila por vector) al campo vectorial del índice
+
+    innerproduct necesita vectores unitarios para ordenar como el coseno; los
+    índices byte reciben además enteros en [-127, 127] con una escala fija
+    (la misma para documentos y preguntas).
+    """
+    vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if spec.get("space_type") != 'innerproduct' and spec.get("data_type", 'float') == 'float':
+        return vectors
+
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if spec.get("data_type") != 'byte':
+        return vectors
+
+    scale = 127 / (BYTE_QUANTIZATION_SIGMAS / math.sqrt(vectors.shape[1]))
+    return np.clip(np.rint(vectors * scale), -127, 127).astype(np.int8)
+
+
+def encode_vector(embedding: Sequence[float], spec: Dict) -> list:
+    if spec.get("space_type") != 'innerproduct' and spec.get("data_type", 'float') == 'float':
+        return list(embedding)
+    return encode_vectors(embedding, spec)[0].tolist()
+
+
+def estimate_index_memory(profile: Dict, vectors: int) -> int:
+    """
+    Memoria nativa estimada del grafo HNSW (fórmula de OpenSearch: 1.1 · (bytes · d + 8 · m) · n)
+    """
+    value_type = profile["encoder"] or profile["data_type"]
+    return int(1.1 * (BYTES_PER_VALUE[value_type] * profile["dimension"] + 8 * profile["m"]) * vectors)
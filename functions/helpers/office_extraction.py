@@ -0,0 +1,263 @@
+import codecs
+import csv
+import io
+import os
+from typing import Iterable, Iterator, List, Tuple
+
+from helpers.s3_reader import as_readable
+from helpers.chunking import estimate_tokens
+
+
+# Documentos de Office y tablas que se indexan; .doc y .ppt (binarios OLE) no tienen parser en Python puro
+OFFICE_EXTENSIONS = ('.docx', '.pptx', '.xlsx', '.xls', '.csv')
+SPREADSHEET_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Filas por chunk de hoja de cálculo; cada chunk repite la cabecera de su hoja
+SPREADSHEET_ROWS_PER_CHUNK = int(os.environ.get('SPREADSHEET_ROWS_PER_CHUNK', '50'))
+
+# Muestra inicial del CSV para detectar codificación y separador
+CSV_SAMPLE_BYTES = 64 * 1024
+CSV_DELIMITERS = ',;\t|'
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return ' '.join(str(value).split())
+
+
+def iter_xlsx_rows(source) -> Iterator[Tuple[str, int, List[str]]]:
+    """
+    Filas de un .xlsx en modo read_only: openpyxl recorre el XML de cada hoja
+    con iterparse y no construye el libro en memoria
+
+    Yields:
+        (hoja, número de fila, valores)
+    """
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Los archivos .xlsx requieren el paquete openpyxl")
+
+    workbook = openpyxl.load_workbook(as_readable(source), read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                yield sheet.title, row_number, [_cell_text(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_xls_rows(source) -> Iterator[Tuple[str, int, List[str]]]:
+    """
+    Filas de un .xls (BIFF) con xlrd; on_demand carga las hojas de una en una
+
+    El formato limita cada hoja a 65536 filas, así que la memoria ya está acotada.
+    """
+    try:
+        import xlrd
+    except ImportError:
+        raise ValueError("Los archivos .xls requieren el paquete xlrd")
+
+    if isinstance(source, str):
+        workbook = xlrd.open_workbook(source, on_demand=True)
+    else:
+        readable = as_readable(source)
+        workbook = xlrd.open_workbook(file_contents=readable.read(), on_demand=True)
+    try:
+        for sheet_index in range(workbook.nsheets):
+            sheet = workbook.sheet_by_index(sheet_index)
+            for row_index in range(sheet.nrows):
+                yield sheet.name, row_index + 1, [_cell_text(value) for value in sheet.row_values(row_index)]
+            workbook.unload_sheet(sheet_index)
+    finally:
+        workbook.release_resources()
+
+
+def _detect_csv_dialect(sample: bytes) -> Tuple[str, str]:
+    # UTF-8 (con o sin BOM) y si no, cp1252: lo que exporta Excel en Windows en español
+    encoding = 'utf-8-sig'
+    try:
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        encoding = 'cp1252'
+        text = sample.decode(encoding, errors='replace')
+
+    # El separador más frecuente en la cabecera; csv.Sniffer se confunde con celdas multilínea entre comillas
+    header = text.splitlines()[0] if text else ''
+    delimiter = max(CSV_DELIMITERS, key=header.count)
+    return encoding, delimiter if header.count(delimiter) else ','
+
+
+def iter_csv_rows(source, filename: str = 'csv') -> Iterator[Tuple[str, int, List[str]]]:
+    """
+    Filas de un CSV parseadas de forma incremental sobre el stream del objeto
+
+    La codificación y el separador se detectan con los primeros 64 KB.
+    """
+    readable = as_readable(source)
+    if isinstance(readable, str):
+        readable = open(readable, 'rb')
+    buffered = readable if hasattr(readable, 'peek') else io.BufferedReader(readable, buffer_size=CSV_SAMPLE_BYTES)
+
+    encoding, delimiter = _detect_csv_dialect(buffered.peek(CSV_SAMPLE_BYTES)[:CSV_SAMPLE_BYTES])
+    print(f"🧾 CSV {encoding}, separador {delimiter!r}")
+
+    text = io.TextIOWrapper(buffered, encoding=encoding, errors='replace', newline='')
+    try:
+        for row_number, row in enumerate(csv.reader(text, delimiter=delimiter), start=1):
+            yield filename, row_number, [_cell_text(value) for value in row]
+    finally:
+        text.close()
+
+
+def iter_spreadsheet_rows(source, extension: str, filename: str = 'csv') -> Iterator[Tuple[str, int, List[str]]]:
+    if extension == '.xlsx':
+        return iter_xlsx_rows(source)
+    if extension == '.xls':
+        return iter_xls_rows(source)
+    if extension == '.csv':
+        return iter_csv_rows(source, filename)
+    raise ValueError(f"Extensión de hoja de cálculo no soportada: {extension}")
+
+
+def _format_row(values: List[str]) -> str:
+    return ' | '.join(values)
+
+
+def iter_row_group_chunks(
+    rows: Iterable[Tuple[str, int, List[str]]],
+    rows_per_chunk: int = SPREADSHEET_ROWS_PER_CHUNK,
+    max_tokens: int = 2000
+) -> Iterator[str]:
+    """
+    Agrupa filas en chunks que repiten la cabecera de su hoja
+
+    La primera fila no vacía de cada hoja se toma como cabecera. Un chunk se
+    cierra al llegar a rows_per_chunk filas, a max_tokens tokens o al cambiar
+    de hoja; solo se retiene en memoria el grupo en curso.
+    """
+    current_sheet = None
+    header = None
+    header_row = 0
+    sheet_chunks = 0
+    group = []
+    group_tokens = 0
+    first_row = last_row = 0
+
+    def flush():
+        first, last = (first_row, last_row) if group else (header_row, header_row)
+        lines = [f"Hoja: {current_sheet} (filas {first}-{last})", f"Columnas: {header}"]
+        return '\n'.join(lines + group)
+
+    for sheet, row_number, values in rows:
+        # read_only rellena filas y columnas vacías al final: se recortan
+        while values and not values[-1]:
+            values = values[:-1]
+        if not values:
+            continue
+
+        if sheet != current_sheet:
+            # Una hoja con solo cabecera también se indexa
+            if group or (current_sheet is not None and not sheet_chunks):
+                yield flush()
+            current_sheet, header, header_row = sheet, _format_row(values), row_number
+            group, group_tokens, sheet_chunks = [], 0, 0
+            continue
+
+        line = _format_row(values)
+        line_tokens = estimate_tokens(line)
+        if group and (len(group) >= rows_per_chunk or group_tokens + line_tokens > max_tokens):
+            yield flush()
+            group, group_tokens = [], 0
+            sheet_chunks += 1
+        if not group:
+            first_row = row_number
+        group.append(line)
+        group_tokens += line_tokens
+        last_row = row_number
+
+    if group or (current_sheet is not None and not sheet_chunks):
+        yield flush()
+
+
+def _docx_table_text(table) -> str:
+    rows = []
+    for row in table.rows:
+        cells = []
+        for cell in row.cells:
+            text = _cell_text(cell.text)
+            # Las celdas combinadas se repiten en cada columna que ocupan
+            if not cells or cells[-1] != text:
+                cells.append(text)
+        rows.append(_format_row(cells))
+    return '\n'.join(rows)
+
+
+def iter_docx_sections(source) -> Iterator[str]:
+    """
+    Texto de un .docx en orden de documento: párrafos y tablas, una sección por título
+    """
+    try:
+        import docx
+        from docx.table import Table
+        from docx.text.paragraph import Paragraph
+    except ImportError:
+        raise ValueError("Los archivos .docx requieren el paquete python-docx")
+
+    document = docx.Document(as_readable(source))
+    section = []
+    for block in document.element.body.iterchildren():
+        if block.tag.endswith('}p'):
+            paragraph = Paragraph(block, document)
+            text = paragraph.text.strip()
+            if not text:
+                continue
+            if paragraph.style is not None and paragraph.style.name.startswith(('Heading', 'Title', 'Título')) and section:
+                yield '\n'.join(section)
+                section = []
+            section.append(text)
+        elif block.tag.endswith('}tbl'):
+            section.append(_docx_table_text(Table(block, document)))
+    if section:
+        yield '\n'.join(section)
+
+
+def iter_pptx_slides(source) -> Iterator[str]:
+    """
+    Texto de cada diapositiva de un .pptx (cuadros de texto, tablas y notas del orador)
+    """
+    try:
+        import pptx
+    except ImportError:
+        raise ValueError("Los archivos .pptx requieren el paquete python-pptx")
+
+    presentation = pptx.Presentation(as_readable(source))
+    for slide_number, slide in enumerate(presentation.slides, start=1):
+        texts = []
+        for shape in _iter_shapes(slide.shapes):
+            if shape.has_text_frame:
+                text = shape.text_frame.text.strip()
+                if text:
+                    texts.append(text)
+            elif getattr(shape, 'has_table', False):
+                texts.append('\n'.join(
+                    _format_row([_cell_text(cell.text) for cell in row.cells]) for row in shape.table.rows
+                ))
+        if slide.has_notes_slide:
+            notes = slide.notes_slide.notes_text_frame.text.strip() if slide.notes_slide.notes_text_frame else ''
+            if notes:
+                texts.append(f"Notas: {notes}")
+        if texts:
+            yield f"Diapositiva {slide_number}\n" + '\n'.join(texts)
+
+
+def _iter_shapes(shapes):
+    # Los grupos anidan formas: se recorren en profundidad
+    for shape in shapes:
+        if hasattr(shape, 'shapes'):
+            yield from _iter_shapes(shape.shapes)
+        else:
+            yield shape
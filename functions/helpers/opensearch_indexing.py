@@ -1,16 +1,117 @@
-from helpers.rag_helpers import create_opensearch_client, create_index_if_not_exists, index_document_bulk
+from helpers.rag_helpers import (
+    create_opensearch_client,
+    create_index_if_not_exists,
+    index_document_bulk,
+    delete_documents_bulk,
+    get_indexed_chunks,
+    get_source_document,
+    generate_content_hash,
+    generate_chunk_id
+)
+from helpers.query_cache import invalidate_tenant_queries
+from helpers.retrieval import get_retrieval_config, build_knn_query, build_lexical_query, fuse_results
+from helpers.index_metadata import get_index_metadata, forget_index, is_index_not_found
+from helpers.index_profiles import vector_spec_from_profile, encode_vector
+from helpers.index_placement import get_placement, get_placement_profile, rebalance_tenant
 
-def opensearch_indexing(embeddings, chunks, tenant_id, document_type, object_key, filename):
+
+def get_tenant_vector_spec(tenant_id):
+    """
+    Campo vectorial con el que se embebe para el tenant
+
+    Si el índice donde está ubicado el tenant ya existe manda su mapping
+    (dimensión, tipo); si no, el perfil con el que se creará.
+    """
+    try:
+        opensearch_client = create_opensearch_client()
+        placement = get_placement(opensearch_client, tenant_id)
+        profile = get_placement_profile(placement, tenant_id)
+        metadata = get_index_metadata(opensearch_client, placement["index"])
+    except Exception as e:
+        profile = get_placement_profile({"shared": False}, tenant_id)
+        print(f"⚠️ No se pudo leer el mapping del índice, se usa el perfil {profile['name']}: {str(e)}")
+        return vector_spec_from_profile(profile)
+    
+    if not metadata["exists"] or not metadata["vector"]:
+        return vector_spec_from_profile(profile)
+    
+    if metadata["vector"]["dimension"] != profile["dimension"]:
+        print(f"⚠️ El índice {placement['index']} tiene {metadata['vector']['dimension']} dimensiones y el perfil {profile['name']} "
+              f"{profile['dimension']}: se usa el índice existente hasta reindexar")
+    return metadata["vector"]
+
+
+def get_existing_chunks(tenant_id, object_key):
+    """
+    Chunks ya indexados para el documento lógico de object_key (vacío si no hay índice)
+    """
+    try:
+        opensearch_client = create_opensearch_client()
+        
+        index_name = get_placement(opensearch_client, tenant_id)["index"]
+        
+        if not get_index_metadata(opensearch_client, index_name)["exists"]:
+            return {}
+        
+        existing_chunks = get_indexed_chunks(
+            opensearch_client,
+            index_name,
+            tenant_id,
+            get_source_document(object_key)
+        )
+        print(f"📋 {len(existing_chunks)} chunks ya indexados para {object_key}")
+        return existing_chunks
+        
+    except Exception as e:
+        print(f"⚠️ No se pudieron leer chunks existentes, se re-indexará todo: {str(e)}")
+        return {}
+
+
+def opensearch_indexing(embeddings, chunks, tenant_id, document_type, object_key, filename, existing_chunks=None):
+    """
+    Sincroniza los chunks de un archivo con el índice del tenant
+    
+    Los chunks se escriben bajo un _id determinista. Los que ya existían con el
+    mismo contenido (embedding None) solo actualizan metadatos y los que ya no
+    aparecen en el archivo se eliminan.
+    """
+    return opensearch_indexing_batches(
+        [(0, chunks, embeddings)],
+        tenant_id,
+        document_type,
+        object_key,
+        filename,
+        existing_chunks
+    )
+
+
+def opensearch_indexing_batches(batches, tenant_id, document_type, object_key, filename, existing_chunks=None,
+                                chunk_positions=None, finalize=True):
+    """
+    Igual que opensearch_indexing pero consumiendo lotes (start_index, chunks, embeddings)
+    
+    Cada lote se indexa en cuanto llega, así el indexado empieza antes de que
+    termine la extracción y la memoria no depende del tamaño del documento.
+    
+    Args:
+        chunk_positions: Dict que se rellena con chunk_id → chunk_index de su
+            primera aparición, en orden de documento
+        finalize: False para indexar solo una parte del documento (un segmento
+            del fan-out): no se borran chunks obsoletos ni se reubica el tenant
+    """
+    
+    index_touched = False
 
     try:
         opensearch_client = create_opensearch_client()
         
-        index_name = f"rag-documents-{tenant_id}"
+        placement = get_placement(opensearch_client, tenant_id)
+        index_name = placement["index"]
         
         index_created = create_index_if_not_exists(
             opensearch_client, 
             index_name,     
-            dimensions=1024
+            profile=get_placement_profile(placement, tenant_id)
         )
         
         if not index_created:
@@ -20,45 +121,126 @@ def opensearch_indexing(embeddings, chunks, tenant_id, document_type, object_key
                 "message": f"Error creando índice {index_name}"
             }
         
+        vector = get_index_metadata(opensearch_client, index_name)["vector"]
+        
+        source_document = get_source_document(object_key)
+        if existing_chunks is None:
+            existing_chunks = get_indexed_chunks(opensearch_client, index_name, tenant_id, source_document)
+        
         file_extension = '.' + filename.split('.')[-1].lower() if '.' in filename else ''
-        is_image = chunks and len(chunks) > 0 and chunks[0] == "[IMAGE_CONTENT]"
+        is_image = False
         
-        documents = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            doc = {
-                'content': chunk,
-                'embedding': embedding,
-                'document_type': document_type,
-                'file_format': file_extension,
-                'source_file': object_key
-            }
+        chunk_positions = {} if chunk_positions is None else chunk_positions
+        chunks_count = 0
+        embeddings_count = 0
+        written_count = 0
+        unchanged_count = 0
+        
+        for start_index, chunks, embeddings in batches:
+            if start_index == 0:
+                is_image = chunks and len(chunks) > 0 and chunks[0] == "[IMAGE_CONTENT]"
             
-            if is_image:
-                doc['content_type'] = 'image'
-                doc['description'] = f'Imagen {file_extension} del documento {filename}'
-            else:
-                doc['content_type'] = 'text'
+            documents = []
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start_index):
+                chunks_count += 1
+                content_hash = generate_content_hash(chunk)
+                chunk_id = generate_chunk_id(tenant_id, source_document, content_hash)
                 
-            documents.append(doc)
+                # Contenido repetido dentro del mismo archivo se indexa una sola vez
+                if chunk_id in chunk_positions:
+                    continue
+                chunk_positions[chunk_id] = i
+                
+                existing = existing_chunks.get(chunk_id)
+                if embedding is None:
+                    if not existing:
+                        print(f"⚠️ Chunk {i} sin embedding ni versión indexada, se omite")
+                        continue
+                    if existing.get('chunk_index') == i and existing.get('source_file') == object_key:
+                        unchanged_count += 1
+                        continue
+                else:
+                    if len(embedding) != vector["dimension"]:
+                        raise ValueError(f"Embedding de {len(embedding)} dimensiones para un índice de {vector['dimension']}")
+                    embedding = encode_vector(embedding, vector)
+                    embeddings_count += 1
+                
+                doc = {
+                    'content': chunk,
+                    'embedding': embedding,
+                    'document_type': document_type,
+                    'file_format': file_extension,
+                    'source_file': object_key,
+                    'source_document': source_document,
+                    'chunk_id': chunk_id,
+                    'content_hash': content_hash,
+                    'chunk_index': i
+                }
+                
+                if is_image:
+                    doc['content_type'] = 'image'
+                    doc['description'] = f'Imagen {file_extension} del documento {filename}'
+                else:
+                    doc['content_type'] = 'text'
+                    
+                documents.append(doc)
+            
+            index_touched = index_touched or bool(documents)
+            if not index_document_bulk(opensearch_client, index_name, documents, tenant_id):
+                return {
+                    "success": False,
+                    "message": "Error en indexado bulk de OpenSearch"
+                }
+            written_count += len(documents)
         
-        indexing_success = index_document_bulk(
-            opensearch_client,
-            index_name,
-            documents,
-            tenant_id
-        )
+        stale_ids = [chunk_id for chunk_id in existing_chunks if chunk_id not in chunk_positions] if finalize else []
+        
+        print(f"🔁 Re-indexación incremental: {written_count} escritos, {unchanged_count} sin cambios, {len(stale_ids)} obsoletos")
+        
+        if not finalize:
+            # Segmento de un documento mayor: los obsoletos y la reubicación los resuelve el finalizador
+            return {
+                "success": True,
+                "message": f"Segmento indexado: {chunks_count} elementos",
+                "details": {
+                    "index_name": index_name,
+                    "chunks_count": chunks_count,
+                    "embeddings_count": embeddings_count,
+                    "chunks_written": written_count,
+                    "chunks_unchanged": unchanged_count
+                }
+            }
+        
+        if chunks_count == 0:
+            return {
+                "success": False,
+                "message": "No se generaron chunks para indexar"
+            }
+        
+        # Solo se borran los chunks obsoletos si los nuevos quedaron indexados
+        index_touched = index_touched or bool(stale_ids)
+        indexing_success = delete_documents_bulk(opensearch_client, index_name, stale_ids)
         
         if indexing_success:
             content_description = "imagen" if is_image else "documento"
             print(f"🎉 {content_description.title()} indexado exitosamente en OpenSearch")
+            
+            try:
+                # Modo compartido: el tenant sube de nivel o pasa a índice propio si ha crecido
+                rebalance_tenant(opensearch_client, tenant_id)
+            except Exception as e:
+                print(f"⚠️ No se pudo reubicar el tenant {tenant_id}, se reintentará en la próxima ingesta: {str(e)}")
             return {
                 "success": True,
-                "message": f"{content_description.title()} procesado e indexado: {len(chunks)} elementos",
+                "message": f"{content_description.title()} procesado e indexado: {chunks_count} elementos",
                 "details": {
                     "tenant_id": tenant_id,
                     "index_name": index_name,
-                    "chunks_count": len(chunks),
-                    "embeddings_count": len(embeddings),
+                    "chunks_count": chunks_count,
+                    "embeddings_count": embeddings_count,
+                    "chunks_written": written_count,
+                    "chunks_unchanged": unchanged_count,
+                    "chunks_deleted": len(stale_ids),
                     "document_type": document_type,
                     "filename": filename
                 }
@@ -75,74 +257,119 @@ def opensearch_indexing(embeddings, chunks, tenant_id, document_type, object_key
             "success": False,
             "message": f"Error en OpenSearch: {str(opensearch_error)}"
         }
+    
+    finally:
+        # Cualquier escritura (aunque sea parcial) deja obsoletas las respuestas cacheadas del tenant
+        if index_touched:
+            invalidate_tenant_queries(tenant_id)
 
 
-def opensearch_query(question_embedding, tenant_id, document_type=None):
+def opensearch_query(question_embedding, tenant_id, document_type=None, question=None, mode=None, size=10, include_embeddings=False, vector=None):
+    """
+    Busca los chunks más relevantes del tenant
+    
+    En modo hybrid se lanzan en un único msearch una consulta BM25 sobre content
+    y la kNN, y se fusionan con RRF (o scores ponderados) según la configuración
+    del tenant. Sin texto de pregunta se usa siempre kNN.
+    
+    Args:
+        question_embedding: Embedding de la pregunta
+        tenant_id: Tenant propietario del índice
+        document_type: Filtro opcional
+        question: Texto de la pregunta (necesario para la parte léxica)
+        mode: knn o hybrid (por defecto RETRIEVAL_MODE del tenant)
+        size: Documentos a devolver
+        include_embeddings: Devuelve también el vector de cada chunk (para MMR)
+        vector: Campo vectorial del índice (por defecto se lee de la caché de metadatos)
+    
+    No se comprueba antes si el índice existe: un index_not_found en la búsqueda
+    se trata como "sin documentos" y se recuerda en la caché de metadatos.
+    """
+    
+    def no_index_result(index_name):
+        forget_index(index_name)
+        return {
+            "success": True,
+            "documents": [],
+            "total_found": 0,
+            "message": f"No hay documentos indexados para el tenant {tenant_id}"
+        }
 
     try:
         from helpers.rag_helpers import create_opensearch_client
         
         opensearch_client = create_opensearch_client()
         
-        index_name = f"rag-documents-{tenant_id}"
+        index_name = get_placement(opensearch_client, tenant_id)["index"]
         
-        if not opensearch_client.indices.exists(index=index_name):
-            return {
-                "success": True,
-                "documents": [],
-                "total_found": 0,
-                "message": f"No hay documentos indexados para el tenant {tenant_id}"
-            }
-        
-        search_query = {
-            "size": 10,  # Top 10 documentos más relevantes
-            "query": {
-                "bool": {
-                    "must": {
-                        "knn": {
-                            "embedding": {
-                                "vector": question_embedding,
-                                "k": 10
-                            }
-                        }
-                    },
-                    "filter": [
-                        {"term": {"tenant_id": tenant_id}}
-                    ]
-                }
-            },
-            "_source": [
-                "content", 
-                "source_file", 
-                "document_type", 
-                "chunk_index", 
-                "created_at",
-                "document_hash"
-            ]
-        }
+        retrieval_config = get_retrieval_config(tenant_id)
+        mode = (mode or retrieval_config["mode"]).lower()
+        if not question:
+            mode = 'knn'
         
         if document_type:
-            search_query["query"]["bool"]["filter"].append(
-                {"term": {"document_type": document_type}}
-            )
             print(f"📂 Filtrando por document_type: {document_type}")
         
-        print(f"🔎 Ejecutando búsqueda en índice: {index_name}")
+        print(f"🔎 Ejecutando búsqueda {mode} en índice: {index_name}")
         
-        response = opensearch_client.search(
-            index=index_name,
-            body=search_query
-        )
+        # La pregunta se codifica igual que los documentos (normalizada, cuantizada a byte)
+        vector = vector or get_index_metadata(opensearch_client, index_name)["vector"]
+        if vector:
+            if len(question_embedding) != vector["dimension"]:
+                raise ValueError(f"Embedding de {len(question_embedding)} dimensiones para un índice de {vector['dimension']}")
+            question_embedding = encode_vector(question_embedding, vector)
+        # faiss y lucene filtran por tenant dentro del grafo HNSW (imprescindible en índices compartidos)
+        efficient_filter = bool(vector) and vector["engine"] in ('faiss', 'lucene')
+        
+        if mode == 'hybrid':
+            candidates = max(size, retrieval_config["candidates"])
+            response = opensearch_client.msearch(body=[
+                {"index": index_name},
+                build_knn_query(question_embedding, tenant_id, document_type, candidates, include_embeddings, efficient_filter),
+                {"index": index_name},
+                build_lexical_query(question, tenant_id, document_type, candidates, include_embeddings)
+            ])
+            
+            leg_responses = response.get('responses', [])
+            if leg_responses and all(
+                isinstance(leg_response.get('error'), dict) and leg_response['error'].get('type') == 'index_not_found_exception'
+                for leg_response in leg_responses
+            ):
+                return no_index_result(index_name)
+            
+            hit_lists = []
+            for leg, leg_response in zip(("knn", "lexical"), leg_responses):
+                if 'error' in leg_response:
+                    # Una rama caída no debe dejar sin respuesta: se fusiona lo que haya
+                    print(f"⚠️ Búsqueda {leg} falló: {leg_response['error']}")
+                    hit_lists.append([])
+                else:
+                    hit_lists.append(leg_response.get('hits', {}).get('hits', []))
+            
+            knn_hits, lexical_hits = (hit_lists + [[], []])[:2]
+            hits = fuse_results(knn_hits, lexical_hits, retrieval_config)[:size]
+            total_found = len(hits)
+            print(f"🔀 Fusión {retrieval_config['fusion']}: {len(knn_hits)} kNN + {len(lexical_hits)} BM25 → {total_found}")
+        else:
+            try:
+                response = opensearch_client.search(
+                    index=index_name,
+                    body=build_knn_query(question_embedding, tenant_id, document_type, size, include_embeddings, efficient_filter)
+                )
+            except Exception as e:
+                if is_index_not_found(e):
+                    return no_index_result(index_name)
+                raise
+            hits = response.get('hits', {}).get('hits', [])
+            total_found = response.get('hits', {}).get('total', {}).get('value', 0)
         
-        hits = response.get('hits', {})
-        total_found = hits.get('total', {}).get('value', 0)
         documents = []
         
-        for hit in hits.get('hits', []):
+        for hit in hits:
             source = hit.get('_source', {})
             score = hit.get('_score', 0)
             
-            documents.append({
+            document = {
                 'content': source.get('content', ''),
                 'source_file': source.get('source_file', ''),
                 'document_type': source.get('document_type', ''),
@@ -150,13 +377,17 @@ def opensearch_query(question_embedding, tenant_id, document_type=None):
                 'created_at': source.get('created_at', ''),
                 'document_hash': source.get('document_hash', ''),
                 'score': score
-            })
+            }
+            if include_embeddings:
+                document['embedding'] = source.get('embedding')
+            documents.append(document)
         
         return {
             "success": True,
             "documents": documents,
             "total_found": total_found,
-            "index_searched": index_name
+            "index_searched": index_name,
+            "retrieval_mode": mode
         }
         
     except Exception as e:
@@ -167,4 +398,20 @@ def opensearch_query(question_embedding, tenant_id, document_type=None):
             "success": False,
             "message": f"Error en búsqueda OpenSearch: {str(e)}",
             "documents": []
-        }
\ No newline at end of file
+        }
+
+
+def prepare_query_search(tenant_id):
+    """
+    Trabajo previo a la búsqueda que no depende del embedding: cliente, configuración y metadatos del índice
+    """
+    from helpers.rag_helpers import create_opensearch_client
+    
+    opensearch_client = create_opensearch_client()
+    index_name = get_placement(opensearch_client, tenant_id)["index"]
+    
+    return {
+        "index_name": index_name,
+        "index": get_index_metadata(opensearch_client, index_name),
+        "retrieval_config": get_retrieval_config(tenant_id)
+    }
@@ -0,0 +1,260 @@
+import io
+import multiprocessing
+import os
+from itertools import islice
+from typing import Iterator, List, Tuple
+
+import PyPDF2
+
+from helpers.s3_reader import S3Location, as_readable
+from helpers.settings import get_setting
+
+
+# 'auto' usa todos los vCPUs que Lambda asigna según la memoria configurada
+PDF_EXTRACTION_WORKERS = os.environ.get('PDF_EXTRACTION_WORKERS', 'auto')
+PAGES_PER_RANGE = int(os.environ.get('PDF_PAGES_PER_RANGE', '16'))
+
+
+def get_extraction_workers() -> int:
+    if PDF_EXTRACTION_WORKERS == 'auto':
+        return os.cpu_count() or 1
+    return max(1, int(PDF_EXTRACTION_WORKERS))
+
+
+class PyPDF2Extractor:
+    """
+    Backend por defecto: PyPDF2 puro Python
+    """
+    name = 'pypdf2'
+
+    def open(self, pdf_source):
+        return PyPDF2.PdfReader(as_readable(pdf_source))
+
+    def page_count(self, document) -> int:
+        return len(document.pages)
+
+    def extract_range(self, document, start: int, end: int) -> List[str]:
+        return _extract_pages(start, end, lambda page_index: document.pages[page_index].extract_text())
+
+    def close(self, document):
+        pass
+
+
+class PdfiumExtractor:
+    """
+    Backend pypdfium2 (binding de PDFium en C): varias veces más rápido que PyPDF2
+    """
+    name = 'pypdfium2'
+
+    def open(self, pdf_source):
+        try:
+            import pypdfium2
+        except ImportError:
+            raise ValueError("El backend 'pypdfium2' requiere el paquete pypdfium2")
+        if isinstance(pdf_source, S3Location):
+            pdf_source = pdf_source.open()
+        return pypdfium2.PdfDocument(pdf_source)
+
+    def page_count(self, document) -> int:
+        return len(document)
+
+    def extract_range(self, document, start: int, end: int) -> List[str]:
+
+        def extract(page_index: int) -> str:
+            page = document[page_index]
+            text_page = page.get_textpage()
+            try:
+                return text_page.get_text_range()
+            finally:
+                text_page.close()
+                page.close()
+
+        return _extract_pages(start, end, extract)
+
+    def close(self, document):
+        document.close()
+
+
+class PdfMinerExtractor:
+    """
+    Backend pdfminer.six: más lento pero con mejor reconstrucción de layout en columnas
+    """
+    name = 'pdfminer'
+
+    def __init__(self):
+        # Por documento: iterador del árbol de páginas y siguiente índice. Los rangos de un
+        # worker son crecientes, así que cada uno continúa donde terminó el anterior
+        self._page_cursors = {}
+
+    def open(self, pdf_source):
+        try:
+            from pdfminer.pdfdocument import PDFDocument
+            from pdfminer.pdfparser import PDFParser
+        except ImportError:
+            raise ValueError("El backend 'pdfminer' requiere el paquete pdfminer.six")
+        pdf_source = as_readable(pdf_source)
+        if isinstance(pdf_source, str):
+            pdf_source = open(pdf_source, 'rb')
+        return PDFDocument(PDFParser(pdf_source))
+
+    def page_count(self, document) -> int:
+        from pdfminer.pdftypes import resolve1
+        return resolve1(document.catalog['Pages'])['Count']
+
+    def extract_range(self, document, start: int, end: int) -> List[str]:
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        resource_manager = PDFResourceManager()
+        pages_iterator, position = self._page_cursors.get(id(document), (None, 0))
+        if pages_iterator is None or position > start:
+            pages_iterator, position = PDFPage.create_pages(document), 0
+        pages = dict(zip(range(start, end), islice(pages_iterator, start - position, end - position)))
+        self._page_cursors[id(document)] = (pages_iterator, end)
+
+        def extract(page_index: int) -> str:
+            output = io.StringIO()
+            converter = TextConverter(resource_manager, output, laparams=LAParams())
+            try:
+                PDFPageInterpreter(resource_manager, converter).process_page(pages[page_index])
+                return output.getvalue()
+            finally:
+                converter.close()
+
+        return _extract_pages(start, end, extract)
+
+    def close(self, document):
+        self._page_cursors.pop(id(document), None)
+        stream = getattr(getattr(document, '_parser', None), 'fp', None)
+        if stream and hasattr(stream, 'close'):
+            stream.close()
+
+
+PDF_EXTRACTORS = {
+    extractor.name: extractor
+    for extractor in (PyPDF2Extractor, PdfiumExtractor, PdfMinerExtractor)
+}
+
+
+def get_pdf_extractor(backend: str = None, tenant_id: str = None):
+    """
+    Backend de extracción: argumento explícito, override del tenant o PDF_EXTRACTOR
+    """
+    backend = (backend or get_setting('PDF_EXTRACTOR', 'pypdf2', tenant_id)).lower()
+    if backend not in PDF_EXTRACTORS:
+        raise ValueError(f"Backend de extracción no soportado: {backend}. Opciones: {', '.join(PDF_EXTRACTORS)}")
+    return PDF_EXTRACTORS[backend]()
+
+
+# Fuentes que cada proceso puede reabrir por su cuenta tras el fork
+SHAREABLE_SOURCES = (str, bytes, bytearray, S3Location)
+
+
+def _extract_pages(start: int, end: int, extract) -> List[str]:
+    # Texto de las páginas [start, end) tolerando errores por página
+    texts = []
+    for page_index in range(start, end):
+        try:
+            texts.append(extract(page_index) or '')
+        except Exception as e:
+            print(f"Error en página {page_index + 1}: {str(e)}")
+            texts.append('')
+    return texts
+
+
+def _extraction_worker(pdf_source, backend: str, ranges: List[Tuple[int, int]], connection):
+    # Cada proceso abre su propio documento: con fork hereda bytes o ruta sin copiarlos por pipe
+    try:
+        extractor = get_pdf_extractor(backend)
+        document = extractor.open(pdf_source)
+        for start, end in ranges:
+            # send bloquea cuando el pipe está lleno: el padre marca el ritmo y la memoria queda acotada
+            connection.send(extractor.extract_range(document, start, end))
+    except Exception as e:
+        connection.send(e)
+    finally:
+        connection.close()
+
+
+def get_pdf_page_count(pdf_source, backend: str = None) -> int:
+    extractor = get_pdf_extractor(backend)
+    document = extractor.open(pdf_source)
+    try:
+        return extractor.page_count(document)
+    finally:
+        extractor.close(document)
+
+
+def iter_pdf_pages(pdf_source, workers: int = None, backend: str = None, pages_per_range: int = PAGES_PER_RANGE,
+                   start_page: int = 0, end_page: int = None) -> Iterator[str]:
+    """
+    Extrae páginas repartiendo rangos entre procesos y las devuelve en orden
+
+    Los rangos se asignan en round-robin (el rango r lo procesa el worker r % N),
+    así basta leer los pipes en ese mismo orden para reensamblar el documento.
+    Se usa Process + Pipe porque Lambda no dispone de /dev/shm para Pool/Queue.
+
+    Args:
+        pdf_source: Ruta del PDF en disco, sus bytes (compartidos vía fork) o un
+            S3Location que cada proceso lee por rangos. Un file-like también se
+            acepta, pero se extrae en serie.
+        workers: Número de procesos (por defecto PDF_EXTRACTION_WORKERS)
+        backend: Nombre del backend de extracción (por defecto PDF_EXTRACTOR)
+        pages_per_range: Páginas por unidad de trabajo
+        start_page, end_page: Solo las páginas [start_page, end_page) (un segmento del fan-out)
+    """
+    extractor = get_pdf_extractor(backend)
+    document = extractor.open(pdf_source)
+    total_pages = extractor.page_count(document)
+    if end_page is not None:
+        total_pages = min(total_pages, end_page)
+    workers = min(workers or get_extraction_workers(), max(1, -(-(total_pages - start_page) // pages_per_range)))
+
+    if workers <= 1 or not hasattr(os, 'fork') or not isinstance(pdf_source, SHAREABLE_SOURCES):
+        try:
+            for start in range(start_page, total_pages, pages_per_range):
+                yield from extractor.extract_range(document, start, min(start + pages_per_range, total_pages))
+        finally:
+            extractor.close(document)
+        return
+
+    extractor.close(document)
+
+    ranges = [(start, min(start + pages_per_range, total_pages)) for start in range(start_page, total_pages, pages_per_range)]
+    context = multiprocessing.get_context('fork')
+
+    processes = []
+    connections = []
+    for worker_index in range(workers):
+        parent_connection, child_connection = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_extraction_worker,
+            args=(pdf_source, extractor.name, ranges[worker_index::workers], child_connection),
+            daemon=True
+        )
+        process.start()
+        child_connection.close()
+        processes.append(process)
+        connections.append(parent_connection)
+
+    print(f"⚙️ Extrayendo {total_pages - start_page} páginas con {workers} procesos ({extractor.name})")
+
+    try:
+        for range_index in range(len(ranges)):
+            try:
+                result = connections[range_index % workers].recv()
+            except EOFError:
+                raise ValueError(f"Worker de extracción terminó sin enviar el rango {range_index}")
+            if isinstance(result, Exception):
+                raise ValueError(f"Error en worker de extracción: {str(result)}")
+            yield from result
+    finally:
+        for connection in connections:
+            connection.close()
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1)
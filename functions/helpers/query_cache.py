@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from helpers.settings import get_setting
+
+
+QUERY_CACHE_KEY_VERSION = 'v1'
+
+# TTL de las respuestas cacheadas; la invalidación por versión de índice cubre los cambios de contenido
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get('QUERY_CACHE_TTL_SECONDS', '3600'))
+QUERY_CACHE_MEMORY_ENTRIES = int(os.environ.get('QUERY_CACHE_MEMORY_ENTRIES', '1000'))
+# Cada cuánto se vuelve a leer la versión del índice de un tenant (retraso máximo de la invalidación)
+QUERY_CACHE_VERSION_TTL_SECONDS = float(os.environ.get('QUERY_CACHE_VERSION_TTL_SECONDS', '10'))
+
+_stats = {
+    "hits": 0,
+    "misses": 0
+}
+_stats_lock = threading.Lock()
+
+_cache = None
+
+
+def normalize_question(question: str) -> str:
+    """
+    Forma canónica de la pregunta: mayúsculas, espacios y signos finales no cambian la respuesta
+    """
+    question = unicodedata.normalize('NFC', question or '').casefold()
+    question = ' '.join(question.split())
+    return re.sub(r'^[¿¡\s]+|[?!.\s]+$', '', question)
+
+
+def make_query_cache_key(tenant_id: str, question: str, document_type: Optional[str], index_version: str) -> str:
+    digest = hashlib.sha256()
+    for part in (QUERY_CACHE_KEY_VERSION, tenant_id, normalize_question(question), document_type or '', index_version):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def _record(counter: str):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def reset_query_cache_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+def get_query_cache_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
+
+
+class TTLCache:
+    """
+    LRU en memoria con expiración por entrada
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class S3QueryCacheBackend:
+    """
+    Respuestas y versiones de índice compartidas entre contenedores (y con la Lambda de ingesta)
+
+    Layout: {prefix}versions/{tenant_id} y {prefix}answers/{tenant_id}/{key}.json
+    """
+
+    def __init__(self, bucket: str, prefix: str = 'query-cache/'):
+        from helpers.aws_clients import get_s3_client
+        self.s3_client = get_s3_client()
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.s3_client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if code in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def get_version(self, tenant_id: str) -> Optional[str]:
+        value = self._get(f"{self.prefix}versions/{tenant_id}")
+        return value.decode('utf-8') if value else None
+
+    def put_version(self, tenant_id: str, version: str):
+        self.s3_client.put_object(Bucket=self.bucket, Key=f"{self.prefix}versions/{tenant_id}", Body=version.encode('utf-8'))
+
+    def get_answer(self, tenant_id: str, key: str) -> Optional[Dict]:
+        value = self._get(f"{self.prefix}answers/{tenant_id}/{key}.json")
+        return json.loads(value) if value else None
+
+    def put_answer(self, tenant_id: str, key: str, entry: Dict):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}answers/{tenant_id}/{key}.json",
+            Body=json.dumps(entry, ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+
+class QueryCache:
+    """
+    Caché de respuestas finales por (tenant, pregunta normalizada, document_type, versión de índice)
+
+    La versión del índice de cada tenant cambia cada vez que la ingesta escribe
+    o borra chunks: las claves antiguas dejan de coincidir y expiran solas.
+    """
+
+    def __init__(self, persistent: Optional[S3QueryCacheBackend] = None, max_entries: int = QUERY_CACHE_MEMORY_ENTRIES):
+        self.persistent = persistent
+        self.answers = TTLCache(max_entries)
+        self.versions = TTLCache(max_entries)
+
+    def get_index_version(self, tenant_id: str) -> str:
+        version = self.versions.get(tenant_id)
+        if version is not None:
+            return version
+
+        version = None
+        if self.persistent:
+            try:
+                version = self.persistent.get_version(tenant_id)
+            except Exception as e:
+                print(f"⚠️ Error leyendo versión de índice para caché de consultas: {str(e)}")
+        version = version or '0'
+        self.versions.put(tenant_id, version, QUERY_CACHE_VERSION_TTL_SECONDS)
+        return version
+
+    def invalidate_tenant(self, tenant_id: str):
+        version = uuid.uuid4().hex
+        self.versions.put(tenant_id, version, QUERY_CACHE_VERSION_TTL_SECONDS)
+        if self.persistent:
+            try:
+                self.persistent.put_version(tenant_id, version)
+            except Exception as e:
+                print(f"⚠️ Error invalidando caché de consultas de {tenant_id}: {str(e)}")
+        print(f"🧹 Caché de consultas invalidada para {tenant_id}")
+
+    def get(self, tenant_id: str, question: str, document_type: Optional[str] = None,
+            index_version: Optional[str] = None) -> Optional[Dict]:
+        """
+        Args:
+            index_version: Versión leída antes de la recuperación (get_index_version); se usa
+                la misma en put, así una respuesta construida con el índice anterior no se
+                guarda bajo la versión nueva si la ingesta escribe entretanto
+        """
+        index_version = index_version or self.get_index_version(tenant_id)
+        key = make_query_cache_key(tenant_id, question, document_type, index_version)
+
+        result = self.answers.get(key)
+        if result is None and self.persistent:
+            try:
+                entry = self.persistent.get_answer(tenant_id, key)
+            except Exception as e:
+                print(f"⚠️ Error leyendo caché de consultas: {str(e)}")
+                entry = None
+            if entry and entry.get('expires_at', 0) > time.time():
+                result = entry['result']
+                self.answers.put(key, result, entry['expires_at'] - time.time())
+
+        _record("hits" if result is not None else "misses")
+        return result
+
+    def put(self, tenant_id: str, question: str, document_type: Optional[str], result: Dict,
+            index_version: Optional[str] = None):
+        ttl_seconds = float(get_setting('QUERY_CACHE_TTL_SECONDS', QUERY_CACHE_TTL_SECONDS, tenant_id))
+        if ttl_seconds <= 0:
+            return
+
+        key = make_query_cache_key(tenant_id, question, document_type, index_version or self.get_index_version(tenant_id))
+        self.answers.put(key, result, ttl_seconds)
+        if self.persistent:
+            try:
+                self.persistent.put_answer(tenant_id, key, {"expires_at": time.time() + ttl_seconds, "result": result})
+            except Exception as e:
+                print(f"⚠️ Error escribiendo caché de consultas: {str(e)}")
+
+
+def get_query_cache() -> QueryCache:
+    """
+    Caché de consultas del contenedor; con QUERY_CACHE_BUCKET se comparte vía S3
+    """
+    global _cache
+    if _cache is None:
+        persistent = None
+        bucket = os.environ.get('QUERY_CACHE_BUCKET')
+        if bucket:
+            try:
+                persistent = S3QueryCacheBackend(bucket, os.environ.get('QUERY_CACHE_PREFIX', 'query-cache/'))
+            except Exception as e:
+                print(f"⚠️ Caché persistente de consultas deshabilitada: {str(e)}")
+        _cache = QueryCache(persistent)
+    return _cache
+
+
+def invalidate_tenant_queries(tenant_id: str):
+    """
+    Descarta las respuestas cacheadas del tenant (llamado tras escribir en su índice)
+    """
+    get_query_cache().invalidate_tenant(tenant_id)
@@ -4,31 +4,55 @@ import json
 import io
 import os
 import hashlib
+import re
 import PyPDF2
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Iterable, Iterator
 from datetime import datetime
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
-
+from botocore.config import Config
+from opensearchpy import OpenSearch
+from opensearchpy.exceptions import TransportError
+from helpers.aws_clients import get_bedrock_runtime_client, get_rekognition_client, get_opensearch_client
+from helpers.embedding_engine import run_embedding_jobs, invoke_titan_embedding, DEFAULT_CONCURRENCY
+from helpers.embedding_cache import get_or_compute_embeddings
+from helpers.bulk_writer import bulk_write
+from helpers.index_metadata import get_index_metadata, remember_index, forget_index, invalidate_index, is_index_not_found
+from helpers.index_profiles import INDEX_PROFILES, build_vector_mapping, vector_spec_from_profile
+from helpers.pdf_extraction import iter_pdf_pages as iter_pdf_pages_with_backend
+from helpers.image_preprocessing import build_rekognition_image
+from helpers.chunking import normalize_text, split_text, iter_text_chunks
+from concurrent.futures import ThreadPoolExecutor
+
+MULTIMODAL_MODEL_ID = "amazon.titan-embed-image-v1"
+
+# El motor de embeddings gestiona sus propios reintentos ante throttling
+EMBEDDING_CLIENT_CONFIG = Config(
+    max_pool_connections=max(10, DEFAULT_CONCURRENCY),
+    retries={'max_attempts': 1, 'mode': 'standard'}
+)
+
+# detect_labels y detect_text de cada imagen en paralelo (varias imágenes por lote SQS)
+REKOGNITION_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+
+
+def iter_pdf_pages(pdf_source, workers: int = None, backend: str = None) -> Iterator[str]:
+    """
+    Genera el texto de cada página del PDF sin acumular el documento completo
+    
+    Args:
+        pdf_source: Bytes del PDF, ruta en disco, S3Location o un objeto file-like con seek
+        workers: Procesos de extracción (por defecto PDF_EXTRACTION_WORKERS).
+            Con más de uno y bytes, ruta o S3Location, las páginas se extraen en paralelo.
+        backend: Backend de extracción (pypdf2, pypdfium2, pdfminer); por defecto PDF_EXTRACTOR
+    """
+    yield from iter_pdf_pages_with_backend(pdf_source, workers=workers, backend=backend)
 
 
 def extract_pdf_text(file_content: bytes) -> str:
     
     try:
-        pdf_file = io.BytesIO(file_content)
-        
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        text_content = ""
-
-        for page_num, page in enumerate(pdf_reader.pages, 1):
-            try:
-                page_text = page.extract_text()
-                text_content += f"\n{page_text}\n"
-            except Exception as e:
-                print(f"Error en página {page_num}: {str(e)}")
-                continue
+        # join en lugar de += evita el coste cuadrático en PDFs grandes
+        text_content = '\n'.join(iter_pdf_pages(file_content))
         
         text_content = clean_extracted_text(text_content)
         
@@ -41,37 +65,48 @@ def extract_pdf_text(file_content: bytes) -> str:
 
 def clean_extracted_text(text: str) -> str:
     
-    text = text.replace('\n\n\n', '\n\n')
-    
-    text = ' '.join(text.split())
-    
-    text = text.replace('\x00', '')
-    
-    return text.strip()
+    # Conserva párrafos y saltos de línea: son las fronteras preferidas del chunker
+    return normalize_text(text)
 
 
 def get_chunks(text_content: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Chunks de chunk_size tokens con chunk_overlap tokens de solape
+    
+    split_text devuelve además el offset de cada chunk en el texto.
+    """
     
     try:
-        chunk_size_chars = chunk_size * 4
-        overlap_chars = chunk_overlap * 4
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size_chars,
-            chunk_overlap=overlap_chars,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        
-        chunks = text_splitter.split_text(text_content)
-        
-        return chunks
+        return [chunk.text for chunk in split_text(text_content, chunk_size, chunk_overlap)]
         
     except Exception as e:
         print(f"❌ Error generando chunks: {str(e)}")
         raise ValueError(f"Error en chunking: {str(e)}")
 
 
+def iter_chunks(text_pieces: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[str]:
+    """
+    Versión en streaming de get_chunks: parte el texto a medida que llegan las páginas
+    
+    Los chunks cruzan saltos de página igual que si el documento se hubiera
+    partido entero (ver iter_text_chunks, que también da los offsets).
+    """
+    for chunk in iter_text_chunks(text_pieces, chunk_size, chunk_overlap):
+        yield chunk.text
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def get_embeddings(chunks: List[str], model_id: str = "amazon.titan-embed-text-v2:0", dimensions: int = 1024) -> List[List[float]]:
 
     if not chunks:
@@ -81,41 +116,26 @@ def get_embeddings(chunks: List[str], model_id: str = "amazon.titan-embed-text-v
         raise ValueError("Dimensiones soportadas por Titan V2: 1024, 512, 256")
     
     try:
- 
-        bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-east-1')
-
-        embeddings = []
-        
-        for i, chunk in enumerate(chunks):
-            try:
-                print(f"🔄 Procesando chunk {i+1}/{len(chunks)} - {len(chunk)} caracteres")
-                
-                payload = {
-                    "inputText": chunk.strip(),
-                    "dimensions": dimensions,
-                    "normalize": True
-                }
-            
-                response = bedrock_runtime.invoke_model(
-                    modelId=model_id,
-                    contentType="application/json",
-                    accept="application/json",
-                    body=json.dumps(payload)
-                )
-                
-                response_body = json.loads(response['body'].read())
-                embedding = response_body.get('embedding', [])
-                
-                if not embedding:
-                    print(f"❌ Bedrock no devolvió embedding para chunk {i+1}")
-                    continue
-                    
-                embeddings.append(embedding)
-                print(f"✅ Chunk {i+1} procesado - {len(embedding)} dimensiones")
-                
-            except Exception as chunk_error:
-                print(f"❌ Error en chunk {i+1}: {str(chunk_error)}")
-                continue
+
+        bedrock_runtime = get_bedrock_runtime_client(EMBEDDING_CLIENT_CONFIG, config_key='embeddings')
+
+        def embed_chunk(chunk: str) -> List[float]:
+            payload = {
+                "inputText": chunk.strip(),
+                "dimensions": dimensions,
+                "normalize": True
+            }
+            return invoke_titan_embedding(bedrock_runtime, model_id, payload)
+
+        def compute(pending: List[str]) -> List[Optional[List[float]]]:
+            print(f"🔄 Procesando {len(pending)} chunks no cacheados con concurrencia {DEFAULT_CONCURRENCY}")
+            return run_embedding_jobs(pending, embed_chunk, skip_errors=True)
+
+        results = get_or_compute_embeddings(chunks, model_id, dimensions, compute)
+        embeddings = [embedding for embedding in results if embedding]
+
+        if len(embeddings) < len(chunks):
+            print(f"❌ {len(chunks) - len(embeddings)} chunks sin embedding")
         
         print(f"🎉 Embeddings generados: {len(embeddings)} vectores de {dimensions} dimensiones")
         return embeddings
@@ -168,66 +188,90 @@ def generate_document_hash(tenant_id: str, source_file: str, chunk_index: int, c
     return document_hash
 
 
+def generate_content_hash(content: str) -> str:
+    """
+    Hash SHA-256 del contenido de un chunk, usado para detectar cambios al re-procesar
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_source_document(object_key: str) -> str:
+    """
+    Identidad lógica de un archivo: la key S3 sin el prefijo '{fecha}_{uuid}_' de upload.py
+    
+    Así una re-subida del mismo archivo se reconoce como el mismo documento.
+    """
+    path_parts = object_key.split('/')
+    path_parts[-1] = re.sub(r'^\d{8}_[0-9a-f]{8}_', '', path_parts[-1])
+    return '/'.join(path_parts)
+
+
+def generate_chunk_id(tenant_id: str, source_document: str, content_hash: str) -> str:
+    """
+    ID determinista de un chunk: el mismo contenido del mismo documento siempre usa el mismo _id
+    """
+    unique_string = f"{tenant_id}|{source_document}|{content_hash}"
+    return hashlib.sha256(unique_string.encode('utf-8')).hexdigest()[:40]
+
+
 def create_opensearch_client(region: str = 'us-east-1') -> OpenSearch:
 
     try:
-        print(f"🔐 Inicializando cliente OpenSearch para región {region}")
-        
-        session = boto3.Session()
-        credentials = session.get_credentials()
-        
-        awsauth = AWS4Auth(
-            credentials.access_key,
-            credentials.secret_key,
-            region,
-            'aoss',  # Amazon OpenSearch Serverless
-            session_token=credentials.token
-        )
-        
-        opensearch_endpoint = os.environ.get('OPENSEARCH_ENDPOINT')
-        if not opensearch_endpoint:
-            raise ValueError("Variable OPENSEARCH_ENDPOINT no configurada")
-        
-        host = opensearch_endpoint
-        
-        # Crear cliente
-        client = OpenSearch(
-            hosts=[{'host': host.replace('https://', ''), 'port': 443}],
-            http_auth=awsauth,
-            use_ssl=True,
-            verify_certs=True,
-            connection_class=RequestsHttpConnection,
-            timeout=60
-        )
-        
-        print(f"✅ Cliente OpenSearch creado exitosamente")
-        return client
+        # Cliente compartido del contenedor: reutiliza firmante y conexiones keep-alive
+        return get_opensearch_client(region)
         
     except Exception as e:
         print(f"❌ Error creando cliente OpenSearch: {str(e)}")
         raise ValueError(f"Error en cliente OpenSearch: {str(e)}")
 
 
+INCREMENTAL_INDEXING_MAPPING = {
+    "properties": {
+        "source_document": {"type": "keyword"},
+        "chunk_id": {"type": "keyword"},
+        "content_hash": {"type": "keyword"}
+    }
+}
+
+
 def create_index_if_not_exists(
     client: OpenSearch, 
     index_name: str, 
-    dimensions: int = 1024
+    dimensions: int = 1024,
+    profile: Optional[Dict] = None
 ) -> bool:
+    """
+    Crea el índice del tenant con el perfil vectorial indicado (motor, cuantización, HNSW)
+
+    Sin perfil se usa default con las dimensiones dadas. Un índice existente
+    conserva su mapping: el perfil solo se aplica a índices nuevos.
+    """
+
+    profile = profile or dict(INDEX_PROFILES["default"], name="default", dimension=dimensions)
 
     try:
 
-        if client.indices.exists(index=index_name):
-            print(f"📋 Índice '{index_name}' ya existe")
+        metadata = get_index_metadata(client, index_name)
+        if metadata["exists"]:
+            # Índices anteriores a la re-indexación incremental no tienen estos campos
+            missing_fields = set(INCREMENTAL_INDEXING_MAPPING["properties"]) - metadata["fields"]
+            if missing_fields:
+                print(f"📋 Índice '{index_name}' ya existe, añadiendo campos {sorted(missing_fields)}")
+                client.indices.put_mapping(index=index_name, body=INCREMENTAL_INDEXING_MAPPING)
+                remember_index(index_name, metadata["vector"], metadata["fields"] | missing_fields)
             return True
         
-        print(f"🆕 Creando índice '{index_name}' con {dimensions} dimensiones")
+        print(f"🆕 Creando índice '{index_name}' con perfil {profile['name']} ({profile['dimension']} dimensiones, {profile['engine']})")
+        
+        index_settings = {
+            "knn": True  # Habilitar k-NN search
+        }
+        if profile["engine"] == 'nmslib':
+            index_settings["knn.algo_param.ef_search"] = profile["ef_search"]
         
         index_mapping = {
             "settings": {
-                "index": {
-                    "knn": True,  # Habilitar k-NN search
-                    "knn.algo_param.ef_search": 100
-                }
+                "index": index_settings
             },
             "mappings": {
                 "properties": {
@@ -238,15 +282,7 @@ def create_index_if_not_exists(
                         "type": "text",
                         "analyzer": "standard"
                     },
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": dimensions,
-                        "method": {
-                            "name": "hnsw",
-                            "space_type": "cosinesimil",
-                            "engine": "nmslib"
-                        }
-                    },
+                    "embedding": build_vector_mapping(profile),
                     "document_type": {
                         "type": "keyword"
                     },
@@ -256,6 +292,15 @@ def create_index_if_not_exists(
                     "source_file": {
                         "type": "keyword"
                     },
+                    "source_document": {
+                        "type": "keyword"  # Archivo lógico, estable entre re-subidas
+                    },
+                    "chunk_id": {
+                        "type": "keyword"
+                    },
+                    "content_hash": {
+                        "type": "keyword"
+                    },
                     "chunk_index": {
                         "type": "integer"
                     },
@@ -275,12 +320,23 @@ def create_index_if_not_exists(
         }
         
         # Crear índice
-        response = client.indices.create(
-            index=index_name,
-            body=index_mapping
-        )
+        try:
+            client.indices.create(
+                index=index_name,
+                body=index_mapping
+            )
+            print(f"✅ Índice '{index_name}' creado exitosamente")
+        except TransportError as e:
+            # Otra invocación concurrente del mismo tenant lo creó primero
+            if e.error != 'resource_already_exists_exception':
+                raise
+            print(f"📋 Índice '{index_name}' creado por otra invocación")
+            # Su mapping (y su perfil) puede no ser el nuestro: se lee el real
+            invalidate_index(index_name)
+            get_index_metadata(client, index_name)
+            return True
         
-        print(f"✅ Índice '{index_name}' creado exitosamente")
+        remember_index(index_name, vector_spec_from_profile(profile), index_mapping["mappings"]["properties"].keys())
         return True
         
     except Exception as e:
@@ -288,12 +344,74 @@ def create_index_if_not_exists(
         return False
 
 
+def get_indexed_chunks(
+    client: OpenSearch,
+    index_name: str,
+    tenant_id: str,
+    source_document: str,
+    page_size: int = 1000
+) -> Dict[str, Dict]:
+    """
+    Devuelve los chunks ya indexados de un documento lógico, sin vectores
+    
+    Returns:
+        Diccionario chunk_id -> {content_hash, chunk_index, source_file}
+    """
+    chunks = {}
+    search_after = None
+    
+    while True:
+        search_query = {
+            "size": page_size,
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"term": {"tenant_id": tenant_id}},
+                        {"term": {"source_document": source_document}}
+                    ]
+                }
+            },
+            "sort": [{"chunk_id": "asc"}],
+            "_source": ["chunk_id", "content_hash", "chunk_index", "source_file"]
+        }
+        if search_after:
+            search_query["search_after"] = search_after
+        
+        try:
+            response = client.search(index=index_name, body=search_query)
+        except Exception as e:
+            if is_index_not_found(e):
+                forget_index(index_name)
+                return chunks
+            raise
+        hits = response.get('hits', {}).get('hits', [])
+        
+        for hit in hits:
+            source = hit.get('_source', {})
+            chunk_id = source.get('chunk_id') or hit['_id']
+            chunks[chunk_id] = {
+                "content_hash": source.get('content_hash'),
+                "chunk_index": source.get('chunk_index'),
+                "source_file": source.get('source_file')
+            }
+        
+        if len(hits) < page_size:
+            return chunks
+        search_after = hits[-1]['sort']
+
+
 def index_document_bulk(
     client: OpenSearch,
     index_name: str,
     documents: List[Dict],
     tenant_id: str
 ) -> bool:
+    """
+    Indexa chunks en bloque
+    
+    Documentos con 'chunk_id' se escriben bajo ese _id (upsert). Si además no
+    traen 'embedding' solo se actualizan sus metadatos (chunk sin cambios).
+    """
 
     try:
         if not documents:
@@ -302,21 +420,37 @@ def index_document_bulk(
         
         print(f"Preparando bulk indexing de {len(documents)} documentos para tenant '{tenant_id}'")
         
-        bulk_body = []
+        operations = []
         timestamp = datetime.utcnow().isoformat()
         
         for i, doc in enumerate(documents):
+            chunk_index = doc.get('chunk_index', i)
+            chunk_id = doc.get('chunk_id')
+            
+            if chunk_id and doc.get('embedding') is None:
+                # Chunk ya indexado con el mismo contenido: actualizar posición y archivo.
+                # created_at se renueva para que una migración en curso recoja el cambio
+                operations.append(({"update": {"_index": index_name, "_id": chunk_id}}, {"doc": {
+                    "chunk_index": chunk_index,
+                    "source_file": doc.get('source_file', 'unknown'),
+                    "document_type": doc.get('document_type', 'unknown'),
+                    "file_format": doc.get('file_format', 'unknown'),
+                    "created_at": timestamp
+                }}))
+                continue
+            
             action = {
                 "index": {
                     "_index": index_name
                 }
             }
-            bulk_body.append(action)
+            if chunk_id:
+                action["index"]["_id"] = chunk_id
             
             content_hash = generate_document_hash(
                 tenant_id, 
                 doc.get('source_file', 'unknown'), 
-                i,
+                chunk_index,
                 doc['content'][:100]  # Primeros 100 chars del contenido
             )
             
@@ -328,33 +462,18 @@ def index_document_bulk(
                 "document_type": doc.get('document_type', 'unknown'),
                 "file_format": doc.get('file_format', 'unknown'),
                 "source_file": doc.get('source_file', 'unknown'),
-                "chunk_index": i,
+                "chunk_index": chunk_index,
                 "document_hash": content_hash,  # Hash único para identificación
                 "created_at": timestamp
             }
-            bulk_body.append(document)
+            for field in ('source_document', 'chunk_id', 'content_hash', 'content_type', 'description'):
+                if doc.get(field):
+                    document[field] = doc[field]
+            operations.append((action, document))
         
-        # Ejecutar bulk request
+        # Ejecutar bulk en lotes acotados por bytes y documentos, enviados en paralelo
         print(f"🚀 Ejecutando bulk indexing...")
-        response = client.bulk(body=bulk_body)
-        
-        # Verificar errores
-        if response.get('errors'):
-            failed_docs = []
-            for item in response['items']:
-                if 'error' in item.get('index', {}):
-                    error_info = item['index']['error']
-                    failed_docs.append(f"ID: {item['index']['_id']}, Error: {error_info}")
-                    print(f"❌ Error indexando: {error_info}")
-            
-            if failed_docs:
-                print(f"⚠️ {len(failed_docs)} documentos fallaron en indexado")
-                return False
-        
-        successful_docs = len([item for item in response['items'] if 'error' not in item.get('index', {})])
-        print(f"✅ Bulk indexing completado: {successful_docs}/{len(documents)} documentos indexados")
-        
-        return True
+        return bulk_write(client, operations, "indexing")["success"]
         
     except Exception as e:
         print(f"❌ Error en bulk indexing: {str(e)}")
@@ -363,6 +482,42 @@ def index_document_bulk(
         return False
 
 
+def delete_documents_bulk(client: OpenSearch, index_name: str, document_ids: List[str]) -> bool:
+
+    try:
+        if not document_ids:
+            return True
+        
+        print(f"🗑️ Eliminando {len(document_ids)} chunks obsoletos de '{index_name}'")
+        
+        operations = [({"delete": {"_index": index_name, "_id": document_id}}, None) for document_id in document_ids]
+        return bulk_write(client, operations, "delete")["success"]
+        
+    except Exception as e:
+        print(f"❌ Error eliminando chunks: {str(e)}")
+        return False
+
+
+def build_multimodal_payload(base64_image: str = None, input_text: str = None, dimensions: int = 1024) -> Dict:
+
+    # Payload para Titan Multimodal
+    payload = {
+        "embeddingConfig": {
+            "outputEmbeddingLength": dimensions
+        }
+    }
+    
+    # Agregar imagen si está presente
+    if base64_image:
+        payload["inputImage"] = base64_image
+        
+    # Agregar texto si está presente
+    if input_text:
+        payload["inputText"] = input_text.strip()
+
+    return payload
+
+
 def get_multimodal_embeddings(base64_image: str = None, input_text: str = None, dimensions: int = 1024) -> List[List[float]]:
 
     if dimensions not in [1024, 384, 256]:
@@ -373,7 +528,7 @@ def get_multimodal_embeddings(base64_image: str = None, input_text: str = None,
     
     try:
         
-        bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-east-1')
+        bedrock_runtime = get_bedrock_runtime_client(EMBEDDING_CLIENT_CONFIG, config_key='embeddings')
         
         # Determinar tipo de embedding
         if base64_image and input_text:
@@ -383,38 +538,24 @@ def get_multimodal_embeddings(base64_image: str = None, input_text: str = None,
         else:
             print(f"🔤 Generando embedding de texto (modelo multimodal) - {dimensions} dimensiones")
         
-        # Payload para Titan Multimodal
-        payload = {
-            "embeddingConfig": {
-                "outputEmbeddingLength": dimensions
-            }
-        }
-        
-        # Agregar imagen si está presente
-        if base64_image:
-            payload["inputImage"] = base64_image
-            
-        # Agregar texto si está presente
         if input_text:
-            payload["inputText"] = input_text.strip()
             if len(input_text) > 50:
                 print(f"📝 Texto: {input_text[:50]}...")
             else:
                 print(f"📝 Texto: {input_text}")
         
-        response = bedrock_runtime.invoke_model(
-            modelId="amazon.titan-embed-image-v1",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(payload)
-        )
-        
-        response_body = json.loads(response['body'].read())
-        embedding = response_body.get('embedding', [])
+        def compute(pending: List[str]) -> List[List[float]]:
+            payload = build_multimodal_payload(base64_image, pending[0], dimensions)
+            # Un único elemento: el motor aporta el backoff ante throttling
+            return run_embedding_jobs(
+                [payload],
+                lambda item: invoke_titan_embedding(bedrock_runtime, MULTIMODAL_MODEL_ID, item),
+                concurrency=1
+            )
         
-        if not embedding:
-            print("❌ Titan Multimodal no devolvió embedding")
-            raise ValueError("No se pudo generar embedding multimodal")
+        embedding = get_or_compute_embeddings(
+            [input_text or ''], MULTIMODAL_MODEL_ID, dimensions, compute, image=base64_image
+        )[0]
             
         print(f"✅ Embedding multimodal generado - {len(embedding)} dimensiones")
         return [embedding]  # Devolver como lista para mantener consistencia
@@ -426,21 +567,73 @@ def get_multimodal_embeddings(base64_image: str = None, input_text: str = None,
         raise ValueError(f"Error en embedding multimodal: {str(e)}")
 
 
-def analyze_image_with_rekognition(image_bytes: bytes, filename: str = "imagen") -> str:
+def get_multimodal_embeddings_batch(texts: List[str], dimensions: int = 1024) -> List[List[float]]:
+    """
+    Genera embeddings de texto con Titan Multimodal para varios chunks en paralelo
+    
+    Args:
+        texts: Lista de textos a embeber
+        dimensions: Dimensiones del vector (1024, 384, 256)
+    
+    Returns:
+        Lista de vectores en el mismo orden que texts
+    """
+    if dimensions not in [1024, 384, 256]:
+        raise ValueError("Dimensiones soportadas por Titan Multimodal: 1024, 384, 256")
+    
+    if not texts:
+        return []
+    
+    try:
+        
+        bedrock_runtime = get_bedrock_runtime_client(EMBEDDING_CLIENT_CONFIG, config_key='embeddings')
+        
+        def compute(pending: List[str]) -> List[List[float]]:
+            print(f"🔤 Generando {len(pending)} embeddings multimodales no cacheados - concurrencia {DEFAULT_CONCURRENCY}")
+            payloads = [build_multimodal_payload(None, text, dimensions) for text in pending]
+            return run_embedding_jobs(
+                payloads,
+                lambda item: invoke_titan_embedding(bedrock_runtime, MULTIMODAL_MODEL_ID, item)
+            )
+        
+        embeddings = get_or_compute_embeddings(texts, MULTIMODAL_MODEL_ID, dimensions, compute)
+        
+        print(f"✅ {len(embeddings)} embeddings multimodales generados")
+        return embeddings
+        
+    except Exception as e:
+        print(f"❌ Error generando embeddings multimodales en lote: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise ValueError(f"Error en embedding multimodal: {str(e)}")
+
+
+def analyze_image_with_rekognition(image_bytes: bytes, filename: str = "imagen", s3_object: Optional[Dict] = None) -> str:
+    """
+    Descripción textual de la imagen con etiquetas (detect_labels) y texto visible (detect_text)
+    
+    Las dos llamadas son independientes y se lanzan a la vez. Si image_bytes
+    supera el límite en línea de Rekognition se usa la referencia s3_object.
+    """
 
     try:
         
-        rekognition = boto3.client('rekognition', region_name='us-east-1')
+        rekognition = get_rekognition_client()
+        image = build_rekognition_image(image_bytes, s3_object)
         
-        print(f"🔍 Analizando imagen '{filename}' con Rekognition...")
+        print(f"🔍 Analizando imagen '{filename}' con Rekognition (objetos y texto en paralelo)...")
         
         # 1. Detectar objetos, escenas y conceptos
-        print("📋 Detectando objetos y escenas...")
-        labels_response = rekognition.detect_labels(
-            Image={'Bytes': image_bytes},
+        labels_future = REKOGNITION_EXECUTOR.submit(
+            rekognition.detect_labels,
+            Image=image,
             MaxLabels=20,  # Máximo 20 etiquetas
             MinConfidence=75.0  # Confianza mínima del 75%
         )
+        # 2. Extraer texto visible (OCR)
+        text_future = REKOGNITION_EXECUTOR.submit(rekognition.detect_text, Image=image)
+        
+        labels_response = labels_future.result()
         
         # Extraer objetos detectados
         objects = []
@@ -451,14 +644,10 @@ def analyze_image_with_rekognition(image_bytes: bytes, filename: str = "imagen")
             
         objects_text = ", ".join(objects[:10]) if objects else "No se detectaron objetos específicos"
         
-        # 2. Extraer texto visible (OCR)
-        print("🔤 Extrayendo texto visible...")
+        detected_texts = []
         try:
-            text_response = rekognition.detect_text(
-                Image={'Bytes': image_bytes}
-            )
+            text_response = text_future.result()
             
-            detected_texts = []
             for text_detection in text_response.get('TextDetections', []):
                 if text_detection['Type'] == 'LINE':  # Solo líneas completas, no palabras individuales
                     text = text_detection['DetectedText']
@@ -0,0 +1,270 @@
+import re
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from helpers.settings import get_setting
+
+
+# knn: solo vectorial (comportamiento original); hybrid: BM25 sobre content + kNN fusionados
+RETRIEVAL_MODES = ('knn', 'hybrid')
+FUSION_METHODS = ('rrf', 'weighted')
+
+SOURCE_FIELDS = [
+    "content",
+    "source_file",
+    "document_type",
+    "chunk_index",
+    "created_at",
+    "document_hash"
+]
+
+
+def get_retrieval_config(tenant_id: Optional[str] = None) -> Dict:
+    """
+    Modo de recuperación y pesos de fusión: override del tenant, luego variables de entorno
+    """
+    mode = str(get_setting('RETRIEVAL_MODE', 'knn', tenant_id)).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"RETRIEVAL_MODE no soportado: {mode}. Opciones: {', '.join(RETRIEVAL_MODES)}")
+
+    fusion = str(get_setting('HYBRID_FUSION', 'rrf', tenant_id)).lower()
+    if fusion not in FUSION_METHODS:
+        raise ValueError(f"HYBRID_FUSION no soportado: {fusion}. Opciones: {', '.join(FUSION_METHODS)}")
+
+    return {
+        "mode": mode,
+        "fusion": fusion,
+        "knn_weight": float(get_setting('HYBRID_KNN_WEIGHT', '1.0', tenant_id)),
+        "lexical_weight": float(get_setting('HYBRID_LEXICAL_WEIGHT', '1.0', tenant_id)),
+        "rrf_k": int(get_setting('HYBRID_RRF_K', '60', tenant_id)),
+        "candidates": int(get_setting('HYBRID_CANDIDATES', '20', tenant_id)),
+        "mmr_enabled": str(get_setting('MMR_ENABLED', 'true', tenant_id)).lower() == 'true',
+        "mmr_lambda": float(get_setting('MMR_LAMBDA', '0.7', tenant_id)),
+        "mmr_fetch_k": int(get_setting('MMR_FETCH_K', '20', tenant_id)),
+        "context_k": int(get_setting('CONTEXT_TOP_K', '5', tenant_id)),
+        "duplicate_threshold": float(get_setting('MMR_DUPLICATE_THRESHOLD', '0.95', tenant_id)),
+        "overlap_threshold": float(get_setting('MMR_OVERLAP_THRESHOLD', '0.5', tenant_id))
+    }
+
+
+def _filters(tenant_id: str, document_type: Optional[str] = None) -> List[Dict]:
+    filters = [{"term": {"tenant_id": tenant_id}}]
+    if document_type:
+        filters.append({"term": {"document_type": document_type}})
+    return filters
+
+
+def _source_fields(include_embeddings: bool) -> List[str]:
+    return SOURCE_FIELDS + ["embedding"] if include_embeddings else SOURCE_FIELDS
+
+
+def build_knn_query(question_embedding: Sequence[float], tenant_id: str, document_type: Optional[str] = None, size: int = 10, include_embeddings: bool = False, efficient_filter: bool = False) -> Dict:
+    """
+    kNN filtrada por tenant (y tipo de documento)
+
+    Con efficient_filter (motores faiss y lucene) el filtro va dentro de la
+    cláusula knn y se aplica durante la búsqueda en el grafo: se obtienen k
+    vecinos del tenant aunque el índice sea compartido. Si no, se filtra
+    después y en un índice compartido podrían quedar menos de k.
+    """
+    if efficient_filter:
+        return {
+            "size": size,
+            "query": {
+                "knn": {
+                    "embedding": {
+                        "vector": question_embedding,
+                        "k": size,
+                        "filter": {"bool": {"filter": _filters(tenant_id, document_type)}}
+                    }
+                }
+            },
+            "_source": _source_fields(include_embeddings)
+        }
+
+    return {
+        "size": size,
+        "query": {
+            "bool": {
+                "must": {
+                    "knn": {
+                        "embedding": {
+                            "vector": question_embedding,
+                            "k": size
+                        }
+                    }
+                },
+                "filter": _filters(tenant_id, document_type)
+            }
+        },
+        "_source": _source_fields(include_embeddings)
+    }
+
+
+def build_lexical_query(question: str, tenant_id: str, document_type: Optional[str] = None, size: int = 10, include_embeddings: bool = False) -> Dict:
+    """
+    BM25 sobre content (y description de imágenes): recupera identificadores exactos que kNN pierde
+    """
+    return {
+        "size": size,
+        "query": {
+            "bool": {
+                "must": {
+                    "multi_match": {
+                        "query": question,
+                        "fields": ["content", "description"]
+                    }
+                },
+                "filter": _filters(tenant_id, document_type)
+            }
+        },
+        "_source": _source_fields(include_embeddings)
+    }
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Dict]], weights: Sequence[float], k: int = 60) -> List[Dict]:
+    """
+    Fusiona listas de hits por rango: score = Σ peso / (k + rango)
+
+    No depende de la escala de los scores (BM25 y coseno no son comparables).
+    """
+    fused = {}
+    for hits, weight in zip(result_lists, weights):
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.setdefault(hit['_id'], {"hit": hit, "score": 0.0})
+            entry["score"] += weight / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+    return [{**entry["hit"], "_score": entry["score"]} for entry in ranked]
+
+
+def weighted_score_fusion(result_lists: Sequence[Sequence[Dict]], weights: Sequence[float]) -> List[Dict]:
+    """
+    Fusiona por score normalizado min-max en cada lista y ponderado
+    """
+    fused = {}
+    for hits, weight in zip(result_lists, weights):
+        if not hits:
+            continue
+        scores = [hit.get('_score') or 0.0 for hit in hits]
+        low, high = min(scores), max(scores)
+        for hit, score in zip(hits, scores):
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            entry = fused.setdefault(hit['_id'], {"hit": hit, "score": 0.0})
+            entry["score"] += weight * normalized
+
+    ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+    return [{**entry["hit"], "_score": entry["score"]} for entry in ranked]
+
+
+def fuse_results(knn_hits: Sequence[Dict], lexical_hits: Sequence[Dict], config: Dict) -> List[Dict]:
+    weights = (config["knn_weight"], config["lexical_weight"])
+    if config["fusion"] == 'weighted':
+        return weighted_score_fusion((knn_hits, lexical_hits), weights)
+    return reciprocal_rank_fusion((knn_hits, lexical_hits), weights, config["rrf_k"])
+
+
+def maximal_marginal_relevance(
+    query_embedding: Sequence[float],
+    candidate_embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+    duplicate_threshold: float = 1.0
+) -> List[int]:
+    """
+    Índices de los k candidatos que equilibran relevancia y diversidad
+
+    score = λ · sim(pregunta, c) − (1 − λ) · max sim(c, seleccionados). La matriz
+    de similitudes entre candidatos se calcula una sola vez; cada paso solo
+    actualiza el máximo por candidato. Los candidatos con similitud mayor que
+    duplicate_threshold respecto a uno ya elegido se descartan.
+    """
+    vectors = np.asarray(candidate_embeddings, dtype=np.float32)
+    if len(vectors) == 0 or k <= 0:
+        return []
+
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+
+    selected = []
+    available = np.ones(len(vectors), dtype=bool)
+    max_similarity = np.zeros(len(vectors), dtype=np.float32)
+
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, pairwise[best])
+        available &= max_similarity < duplicate_threshold
+
+    return selected
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return set()
+    return {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def shingle_overlap(first: set, second: set) -> float:
+    """
+    Fracción del chunk más corto que comparte trigramas de palabras con el otro
+    """
+    if not first or not second:
+        return 0.0
+    return len(first & second) / min(len(first), len(second))
+
+
+def text_overlap(first: str, second: str) -> float:
+    return shingle_overlap(_shingles(first), _shingles(second))
+
+
+def diversify_documents(query_embedding: Sequence[float], documents: Sequence[Dict], config: Dict) -> List[Dict]:
+    """
+    Etapa post-recuperación: MMR sobre los vectores candidatos y dedup por solapamiento de texto
+
+    Los vecinos de un mismo archivo comparten el solape de get_chunks; aquí se
+    evita que ocupen varios huecos del contexto con casi el mismo texto.
+    """
+    k = config["context_k"]
+    if not config["mmr_enabled"] or len(documents) <= 1:
+        return list(documents[:k])
+
+    start = time.perf_counter()
+
+    with_vectors = [document for document in documents if document.get('embedding')]
+    if len(with_vectors) == len(documents):
+        order = maximal_marginal_relevance(
+            query_embedding,
+            np.array([document['embedding'] for document in documents], dtype=np.float32),
+            len(documents),
+            config["mmr_lambda"],
+            config["duplicate_threshold"]
+        )
+    else:
+        order = list(range(len(documents)))
+
+    selected = []
+    selected_shingles = []
+    for index in order:
+        # Los trigramas se calculan una vez por candidato y solo para los que llegan a evaluarse
+        shingles = _shingles(documents[index].get('content', ''))
+        if all(shingle_overlap(shingles, chosen) < config["overlap_threshold"] for chosen in selected_shingles):
+            selected.append(documents[index])
+            selected_shingles.append(shingles)
+        if len(selected) >= k:
+            break
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"🧮 MMR: {len(documents)} candidatos → {len(selected)} en {elapsed_ms:.2f} ms")
+    return selected
@@ -0,0 +1,177 @@
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from helpers.aws_clients import get_s3_client
+
+
+S3_BLOCK_SIZE = int(os.environ.get('S3_BLOCK_SIZE', str(1024 * 1024)))
+S3_MAX_CACHED_BLOCKS = int(os.environ.get('S3_MAX_CACHED_BLOCKS', '64'))
+S3_PART_SIZE = int(os.environ.get('S3_PART_SIZE', str(4 * 1024 * 1024)))
+S3_DOWNLOAD_CONCURRENCY = int(os.environ.get('S3_DOWNLOAD_CONCURRENCY', '8'))
+
+
+class S3Location:
+    """
+    Referencia a un objeto S3 que cada proceso/hilo abre por su cuenta
+    """
+
+    def __init__(self, bucket: str, key: str, size: Optional[int] = None):
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+
+    def open(self) -> 'S3RangedFile':
+        return S3RangedFile(self.bucket, self.key, self.size)
+
+    def __repr__(self):
+        return f"s3://{self.bucket}/{self.key}"
+
+
+def get_object_size(s3_client, bucket: str, key: str) -> int:
+    return s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+
+
+class S3RangedFile(io.RawIOBase):
+    """
+    File-like de solo lectura con seek que descarga bloques bajo demanda con GET por rangos
+
+    Los bloques leídos se guardan en un LRU acotado, así los saltos de los
+    parsers PDF (xref al final, objetos dispersos) no vuelven a S3 ni obligan a
+    tener el objeto completo en memoria.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        size: Optional[int] = None,
+        block_size: int = S3_BLOCK_SIZE,
+        max_cached_blocks: int = S3_MAX_CACHED_BLOCKS,
+        s3_client=None
+    ):
+        super().__init__()
+        self.s3_client = s3_client or get_s3_client()
+        self.bucket = bucket
+        self.key = key
+        self.size = size if size is not None else get_object_size(self.s3_client, bucket, key)
+        self.block_size = block_size
+        self.max_cached_blocks = max_cached_blocks
+        self.position = 0
+        self.range_requests = 0
+        self.bytes_fetched = 0
+        self._blocks = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"whence no soportado: {whence}")
+
+        if position < 0:
+            raise ValueError("Posición negativa en seek")
+        self.position = position
+        return self.position
+
+    def _get_block(self, block_index: int) -> bytes:
+        block = self._blocks.get(block_index)
+        if block is not None:
+            self._blocks.move_to_end(block_index)
+            return block
+
+        start = block_index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+        block = response['Body'].read()
+
+        self.range_requests += 1
+        self.bytes_fetched += len(block)
+        self._blocks[block_index] = block
+        while len(self._blocks) > self.max_cached_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def read(self, size: int = -1) -> bytes:
+        if self.position >= self.size:
+            return b''
+
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        parts = []
+        while self.position < end:
+            block_index, block_offset = divmod(self.position, self.block_size)
+            block = self._get_block(block_index)
+            part = block[block_offset:block_offset + (end - self.position)]
+            parts.append(part)
+            self.position += len(part)
+        return b''.join(parts)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+
+def as_readable(source):
+    """
+    Fuente de un extractor como algo legible: bytes → BytesIO, S3Location → lectura
+    por rangos; rutas y file-likes se devuelven tal cual
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    if isinstance(source, S3Location):
+        return source.open()
+    return source
+
+
+def iter_s3_object(s3_client, bucket: str, key: str, chunk_size: int = S3_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Lee un objeto S3 en streaming, sin bufferizarlo entero
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    yield from response['Body'].iter_chunks(chunk_size)
+
+
+def download_s3_object_parallel(
+    s3_client,
+    bucket: str,
+    key: str,
+    size: Optional[int] = None,
+    part_size: int = S3_PART_SIZE,
+    concurrency: int = S3_DOWNLOAD_CONCURRENCY
+) -> bytes:
+    """
+    Descarga un objeto completo con GETs por rangos en paralelo (imágenes y archivos pequeños)
+    """
+    size = size if size is not None else get_object_size(s3_client, bucket, key)
+    if size <= part_size:
+        return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+    content = bytearray(size)
+
+    def fetch(start: int):
+        end = min(start + part_size, size) - 1
+        data = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")['Body'].read()
+        content[start:start + len(data)] = data
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fetch, range(0, size, part_size)))
+
+    return bytes(content)
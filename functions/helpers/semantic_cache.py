@@ -0,0 +1,236 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from helpers.settings import get_setting
+
+
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', '512'))  # Por tenant
+SEMANTIC_CACHE_MAX_AGE_SECONDS = float(os.environ.get('SEMANTIC_CACHE_MAX_AGE_SECONDS', '3600'))
+# Tenants con caché en el contenedor; al superarlo se descarta la del tenant usado hace más tiempo
+SEMANTIC_CACHE_MAX_TENANTS = int(os.environ.get('SEMANTIC_CACHE_MAX_TENANTS', '64'))
+# Capacidad inicial de cada matriz; se duplica al llenarse hasta SEMANTIC_CACHE_MAX_ENTRIES
+SEMANTIC_CACHE_INITIAL_ENTRIES = 16
+
+_stats = {
+    "lookups": 0,
+    "hits": 0,
+    "lookup_ms": 0.0,
+    "generations": 0,
+    "generation_ms": 0.0
+}
+_stats_lock = threading.Lock()
+
+_caches: 'OrderedDict[str, SemanticAnswerCache]' = OrderedDict()
+_caches_lock = threading.Lock()
+
+
+def _record(**amounts):
+    with _stats_lock:
+        for counter, amount in amounts.items():
+            _stats[counter] += amount
+
+
+def reset_semantic_cache_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+def get_semantic_cache_stats() -> Dict:
+    """
+    Hit-rate y latencias medias: búsqueda en la caché frente a generación con el LLM
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        "lookups": stats["lookups"],
+        "hits": stats["hits"],
+        "hit_rate": round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0,
+        "avg_lookup_ms": round(stats["lookup_ms"] / stats["lookups"], 3) if stats["lookups"] else 0.0,
+        "avg_generation_ms": round(stats["generation_ms"] / stats["generations"], 1) if stats["generations"] else 0.0
+    }
+
+
+def make_sources_signature(documents: Sequence[Dict]) -> str:
+    """
+    Huella del conjunto de chunks recuperados (independiente del orden y de los scores)
+    """
+    digests = sorted(
+        hashlib.sha256(f"{doc.get('source_file', '')}\x1f{doc.get('content', '')}".encode('utf-8')).hexdigest()
+        for doc in documents
+    )
+    return hashlib.sha256('\x1e'.join(digests).encode('utf-8')).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Respuestas recientes de un tenant indexadas por el embedding de la pregunta
+
+    Los embeddings normalizados viven en una matriz float32 contigua, así una
+    búsqueda es un único producto matriz-vector (similitud coseno) sobre todas
+    las entradas. La matriz empieza pequeña y se duplica al llenarse hasta
+    max_entries: un tenant con pocas preguntas ocupa pocos KB. Una respuesta solo se reutiliza si además el conjunto de
+    fuentes recuperadas es el mismo que cuando se generó.
+    """
+
+    def __init__(self, dimensions: int, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, max_age_seconds: float = SEMANTIC_CACHE_MAX_AGE_SECONDS):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        capacity = max(1, min(max_entries, SEMANTIC_CACHE_INITIAL_ENTRIES))
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._created_at = np.full(capacity, -np.inf)
+        self._last_used = np.full(capacity, -np.inf)
+        self._signatures: List[Optional[str]] = [None] * capacity
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(answer is not None for answer in self._answers)
+
+    def _normalize(self, embedding: Sequence[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dimensions,):
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _grow(self):
+        capacity = len(self._answers)
+        extra = min(capacity, self.max_entries - capacity)
+        self._vectors = np.concatenate([self._vectors, np.zeros((extra, self.dimensions), dtype=np.float32)])
+        self._created_at = np.concatenate([self._created_at, np.full(extra, -np.inf)])
+        self._last_used = np.concatenate([self._last_used, np.full(extra, -np.inf)])
+        self._signatures.extend([None] * extra)
+        self._answers.extend([None] * extra)
+
+    def _evict_expired(self, now: float):
+        expired = np.flatnonzero(self._created_at < now - self.max_age_seconds)
+        for slot in expired:
+            if self._answers[slot] is not None:
+                self._answers[slot] = None
+                self._signatures[slot] = None
+                self._last_used[slot] = -np.inf
+
+    def lookup(self, embedding: Sequence[float], sources_signature: str, threshold: float = SEMANTIC_CACHE_THRESHOLD) -> Optional[Dict]:
+        vector = self._normalize(embedding)
+        if vector is None:
+            return None
+
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+
+            similarities = self._vectors @ vector
+            valid = np.array([signature == sources_signature for signature in self._signatures])
+            similarities = np.where(valid, similarities, -np.inf)
+
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < threshold:
+                return None
+
+            self._last_used[slot] = now
+            return {
+                "answer": self._answers[slot],
+                "similarity": round(float(similarities[slot]), 4)
+            }
+
+    def put(self, embedding: Sequence[float], sources_signature: str, answer: str):
+        vector = self._normalize(embedding)
+        if vector is None or not answer:
+            return
+
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+
+            # Primero un hueco libre; si no hay, se agranda la matriz o se reemplaza la entrada menos usada
+            free_slots = [slot for slot, stored in enumerate(self._answers) if stored is None]
+            if not free_slots and len(self._answers) < self.max_entries:
+                free_slots = [len(self._answers)]
+                self._grow()
+            slot = free_slots[0] if free_slots else int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vector
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+            self._signatures[slot] = sources_signature
+            self._answers[slot] = answer
+
+
+def get_semantic_cache(tenant_id: str, dimensions: int) -> SemanticAnswerCache:
+    """
+    Caché del tenant para esa dimensión; como mucho SEMANTIC_CACHE_MAX_TENANTS por contenedor (LRU)
+    """
+    key = f"{tenant_id}:{dimensions}"
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = SemanticAnswerCache(dimensions)
+            _caches[key] = cache
+            while len(_caches) > max(1, SEMANTIC_CACHE_MAX_TENANTS):
+                _caches.popitem(last=False)
+        else:
+            _caches.move_to_end(key)
+    return cache
+
+
+def _is_enabled(tenant_id: str) -> bool:
+    return str(get_setting('SEMANTIC_CACHE_ENABLED', 'true', tenant_id)).lower() == 'true'
+
+
+def lookup_semantic_answer(tenant_id: str, question_embedding: Sequence[float], documents: Sequence[Dict]) -> Optional[str]:
+    """
+    Respuesta ya generada para una pregunta equivalente con las mismas fuentes, o None
+    """
+    if not _is_enabled(tenant_id) or not question_embedding:
+        return None
+
+    cache = get_semantic_cache(tenant_id, len(question_embedding))
+    threshold = float(get_setting('SEMANTIC_CACHE_THRESHOLD', SEMANTIC_CACHE_THRESHOLD, tenant_id))
+
+    start = time.perf_counter()
+    hit = cache.lookup(question_embedding, make_sources_signature(documents), threshold)
+    lookup_ms = (time.perf_counter() - start) * 1000
+    _record(lookups=1, hits=1 if hit else 0, lookup_ms=lookup_ms)
+
+    if hit:
+        print(f"🧠 Caché semántica: similitud {hit['similarity']} ({lookup_ms:.2f} ms), se omite el LLM")
+        return hit["answer"]
+    return None
+
+
+def store_semantic_answer(tenant_id: str, question_embedding: Sequence[float], documents: Sequence[Dict], answer: Optional[str], generation_ms: float):
+    _record(generations=1, generation_ms=generation_ms)
+    if answer and question_embedding and _is_enabled(tenant_id):
+        get_semantic_cache(tenant_id, len(question_embedding)).put(question_embedding, make_sources_signature(documents), answer)
+
+
+def generate_with_semantic_cache(tenant_id: str, question_embedding: Sequence[float], documents: Sequence[Dict], generate_fn) -> Tuple[Optional[str], bool]:
+    """
+    Devuelve una respuesta cacheada para una pregunta equivalente o la genera con generate_fn
+
+    Args:
+        tenant_id: Tenant propietario (cada tenant tiene su propia matriz)
+        question_embedding: Embedding de la pregunta
+        documents: Chunks usados como contexto (su conjunto forma parte de la condición de acierto)
+        generate_fn: Función sin argumentos que llama al LLM
+
+    Returns:
+        (respuesta, True si salió de la caché)
+    """
+    answer = lookup_semantic_answer(tenant_id, question_embedding, documents)
+    if answer:
+        return answer, True
+
+    start = time.perf_counter()
+    answer = generate_fn()
+    store_semantic_answer(tenant_id, question_embedding, documents, answer, (time.perf_counter() - start) * 1000)
+    return answer, False
@@ -0,0 +1,34 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+_tenant_settings: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def get_tenant_settings() -> Dict[str, Dict[str, Any]]:
+    """
+    Overrides por tenant definidos en la variable TENANT_SETTINGS
+
+    Formato: {"cliente_abc": {"PDF_EXTRACTOR": "pypdfium2"}, ...}
+    """
+    global _tenant_settings
+    if _tenant_settings is None:
+        try:
+            _tenant_settings = json.loads(os.environ.get('TENANT_SETTINGS', '') or '{}')
+        except json.JSONDecodeError as e:
+            print(f"⚠️ TENANT_SETTINGS no es JSON válido, se ignora: {str(e)}")
+            _tenant_settings = {}
+    return _tenant_settings
+
+
+def get_setting(name: str, default: Any = None, tenant_id: Optional[str] = None) -> Any:
+    """
+    Valor de configuración: override del tenant, luego variable de entorno, luego default
+    """
+    if tenant_id:
+        overrides = get_tenant_settings().get(tenant_id, {})
+        if name in overrides:
+            return overrides[name]
+
+    return os.environ.get(name, default)
@@ -1,34 +1,157 @@
-from helpers.rag_helpers import extract_pdf_text, get_chunks, get_embeddings, get_multimodal_embeddings, analyze_image_with_rekognition
-from helpers.opensearch_indexing import opensearch_query
-import boto3
+from helpers.rag_helpers import (
+    extract_pdf_text,
+    get_chunks,
+    get_embeddings,
+    get_multimodal_embeddings,
+    get_multimodal_embeddings_batch,
+    analyze_image_with_rekognition,
+    generate_content_hash,
+    iter_pdf_pages,
+    clean_extracted_text,
+    iter_chunks,
+    batched
+)
+from helpers.opensearch_indexing import opensearch_query, prepare_query_search
+from helpers.aws_clients import get_bedrock_runtime_client
+from helpers.query_cache import get_query_cache
+from helpers.retrieval import get_retrieval_config, diversify_documents
+from helpers.context_packing import pack_context, get_context_token_budget
+from helpers.semantic_cache import generate_with_semantic_cache, lookup_semantic_answer, store_semantic_answer
+from helpers.index_profiles import get_index_profile
+from helpers.image_preprocessing import prepare_image_variants
+from helpers.office_extraction import (
+    SPREADSHEET_EXTENSIONS,
+    iter_spreadsheet_rows,
+    iter_row_group_chunks,
+    iter_docx_sections,
+    iter_pptx_slides
+)
 import json
 from botocore.config import Config
 import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def pdf_strategy(text):
+# Chunks por lote en la ingesta en streaming: acota la memoria de embeddings y bulk
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '64'))
+
+# Tamaño y solape de los chunks de texto, en tokens (ver helpers/chunking.py)
+PDF_CHUNK_SIZE = 2000
+PDF_CHUNK_OVERLAP = 200
+
+# Hilos del contenedor para solapar el embedding de la pregunta con la preparación de la búsqueda
+QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+LLM_CLIENT_CONFIG = Config(
+    connect_timeout=3600,  # 60 minutos
+    read_timeout=3600,     # 60 minutos
+    retries={'max_attempts': 1}
+)
+
+def embed_new_chunks(chunks, known_content_hashes=None, dimensions=1024):
+    """
+    Embebe solo los chunks cuyo contenido no está ya indexado
+
+    Returns:
+        Lista alineada con chunks; None para los chunks sin cambios
+    """
+    # Chunks con el mismo contenido ya indexado no se vuelven a embeber (embedding None)
+    known_content_hashes = known_content_hashes or set()
+    pending_positions = [
+        i for i, chunk in enumerate(chunks)
+        if generate_content_hash(chunk) not in known_content_hashes
+    ]
+    print(f"🧮 {len(pending_positions)}/{len(chunks)} chunks nuevos o modificados")
+
+    # Usar Titan Multimodal para compatibilidad con imágenes
+    # El motor mantiene varias peticiones en vuelo y respeta el orden de los chunks
+    pending_embeddings = get_multimodal_embeddings_batch(
+        [chunks[i] for i in pending_positions],
+        dimensions=dimensions
+    )
+
+    embeddings = [None] * len(chunks)
+    for position, embedding in zip(pending_positions, pending_embeddings):
+        embeddings[position] = embedding
+
+    return embeddings
+
+
+def pdf_stream_strategy(pdf_source, known_content_hashes=None, batch_size=INGEST_BATCH_SIZE, backend=None, dimensions=1024, workers=None):
+    """
+    Pipeline en streaming: página → normalización → chunk → embedding por lotes
+
+    Args:
+        pdf_source: Bytes del PDF, ruta en disco o file-like con seek
+        known_content_hashes: Hashes de contenido ya indexado que no se re-embeben
+        batch_size: Chunks por lote de embedding/indexado
+        backend: Backend de extracción PDF (por defecto PDF_EXTRACTOR)
+        dimensions: Dimensiones del embedding (las del índice del tenant)
+        workers: Procesos de extracción (por defecto PDF_EXTRACTION_WORKERS)
+
+    Yields:
+        (start_index, chunks, embeddings) de cada lote, en orden de documento
+    """
+    pages = (clean_extracted_text(page_text) for page_text in iter_pdf_pages(pdf_source, workers=workers, backend=backend))
+
+    yield from embed_chunk_stream(iter_chunks(pages, PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP), known_content_hashes, batch_size, dimensions)
+
+
+def embed_chunk_stream(chunks, known_content_hashes=None, batch_size=INGEST_BATCH_SIZE, dimensions=1024):
+    """
+    Embebe por lotes un iterador de chunks
+
+    Yields:
+        (start_index, chunks, embeddings) de cada lote, en orden de documento
+    """
+    start_index = 0
+    for batch_chunks in batched(chunks, batch_size):
+        embeddings = embed_new_chunks(batch_chunks, known_content_hashes, dimensions)
+        yield start_index, batch_chunks, embeddings
+        start_index += len(batch_chunks)
+
+
+def office_stream_strategy(source, extension, filename="documento", known_content_hashes=None, batch_size=INGEST_BATCH_SIZE, dimensions=1024):
+    """
+    Pipeline en streaming de Office y CSV, con el mismo formato de lotes que pdf_stream_strategy
+
+    Hojas de cálculo y CSV: filas en modo lectura → grupos de filas con la
+    cabecera repetida (un chunk por grupo). Word y PowerPoint: secciones o
+    diapositivas → el mismo chunker que los PDFs.
+
+    Args:
+        source: Bytes, ruta en disco, file-like con seek o S3Location
+        extension: .xlsx, .xls, .csv, .docx o .pptx
+    """
+    if extension in SPREADSHEET_EXTENSIONS:
+        chunks = iter_row_group_chunks(iter_spreadsheet_rows(source, extension, filename), max_tokens=PDF_CHUNK_SIZE)
+    elif extension == '.docx':
+        chunks = iter_chunks(iter_docx_sections(source), PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP)
+    elif extension == '.pptx':
+        chunks = iter_chunks(iter_pptx_slides(source), PDF_CHUNK_SIZE, PDF_CHUNK_OVERLAP)
+    else:
+        raise ValueError(f"Extensión no soportada: {extension}")
+
+    yield from embed_chunk_stream(chunks, known_content_hashes, batch_size, dimensions)
+
+
+def pdf_strategy(text, known_content_hashes=None, dimensions=1024):
 
     try:
 
-        text_content = extract_pdf_text(text)
+        chunks = []
+        embeddings = []
+        for _, batch_chunks, batch_embeddings in pdf_stream_strategy(text, known_content_hashes, dimensions=dimensions):
+            chunks.extend(batch_chunks)
+            embeddings.extend(batch_embeddings)
 
-        if not text_content.strip():
+        if not chunks:
             return {
                 "success": False,
                 "message": "No se pudo extraer texto"
         }
 
-        chunks = get_chunks(text_content, 2000, 200)
-
-        # Usar Titan Multimodal para compatibilidad con imágenes
-        embeddings = []
-        for chunk in chunks:
-            chunk_embedding = get_multimodal_embeddings(
-                base64_image=None,  # Solo texto
-                input_text=chunk,
-                dimensions=1024
-            )
-            embeddings.extend(chunk_embedding)  # get_multimodal_embeddings devuelve lista
-
         return (chunks, embeddings)
     
     except Exception as e:
@@ -38,13 +161,18 @@ def pdf_strategy(text):
         }
 
 
-def jpg_strategy(file_content, filename="imagen.jpg"):
+def image_strategy(file_content, filename="imagen.jpg", dimensions=1024, s3_object=None):
     """
-    Procesa imagen JPG usando Rekognition para análisis visual y embeddings multimodales
+    Procesa una imagen usando Rekognition para análisis visual y embeddings multimodales
+    
+    JPEG, PNG, GIF y WebP pasan por el mismo pipeline: se normalizan al formato
+    y la resolución que usa cada modelo en prepare_image_variants.
     
     Args:
-        file_content: Contenido binario de la imagen JPG
+        file_content: Contenido binario de la imagen
         filename: Nombre del archivo para referencia
+        dimensions: Dimensiones del embedding (las del índice del tenant)
+        s3_object: {"Bucket", "Name"} del archivo subido, para imágenes que no caben en línea en Rekognition
     
     Returns:
         chunks, embeddings: Tupla con descripción de Rekognition y embeddings multimodales
@@ -56,95 +184,189 @@ def jpg_strategy(file_content, filename="imagen.jpg"):
         
         print(f"🖼️ Procesando imagen: {filename}")
         
+        # 0. Reducir a la resolución que usa cada modelo (menos latencia, payload y memoria)
+        variants = prepare_image_variants(file_content)
+        
         # 1. Analizar imagen con Rekognition para obtener descripción textual
-        description = analyze_image_with_rekognition(file_content, filename)
+        description = analyze_image_with_rekognition(variants["rekognition"], filename, s3_object)
         
         # 2. Convertir imagen a base64 para embeddings multimodales  
-        base64_image = base64.b64encode(file_content).decode('utf-8')
+        base64_image = base64.b64encode(variants["embedding"]).decode('utf-8')
         print(f"📝 Base64 generado: {len(base64_image)} caracteres")
         
         # 3. Generar embeddings multimodales combinando imagen + descripción textual
         embeddings = get_multimodal_embeddings(
             base64_image=base64_image,
             input_text=description,  # Combinar imagen con descripción de Rekognition
-            dimensions=1024
+            dimensions=dimensions
         )
         
         # 4. Usar descripción real en lugar de placeholder
         chunks = [description]  # Descripción textual rica del contenido visual
         
-        print(f"✅ jpg_strategy completada: imagen analizada → descripción + embedding híbrido")
+        print(f"✅ image_strategy completada: imagen analizada → descripción + embedding híbrido")
         return (chunks, embeddings)
         
     except Exception as e:
-        print(f"❌ Error en jpg_strategy: {str(e)}")
+        print(f"❌ Error en image_strategy: {str(e)}")
         import traceback
         traceback.print_exc()
         return {
             "success": False,
-            "message": f"Error procesando imagen JPG: {str(e)}"
+            "message": f"Error procesando imagen: {str(e)}"
         }
 
 
-def query_strategy(question, tenant_id, document_type=None):
+NO_RESULTS_ANSWER = "No encontré información relevante en tus documentos para responder esa pregunta."
 
-    try:
 
-        # Usar Titan Multimodal para compatibilidad con imágenes indexadas
+def retrieve_query_context(question, tenant_id, document_type=None):
+    """
+    Embedding de la pregunta, búsqueda kNN y construcción del contexto para el LLM
+    
+    Compartido por la respuesta completa (query_strategy) y la respuesta en streaming.
+    El embedding (Bedrock) y la preparación de la búsqueda (cliente y metadatos
+    del índice) no dependen entre sí y se ejecutan a la vez.
+    """
+
+    # Usar Titan Multimodal para compatibilidad con imágenes indexadas
+    # Se embebe con la dimensión del perfil; se corrige abajo si el índice existente es de otro perfil
+    dimensions = get_index_profile(tenant_id)["dimension"]
+    embedding_future = QUERY_EXECUTOR.submit(
+        get_multimodal_embeddings,
+        base64_image=None,  # Solo texto para query
+        input_text=question,
+        dimensions=dimensions
+    )
+    
+    try:
+        preparation = prepare_query_search(tenant_id)
+    except Exception as e:
+        # La búsqueda volverá a intentarlo y gestionará el error por su cuenta
+        print(f"⚠️ No se pudo preparar la búsqueda: {str(e)}")
+        preparation = None
+    
+    if preparation and not preparation["index"]["exists"]:
+        embedding_future.cancel()
+        print(f"📭 Índice {preparation['index_name']} inexistente, no hay nada que buscar")
+        return {
+            "success": True,
+            "question_embedding": None,
+            "documents": [],
+            "context": "",
+            "sources": [],
+            "total_documents_searched": 0
+        }
+    
+    question_embeddings = embedding_future.result()
+    
+    vector = preparation["index"]["vector"] if preparation else None
+    if vector and vector["dimension"] != dimensions:
+        print(f"⚠️ Índice de {vector['dimension']} dimensiones con perfil de {dimensions}: se re-embebe la pregunta")
         question_embeddings = get_multimodal_embeddings(
-            base64_image=None,  # Solo texto para query
+            base64_image=None,
             input_text=question,
-            dimensions=1024
-        )
-        
-        if not question_embeddings or len(question_embeddings) == 0:
-            return {
-                "success": False,
-                "message": "No se pudo generar embedding de la pregunta"
-            }
-        
-        question_embedding = question_embeddings[0]
-        
-        search_result = opensearch_query(
-            question_embedding, 
-            tenant_id, 
-            document_type
+            dimensions=vector["dimension"]
         )
+    
+    if not question_embeddings or len(question_embeddings) == 0:
+        return {
+            "success": False,
+            "message": "No se pudo generar embedding de la pregunta"
+        }
+    
+    question_embedding = question_embeddings[0]
+    
+    # Se piden más candidatos (con sus vectores) para que MMR elija un contexto diverso
+    retrieval_config = preparation["retrieval_config"] if preparation else get_retrieval_config(tenant_id)
+    search_result = opensearch_query(
+        question_embedding, 
+        tenant_id, 
+        document_type,
+        question=question,
+        size=max(retrieval_config["mmr_fetch_k"], retrieval_config["context_k"]) if retrieval_config["mmr_enabled"] else 10,
+        include_embeddings=retrieval_config["mmr_enabled"],
+        vector=vector
+    )
+    
+    if not search_result.get('success', False):
+        return {
+            "success": False,
+            "message": f"Error en búsqueda OpenSearch: {search_result.get('message', 'Error desconocido')}"
+        }
+    
+    relevant_docs = search_result.get('documents', [])
+    context_docs = diversify_documents(question_embedding, relevant_docs, retrieval_config)
+    
+    sources = []
+    
+    for doc in context_docs:
+        content = doc.get('content', '')
+        source_file = doc.get('source_file', 'Archivo desconocido')
+        score = doc.get('score', 0)
         
-        if not search_result.get('success', False):
-            return {
-                "success": False,
-                "message": f"Error en búsqueda OpenSearch: {search_result.get('message', 'Error desconocido')}"
-            }
+        sources.append({
+            "source_file": source_file,
+            "content_snippet": content[:200] + "..." if len(content) > 200 else content,
+            "relevance_score": round(score, 3)
+        })
+    
+    # Solo las frases relevantes, dentro del presupuesto de tokens del prompt
+    packed = pack_context(question, context_docs, get_context_token_budget(tenant_id))
+    print(f"✂️ Contexto: {packed['original_tokens']} → {packed['packed_tokens']} tokens ({packed['tokens_saved']} ahorrados)")
+    
+    return {
+        "success": True,
+        "question_embedding": question_embedding,
+        "documents": context_docs,
+        "context": packed["context"],
+        "context_tokens": {key: packed[key] for key in ("original_tokens", "packed_tokens", "tokens_saved")},
+        "sources": sources,
+        "total_documents_searched": len(relevant_docs)
+    }
+
+
+def query_strategy(question, tenant_id, document_type=None, use_cache=True):
+    """
+    RAG sobre el índice del tenant con caché de dos niveles
+
+    La pregunta → embedding se resuelve en la caché de embeddings y la respuesta
+    final se cachea por (tenant, pregunta normalizada, document_type, versión de índice).
+    """
+
+    try:
         
-        relevant_docs = search_result.get('documents', [])
+        query_cache = get_query_cache()
+        # La versión del índice se fija antes de recuperar: la respuesta se guarda bajo la versión con la que se construyó
+        index_version = query_cache.get_index_version(tenant_id)
+        if use_cache:
+            cached_result = query_cache.get(tenant_id, question, document_type, index_version)
+            if cached_result is not None:
+                print(f"⚡ Respuesta servida desde caché de consultas")
+                return {**cached_result, "cached": True}
+
+        retrieval = retrieve_query_context(question, tenant_id, document_type)
+        if not retrieval["success"]:
+            return retrieval
         
-        if len(relevant_docs) == 0:
-            return {
+        if retrieval["total_documents_searched"] == 0:
+            result = {
                 "success": True,
-                "answer": "No encontré información relevante en tus documentos para responder esa pregunta.",
+                "answer": NO_RESULTS_ANSWER,
                 "sources": [],
                 "total_documents_searched": 0
             }
+            if use_cache:
+                query_cache.put(tenant_id, question, document_type, result, index_version)
+            return {**result, "cached": False}
         
-        context_chunks = []
-        sources = []
-        
-        for i, doc in enumerate(relevant_docs[:5]):  # Top 5 documentos más relevantes
-            content = doc.get('content', '')
-            source_file = doc.get('source_file', 'Archivo desconocido')
-            score = doc.get('score', 0)
-            
-            context_chunks.append(f"[Documento {i+1}]: {content}")
-            sources.append({
-                "source_file": source_file,
-                "content_snippet": content[:200] + "..." if len(content) > 200 else content,
-                "relevance_score": round(score, 3)
-            })
-        
-        context = "\n\n".join(context_chunks)
-        
-        answer = generate_llm_response(question, context)
+        # Preguntas equivalentes con las mismas fuentes reutilizan la respuesta ya generada
+        answer, cached = generate_with_semantic_cache(
+            tenant_id,
+            retrieval["question_embedding"],
+            retrieval["documents"],
+            lambda: generate_llm_response(question, retrieval["context"])
+        )
         
         if not answer:
             return {
@@ -152,12 +374,16 @@ def query_strategy(question, tenant_id, document_type=None):
                 "message": "Error generando respuesta con LLM"
             }
         
-        return {
+        result = {
             "success": True,
             "answer": answer,
-            "sources": sources,
-            "total_documents_searched": len(relevant_docs)
+            "sources": retrieval["sources"],
+            "total_documents_searched": retrieval["total_documents_searched"],
+            "context_tokens": retrieval["context_tokens"]
         }
+        if use_cache:
+            query_cache.put(tenant_id, question, document_type, result, index_version)
+        return {**result, "cached": cached}
         
     except Exception as e:
         print(f"❌ Error en query_strategy: {str(e)}")
@@ -169,17 +395,115 @@ def query_strategy(question, tenant_id, document_type=None):
         }
 
 
-def generate_llm_response(question, context):
-
+def query_stream_strategy(question, tenant_id, document_type=None, use_cache=True):
+    """
+    Igual que query_strategy pero genera eventos a medida que llegan los tokens
+    
+    Eventos: {"type": "token", "text"}, después {"type": "sources", ...} y
+    finalmente {"type": "done", ...}; ante un fallo {"type": "error", "message"}.
+    """
+    start = time.perf_counter()
+    
     try:
-        config = Config(
-            connect_timeout=3600,  # 60 minutos
-            read_timeout=3600,     # 60 minutos
-            retries={'max_attempts': 1}
-        )
-        bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-east-1', config=config)
         
-        system_prompt = """Eres un asistente especializado en responder preguntas basándote únicamente en la información proporcionada en los documentos. 
+        query_cache = get_query_cache()
+        # La versión del índice se fija antes de recuperar: la respuesta se guarda bajo la versión con la que se construyó
+        index_version = query_cache.get_index_version(tenant_id)
+        if use_cache:
+            cached_result = query_cache.get(tenant_id, question, document_type, index_version)
+            if cached_result is not None:
+                print(f"⚡ Respuesta servida desde caché de consultas")
+                yield {"type": "token", "text": cached_result["answer"]}
+                yield {
+                    "type": "sources",
+                    "sources": cached_result["sources"],
+                    "total_documents_searched": cached_result["total_documents_searched"],
+                    "context_tokens": cached_result.get("context_tokens")
+                }
+                elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+                yield {"type": "done", "cached": True, "time_to_first_token_ms": elapsed_ms, "total_ms": elapsed_ms}
+                return
+        
+        retrieval = retrieve_query_context(question, tenant_id, document_type)
+        if not retrieval["success"]:
+            yield {"type": "error", "message": retrieval["message"]}
+            return
+        
+        first_token_ms = None
+        # Solo un acierto de la caché semántica cuenta como respuesta cacheada
+        cached = False
+        
+        if retrieval["total_documents_searched"] == 0:
+            answer = NO_RESULTS_ANSWER
+            first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+            yield {"type": "token", "text": answer}
+        else:
+            answer = lookup_semantic_answer(tenant_id, retrieval["question_embedding"], retrieval["documents"])
+            if answer:
+                cached = True
+                first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+                yield {"type": "token", "text": answer}
+            else:
+                generation_start = time.perf_counter()
+                parts = []
+                for text in stream_llm_response(question, retrieval["context"]):
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+                        print(f"⏱️ Primer token en {first_token_ms} ms")
+                    parts.append(text)
+                    yield {"type": "token", "text": text}
+                
+                answer = "".join(parts).strip()
+                if not answer:
+                    yield {"type": "error", "message": "Error generando respuesta con LLM"}
+                    return
+                store_semantic_answer(
+                    tenant_id,
+                    retrieval["question_embedding"],
+                    retrieval["documents"],
+                    answer,
+                    (time.perf_counter() - generation_start) * 1000
+                )
+        
+        # Misma forma que guarda query_strategy: /query y el WebSocket comparten entradas de caché
+        result = {
+            "success": True,
+            "answer": answer,
+            "sources": retrieval["sources"],
+            "total_documents_searched": retrieval["total_documents_searched"]
+        }
+        if retrieval["total_documents_searched"]:
+            result["context_tokens"] = retrieval["context_tokens"]
+        
+        yield {
+            "type": "sources",
+            "sources": result["sources"],
+            "total_documents_searched": result["total_documents_searched"],
+            "context_tokens": result.get("context_tokens")
+        }
+        
+        if use_cache:
+            query_cache.put(tenant_id, question, document_type, result, index_version)
+        
+        yield {
+            "type": "done",
+            "cached": cached,
+            "time_to_first_token_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+        
+    except Exception as e:
+        print(f"❌ Error en query_stream_strategy: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        yield {"type": "error", "message": f"Error en estrategia RAG: {str(e)}"}
+
+
+def build_llm_payload(question, context):
+    """
+    Payload messages-v1 de Nova Pro, común a invoke_model y a la respuesta en streaming
+    """
+    system_prompt = """Eres un asistente especializado en responder preguntas basándote únicamente en la información proporcionada en los documentos. 
 
 INSTRUCCIONES:
 - Responde SOLO con información que aparece explícitamente en los documentos
@@ -188,7 +512,7 @@ INSTRUCCIONES:
 - Cita información específica cuando sea relevante
 - No inventes información que no esté en los documentos"""
 
-        user_prompt = f"""CONTEXTO DE DOCUMENTOS:
+    user_prompt = f"""CONTEXTO DE DOCUMENTOS:
 {context}
 
 PREGUNTA DEL USUARIO:
@@ -196,31 +520,40 @@ PREGUNTA DEL USUARIO:
 
 RESPUESTA:"""
 
-        # Payload para Amazon Nova Pro (formato messages-v1)
-        payload = {
-            "schemaVersion": "messages-v1",
-            "system": [
-                {
-                    "text": system_prompt
-                }
-            ],
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "text": user_prompt
-                        }
-                    ]
-                }
-            ],
-            "inferenceConfig": {
-                "maxTokens": 1000,
-                "temperature": 0.1,
-                "topP": 0.9,
-                "stopSequences": []
+    # Payload para Amazon Nova Pro (formato messages-v1)
+    payload = {
+        "schemaVersion": "messages-v1",
+        "system": [
+            {
+                "text": system_prompt
+            }
+        ],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "text": user_prompt
+                    }
+                ]
             }
+        ],
+        "inferenceConfig": {
+            "maxTokens": 1000,
+            "temperature": 0.1,
+            "topP": 0.9,
+            "stopSequences": []
         }
+    }
+    return payload
+
+
+def generate_llm_response(question, context):
+
+    try:
+        bedrock_runtime = get_bedrock_runtime_client(LLM_CLIENT_CONFIG, config_key='llm')
+        
+        payload = build_llm_payload(question, context)
         
         # Llamar a Amazon Nova Pro
         response = bedrock_runtime.invoke_model(
@@ -254,3 +587,27 @@ RESPUESTA:"""
         traceback.print_exc()
         return None
 
+
+def stream_llm_response(question, context):
+    """
+    Genera los fragmentos de texto de Nova Pro a medida que llegan (invoke_model_with_response_stream)
+    """
+    bedrock_runtime = get_bedrock_runtime_client(LLM_CLIENT_CONFIG, config_key='llm')
+    
+    response = bedrock_runtime.invoke_model_with_response_stream(
+        modelId="amazon.nova-pro-v1:0",
+        contentType="application/json",
+        accept="application/json",
+        body=json.dumps(build_llm_payload(question, context))
+    )
+    
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        
+        # Nova emite contentBlockDelta con el texto incremental; el resto son eventos de control
+        delta = json.loads(chunk['bytes']).get('contentBlockDelta', {}).get('delta', {})
+        text = delta.get('text')
+        if text:
+            yield text
@@ -2,6 +2,8 @@ import json
 import urllib.parse
 import boto3
 import os
+import tempfile
+import time
 from helpers.rag_helpers import (
     extract_pdf_text, 
     get_chunks, 
@@ -10,99 +12,371 @@ from helpers.rag_helpers import (
     create_index_if_not_exists,
     index_document_bulk
 )
-from helpers.strategies import pdf_strategy, jpg_strategy
-from helpers.opensearch_indexing import opensearch_indexing
+from helpers.strategies import pdf_strategy, pdf_stream_strategy, image_strategy, office_stream_strategy
+from helpers.opensearch_indexing import opensearch_indexing, opensearch_indexing_batches, get_existing_chunks, get_tenant_vector_spec
+from helpers.aws_clients import get_s3_client
+from helpers.embedding_cache import reset_cache_stats, get_cache_stats
+from helpers.settings import get_setting
+from helpers.s3_reader import S3Location, download_s3_object_parallel
+from helpers.pdf_extraction import get_extraction_workers
+from helpers.fanout import plan_fanout, start_fanout, handle_fanout_stage
+from helpers.index_placement import handle_migration_message
+from helpers.image_preprocessing import IMAGE_EXTENSIONS
+from helpers.office_extraction import OFFICE_EXTENSIONS
+from concurrent.futures import ThreadPoolExecutor
+
+# ranged: el PDF se lee por rangos desde S3; download: se copia antes a /tmp
+S3_READ_MODE = os.environ.get('S3_READ_MODE', 'ranged')
+# Mensajes de un lote SQS que se procesan a la vez dentro de una invocación
+INGEST_RECORD_CONCURRENCY = int(os.environ.get('INGEST_RECORD_CONCURRENCY', '4'))
+# Imágenes de hasta este tamaño que llegan en el mismo lote forman un micro-lote con su propio pool
+IMAGE_MICROBATCH_MAX_BYTES = int(os.environ.get('IMAGE_MICROBATCH_MAX_BYTES', str(5 * 1024 * 1024)))
+IMAGE_MICROBATCH_CONCURRENCY = int(os.environ.get('IMAGE_MICROBATCH_CONCURRENCY', '8'))
 
 def lambda_handler(event, context):
+    """
+    Ingesta de archivos subidos a uploads/{tenant_id}/{document_type}/
+
+    Acepta lotes de SQS (notificaciones de S3 encoladas) o eventos de S3
+    directos. Con SQS los mensajes del lote se procesan a la vez y se
+    devuelven los fallidos en batchItemFailures para que solo esos se
+    reintenten (y acaben en la DLQ si siguen fallando).
     
-    s3_client = boto3.client('s3')
+    También atiende los estados de la máquina de fan-out de PDFs grandes
+    (eventos con fanout_stage).
+    """
     
-    for record in event.get('Records', []):
-        try:
-            event_name = record.get('eventName', '')
-            bucket_name = record['s3']['bucket']['name']
-            object_key = urllib.parse.unquote_plus(
-                record['s3']['object']['key'], 
-                encoding='utf-8'
-            )
-            object_size = record['s3']['object']['size']
-            
-            path_parts = object_key.split('/')
-            if len(path_parts) < 3:
-                print(f"❌ Path inválido: {object_key}")
-                continue
-                
-            tenant_id = path_parts[1] if path_parts[0] == 'uploads' else 'unknown'
-            document_type = path_parts[2] if len(path_parts) >= 3 else 'general'
-            filename = path_parts[-1]
-            
-            extension = '.' + filename.split('.')[-1].lower() if '.' in filename else ''
-            
-            print(f"Tenant ID: {tenant_id}")
-            print(f"Tipo documento: {document_type}")
-            print(f"Nombre archivo: {filename}")
-            print(f"Extensión: {extension}")
-            
-            result = process_file(
-                s3_client, bucket_name, object_key, 
-                tenant_id, document_type, filename, extension
-            )
-              
-        except Exception as e:
-            print(f"❌ Error procesando archivo {object_key}: {str(e)}")
-            continue
-        
-        print("=== FIN PROCESAMIENTO ===")
+    reset_cache_stats()
+    if 'fanout_stage' in event:
+        return handle_fanout_stage(event)
+    
+    s3_client = get_s3_client()
+    
+    records = event.get('Records', [])
+    if records and records[0].get('eventSource') == 'aws:sqs':
+        return handle_sqs_batch(s3_client, records, context)
+    
+    process_s3_records(s3_client, records)
+    
+    cache_stats = get_cache_stats()
+    print(f"📦 Caché de embeddings: {cache_stats}")
     
     return {
         'statusCode': 200,
         'body': json.dumps({
-            'message': f'Procesados {len(event.get("Records", []))} archivos exitosamente'
+            'message': f'Procesados {len(records)} archivos exitosamente',
+            'embedding_cache': cache_stats
         })
     }
 
 
-def process_file(s3_client, bucket_name, object_key, tenant_id, document_type, filename, extension):
+def handle_sqs_batch(s3_client, messages, context=None):
+    """
+    Procesa los mensajes de un lote SQS en paralelo y reporta los fallidos
+
+    La ingesta es idempotente (_id deterministas, re-indexación incremental),
+    así que una entrega duplicada o un reintento no duplica chunks. Los
+    mensajes placement_migration (pasos de la promoción de un tenant) se
+    ejecutan después de los archivos con el tiempo que quede.
+    """
+    concurrency = max(1, min(INGEST_RECORD_CONCURRENCY, len(messages)))
+    # fork con otros hilos en marcha (Rekognition, embeddings, print) puede heredar un lock tomado
+    # y colgar al hijo: con mensajes simultáneos la extracción de PDF va en el propio proceso
+    extraction_workers = get_extraction_workers() if concurrency == 1 else 1
     
-    try:
-        
-        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-        file_content = response['Body'].read()
+    failed_messages = set()
+    message_records = []
+    migrations = []
+    for message_index, message in enumerate(messages):
+        try:
+            body = json.loads(message.get('body') or '{}')
+        except json.JSONDecodeError as e:
+            print(f"❌ Mensaje {message.get('messageId')} con cuerpo inválido: {str(e)}")
+            failed_messages.add(message_index)
+            continue
+        if body.get('Event') == 's3:TestEvent':
+            continue
+        if 'placement_migration' in body:
+            migrations.append((message_index, body['placement_migration']))
+            continue
+        message_records.extend((message_index, record) for record in body.get('Records', []))
+    
+    print(f"📥 Lote SQS: {len(messages)} mensajes, {concurrency} en paralelo, {extraction_workers} procesos de extracción cada uno")
+    results = process_s3_records(s3_client, [record for _, record in message_records], concurrency, extraction_workers)
+    for (message_index, _), succeeded in zip(message_records, results):
+        if not succeeded:
+            failed_messages.add(message_index)
+    
+    # Margen para devolver la respuesta antes del timeout; sin contexto no hay límite externo
+    deadline = time.time() + (context.get_remaining_time_in_millis() / 1000 - 30 if context else float('inf'))
+    for message_index, migration in migrations:
+        if not handle_migration_message(migration, deadline):
+            failed_messages.add(message_index)
+    
+    failures = [{"itemIdentifier": messages[index]['messageId']} for index in sorted(failed_messages)]
+    
+    print(f"📦 Caché de embeddings: {get_cache_stats()}")
+    if failures:
+        print(f"⚠️ {len(failures)}/{len(messages)} mensajes se reintentarán")
+    
+    return {"batchItemFailures": failures}
+
+
+def is_microbatch_image(record):
+    s3_object = record.get('s3', {}).get('object', {})
+    key = s3_object.get('key', '')
+    extension = '.' + key.split('.')[-1].lower() if '.' in key else ''
+    size = s3_object.get('size')
+    return extension in IMAGE_EXTENSIONS and size is not None and size <= IMAGE_MICROBATCH_MAX_BYTES
+
 
-        embeddings = None
-        chunks = None
+def process_s3_records(s3_client, records, concurrency=1, extraction_workers=None):
+    """
+    Procesa varios registros de S3
 
-        if extension == '.pdf':
-            chunks, embeddings = pdf_strategy(file_content)
+    Las imágenes pequeñas del mismo lote forman un micro-lote con su propio
+    pool: la descarga y Rekognition de una se solapan con el embedding y el
+    indexado de otra. El resto de archivos se reparte en `concurrency` hilos.
+
+    Returns:
+        Lista alineada con records: False si el archivo debe reintentarse
+    """
+    results = [True] * len(records)
+    images = [index for index, record in enumerate(records) if is_microbatch_image(record)]
+    if len(images) < 2:
+        images = []
+    image_positions = set(images)
+    others = [index for index in range(len(records)) if index not in image_positions]
+    
+    def run(indexes, workers, record_extraction_workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = executor.map(
+                lambda index: process_s3_record(s3_client, records[index], record_extraction_workers),
+                indexes
+            )
+            for index, succeeded in zip(indexes, outcomes):
+                results[index] = succeeded
+    
+    others_concurrency = max(1, min(concurrency, len(others)))
+    if images and others or others_concurrency > 1:
+        # Sin procesos de extracción mientras otros hilos trabajan: fork solo es seguro con un único hilo activo
+        extraction_workers = 1
+    
+    groups = []
+    if images:
+        print(f"🖼️ Micro-lote de {len(images)} imágenes")
+        groups.append((images, min(IMAGE_MICROBATCH_CONCURRENCY, len(images)), None))
+    if others:
+        groups.append((others, others_concurrency, extraction_workers))
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(groups))) as executor:
+        for future in [executor.submit(run, *group) for group in groups]:
+            future.result()
+    
+    return results
+
+
+def process_s3_record(s3_client, record, extraction_workers=None):
+    """
+    Procesa un registro de notificación de S3
+
+    Returns:
+        False si el archivo debe reintentarse; True si se indexó o se descarta
+        (ruta inválida, extensión no soportada)
+    """
+    object_key = record.get('s3', {}).get('object', {}).get('key', '')
+    try:
+        bucket_name = record['s3']['bucket']['name']
+        object_key = urllib.parse.unquote_plus(
+            record['s3']['object']['key'], 
+            encoding='utf-8'
+        )
+        object_size = record['s3']['object'].get('size')
         
-        elif extension == '.jpg':
-            chunks, embeddings = jpg_strategy(file_content, filename)
+        path_parts = object_key.split('/')
+        if len(path_parts) < 3:
+            print(f"❌ Path inválido: {object_key}")
+            return True
+            
+        tenant_id = path_parts[1] if path_parts[0] == 'uploads' else 'unknown'
+        document_type = path_parts[2] if len(path_parts) >= 3 else 'general'
+        filename = path_parts[-1]
         
-        else:
-            return {
-                "message": "Proximamente mas extensiones"
-            }
-
+        extension = '.' + filename.split('.')[-1].lower() if '.' in filename else ''
         
-        if not embeddings or not chunks:
-            return {
-                "success": False,
-                "message": "No se pudieron generar embeddings o chunks"
-            }
+        print(f"Tenant ID: {tenant_id}")
+        print(f"Tipo documento: {document_type}")
+        print(f"Nombre archivo: {filename}")
+        print(f"Extensión: {extension}")
         
-        opensearch_indexing(embeddings, chunks, tenant_id, document_type, object_key, filename)
+        result = process_file(
+            s3_client, bucket_name, object_key, 
+            tenant_id, document_type, filename, extension,
+            object_size, extraction_workers
+        )
+          
+    except Exception as e:
+        print(f"❌ Error procesando archivo {object_key}: {str(e)}")
+        return False
+    
+    print("=== FIN PROCESAMIENTO ===")
+    # Sin clave success: extensión aún no soportada, reintentar no cambia nada
+    return result.get('success', True)
 
-        return {
-            "success": True,
-            "message": "Archivo procesado correctamente"
-        }
 
+def process_file(s3_client, bucket_name, object_key, tenant_id, document_type, filename, extension, object_size=None, extraction_workers=None):
+    
+    try:
+
+        processor = FILE_PROCESSORS.get(extension)
+        if not processor:
+            # Se descarta antes de descargar el archivo
+            return {
+                "message": f"Proximamente mas extensiones ({extension or 'sin extensión'})"
+            }
+        
+        return processor(s3_client, bucket_name, object_key, tenant_id, document_type, filename, object_size, extraction_workers)
         
     except Exception as e:
-        print(f"❌ Error procesando PDF: {str(e)}")
+        print(f"❌ Error procesando archivo: {str(e)}")
         import traceback
         traceback.print_exc()
         return {
             "success": False,
-            "message": f"Error procesando PDF: {str(e)}"
-        }
\ No newline at end of file
+            "message": f"Error procesando archivo: {str(e)}"
+        }
+
+
+def process_image(s3_client, bucket_name, object_key, tenant_id, document_type, filename, object_size=None, extraction_workers=None):
+    """
+    Pipeline común de imágenes (jpg, jpeg, png, gif, webp): descripción de Rekognition + embedding multimodal
+    """
+    
+    file_content = download_s3_object_parallel(s3_client, bucket_name, object_key, object_size)
+    
+    result = image_strategy(
+        file_content, filename, get_tenant_vector_spec(tenant_id)["dimension"],
+        s3_object={'Bucket': bucket_name, 'Name': object_key}
+    )
+    if isinstance(result, dict):
+        return result
+    
+    chunks, embeddings = result
+    if not embeddings or not chunks:
+        return {
+            "success": False,
+            "message": "No se pudieron generar embeddings o chunks"
+        }
+    
+    result = opensearch_indexing(embeddings, chunks, tenant_id, document_type, object_key, filename)
+    if not result.get('success'):
+        return result
+    
+    return {
+        "success": True,
+        "message": "Archivo procesado correctamente"
+    }
+
+
+def process_pdf_streaming(s3_client, bucket_name, object_key, tenant_id, document_type, filename, object_size=None, extraction_workers=None):
+    """
+    Ingesta de PDF con memoria acotada: el objeto se lee por rangos desde S3
+    (o se descarga a /tmp con S3_READ_MODE=download) y se indexa lote a lote
+    mientras se siguen extrayendo páginas
+    
+    Con FANOUT_MODE activo, los PDFs largos se reparten por rangos de páginas
+    entre varios workers en lugar de procesarse en esta invocación.
+    """
+    
+    job = plan_fanout(s3_client, bucket_name, object_key, tenant_id, document_type, filename)
+    if job:
+        return start_fanout(job, extraction_workers)
+    
+    # Re-subidas: solo se embeben chunks nuevos o modificados
+    existing_chunks = get_existing_chunks(tenant_id, object_key)
+    known_content_hashes = {chunk['content_hash'] for chunk in existing_chunks.values() if chunk.get('content_hash')}
+    backend = get_setting('PDF_EXTRACTOR', 'pypdf2', tenant_id)
+    dimensions = get_tenant_vector_spec(tenant_id)["dimension"]
+    
+    def index_from(pdf_source):
+        return opensearch_indexing_batches(
+            pdf_stream_strategy(pdf_source, known_content_hashes, backend=backend, dimensions=dimensions, workers=extraction_workers),
+            tenant_id,
+            document_type,
+            object_key,
+            filename,
+            existing_chunks
+        )
+    
+    if get_setting('S3_READ_MODE', S3_READ_MODE, tenant_id) == 'download':
+        # Fichero con nombre en /tmp: los procesos de extracción paralela lo abren por ruta
+        with tempfile.NamedTemporaryFile(suffix='.pdf', dir='/tmp') as pdf_file:
+            s3_client.download_fileobj(bucket_name, object_key, pdf_file)
+            pdf_file.flush()
+            result = index_from(pdf_file.name)
+    else:
+        # Cada proceso de extracción abre su propio lector por rangos: sin copia a /tmp ni objeto en memoria
+        print(f"📡 Leyendo s3://{bucket_name}/{object_key} por rangos")
+        result = index_from(S3Location(bucket_name, object_key, object_size))
+    
+    if not result.get('success'):
+        print(f"❌ Error indexando PDF: {result.get('message')}")
+        return result
+    
+    return {
+        "success": True,
+        "message": "Archivo procesado correctamente",
+        "details": result.get('details', {})
+    }
+
+
+def process_office_streaming(s3_client, bucket_name, object_key, tenant_id, document_type, filename, object_size=None, extraction_workers=None):
+    """
+    Ingesta en streaming de Word, PowerPoint, Excel y CSV
+
+    Igual que los PDFs, el objeto se lee por rangos desde S3 y se indexa lote a
+    lote; las hojas de cálculo se recorren fila a fila sin cargar el libro.
+    """
+    
+    extension = '.' + filename.split('.')[-1].lower()
+    existing_chunks = get_existing_chunks(tenant_id, object_key)
+    known_content_hashes = {chunk['content_hash'] for chunk in existing_chunks.values() if chunk.get('content_hash')}
+    dimensions = get_tenant_vector_spec(tenant_id)["dimension"]
+    
+    def index_from(source):
+        return opensearch_indexing_batches(
+            office_stream_strategy(source, extension, filename, known_content_hashes, dimensions=dimensions),
+            tenant_id,
+            document_type,
+            object_key,
+            filename,
+            existing_chunks
+        )
+    
+    # xlrd necesita el .xls entero: desde /tmp lo mapea en memoria en lugar de copiarlo
+    if extension == '.xls' or get_setting('S3_READ_MODE', S3_READ_MODE, tenant_id) == 'download':
+        with tempfile.NamedTemporaryFile(suffix=extension, dir='/tmp') as office_file:
+            s3_client.download_fileobj(bucket_name, object_key, office_file)
+            office_file.flush()
+            result = index_from(office_file.name)
+    else:
+        print(f"📡 Leyendo s3://{bucket_name}/{object_key} por rangos")
+        result = index_from(S3Location(bucket_name, object_key, object_size))
+    
+    if not result.get('success'):
+        print(f"❌ Error indexando {extension}: {result.get('message')}")
+        return result
+    
+    return {
+        "success": True,
+        "message": "Archivo procesado correctamente",
+        "details": result.get('details', {})
+    }
+
+
+# Extensión → función que la procesa; .doc y .ppt (binarios antiguos) aún no se indexan
+FILE_PROCESSORS = {
+    '.pdf': process_pdf_streaming,
+    **{extension: process_image for extension in IMAGE_EXTENSIONS},
+    **{extension: process_office_streaming for extension in OFFICE_EXTENSIONS}
+}
@@ -1,5 +1,8 @@
 import json
 from helpers.strategies import query_strategy
+from helpers.embedding_cache import reset_cache_stats, get_cache_stats
+from helpers.query_cache import reset_query_cache_stats, get_query_cache_stats
+from helpers.semantic_cache import reset_semantic_cache_stats, get_semantic_cache_stats
 
 def lambda_handler(event, context):
     
@@ -10,6 +13,10 @@ def lambda_handler(event, context):
         'Access-Control-Allow-Headers': 'Content-Type, X-Amz-Date, Authorization, X-Api-Key, X-Amz-Security-Token'
     }
     
+    reset_cache_stats()
+    reset_query_cache_stats()
+    reset_semantic_cache_stats()
+    
     try:
         body = json.loads(event.get('body', '{}'))
         
@@ -26,6 +33,10 @@ def lambda_handler(event, context):
         
         rag_result = query_strategy(question, tenant_id, document_type)
         
+        print(f"📦 Caché de embeddings: {get_cache_stats()}")
+        print(f"📦 Caché de consultas: {get_query_cache_stats()}")
+        print(f"📦 Caché semántica: {get_semantic_cache_stats()}")
+        
         if not rag_result.get('success', False):
             return create_error_response(500, rag_result.get('message', 'Error en consulta RAG'))
         
@@ -34,6 +45,8 @@ def lambda_handler(event, context):
             'answer': rag_result.get('answer'),
             'sources': rag_result.get('sources', []),
             'total_documents_searched': rag_result.get('total_documents_searched', 0),
+            'cached': rag_result.get('cached', False),
+            'context_tokens': rag_result.get('context_tokens'),
             'tenant_id': tenant_id,
             'question': question
         }
@@ -0,0 +1,73 @@
+import json
+import os
+from helpers.strategies import query_stream_strategy
+from helpers.aws_clients import get_client
+from helpers.embedding_cache import reset_cache_stats, get_cache_stats
+from query import validate_query_request
+
+
+def lambda_handler(event, context):
+    """
+    API WebSocket de /query en streaming
+
+    El cliente envía {"action": "query", "tenant_id", "question", "document_type"}
+    y recibe mensajes token → sources → done a medida que Nova Pro genera.
+    """
+
+    request_context = event.get('requestContext', {})
+    route_key = request_context.get('routeKey')
+    connection_id = request_context.get('connectionId')
+
+    if route_key in ('$connect', '$disconnect'):
+        return {'statusCode': 200}
+
+    management_client = get_client(
+        'apigatewaymanagementapi',
+        region=os.environ.get('AWS_REGION', 'us-east-1'),
+        endpoint_url=f"https://{request_context['domainName']}/{request_context['stage']}"
+    )
+
+    def send(message):
+        management_client.post_to_connection(
+            ConnectionId=connection_id,
+            Data=json.dumps(message, ensure_ascii=False).encode('utf-8')
+        )
+
+    reset_cache_stats()
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+
+        tenant_id = body.get('tenant_id', '').strip()
+        question = body.get('question', '').strip()
+        document_type = body.get('document_type', None)  # Opcional
+
+        validation_error = validate_query_request(tenant_id, question)
+        if validation_error:
+            send({'type': 'error', 'message': validation_error})
+            return {'statusCode': 400}
+
+        for message in query_stream_strategy(question, tenant_id, document_type):
+            send(message)
+
+        print(f"📦 Caché de embeddings: {get_cache_stats()}")
+        return {'statusCode': 200}
+
+    except json.JSONDecodeError:
+        send({'type': 'error', 'message': 'Invalid JSON in request body'})
+        return {'statusCode': 400}
+    except Exception as e:
+        # GoneException: el cliente cerró la conexión, no tiene sentido seguir generando
+        code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+        if code == 'GoneException':
+            print(f"⚠️ Conexión {connection_id} cerrada por el cliente")
+            return {'statusCode': 410}
+
+        print(f"❌ Error en query streaming: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        try:
+            send({'type': 'error', 'message': 'Error interno en consulta'})
+        except Exception:
+            pass
+        return {'statusCode': 500}
@@ -4,6 +4,7 @@ import uuid
 import re
 import os
 from datetime import datetime
+from helpers.aws_clients import get_s3_client
 
 headers = {
     'Content-Type': 'application/json',
@@ -16,7 +17,7 @@ allowed_types = ['general']
 
 def lambda_handler(event, context):
 
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     
     try:
     
@@ -1,12 +1,34 @@
+import base64
 import json
 import os
 from helpers.rag_helpers import create_opensearch_client
+from helpers.index_placement import get_placement
+from helpers.index_metadata import get_index_metadata, is_index_not_found
+
+
+# Documentos por página del listado y buckets por agregación: acotan el coste de cada sondeo de la UI
+VERIFY_MAX_PAGE_SIZE = int(os.environ.get('VERIFY_MAX_PAGE_SIZE', '100'))
+VERIFY_MAX_BUCKETS = int(os.environ.get('VERIFY_MAX_BUCKETS', '100'))
+
+SAMPLE_FIELDS = [
+    "document_hash",
+    "source_file",
+    "document_type",
+    "file_format",
+    "content_type",
+    "chunk_id",
+    "chunk_index",
+    "content",
+    "created_at"
+]
+
+BREAKDOWN_FIELDS = ("source_file", "document_type", "content_type")
 
 
 def lambda_handler(event, context):
     """
     Endpoint para verificar documentos indexados por tenant
-    GET /verify/{tenant_id}
+    GET /verify/{tenant_id}?size=10&cursor=...&source_file=...&document_type=...
     """
     
     headers = {
@@ -18,7 +40,8 @@ def lambda_handler(event, context):
     
     try:
         # Obtener tenant_id del path
-        tenant_id = event.get('pathParameters', {}).get('tenant_id')
+        tenant_id = (event.get('pathParameters') or {}).get('tenant_id')
+        params = event.get('queryStringParameters') or {}
         
         if not tenant_id:
             return {
@@ -27,13 +50,30 @@ def lambda_handler(event, context):
                 'body': json.dumps({"error": "tenant_id es requerido en el path"})
             }
         
+        try:
+            page_size = min(int(params.get('size', 10)), VERIFY_MAX_PAGE_SIZE)
+            cursor = decode_cursor(params.get('cursor'))
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({"error": f"Parámetros inválidos: {str(e)}"}, ensure_ascii=False)
+            }
+        
         print(f"🔍 Verificando documentos para tenant: {tenant_id}")
         
         # Crear cliente OpenSearch
         opensearch_client = create_opensearch_client()
         
         # Verificar documentos del tenant
-        verification_result = verify_tenant_documents(tenant_id, opensearch_client)
+        verification_result = verify_tenant_documents(
+            tenant_id,
+            opensearch_client,
+            page_size=page_size,
+            cursor=cursor,
+            source_file=params.get('source_file'),
+            document_type=params.get('document_type')
+        )
         
         return {
             'statusCode': 200,
@@ -55,87 +95,165 @@ def lambda_handler(event, context):
         }
 
 
-def verify_tenant_documents(tenant_id: str, opensearch_client):
+def encode_cursor(sort_values):
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Cursor opaco de la página siguiente: valores de sort del último documento (search_after)
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("cursor no válido")
+    if not isinstance(values, list):
+        raise ValueError("cursor no válido")
+    return values
+
+
+def build_verify_query(tenant_id, page_size=10, cursor=None, source_file=None, document_type=None):
+    """
+    Una sola búsqueda: página de documentos sin vectores y, en la primera página, los recuentos por agregación
     """
-    Busca y analiza todos los documentos de un tenant en OpenSearch
+    filters = [{"term": {"tenant_id": tenant_id}}]
+    if source_file:
+        filters.append({"term": {"source_file": source_file}})
+    if document_type:
+        filters.append({"term": {"document_type": document_type}})
+    
+    search_query = {
+        "size": page_size,
+        "query": {"bool": {"filter": filters}},
+        # chunk_id desempata documentos escritos en el mismo bulk (mismo created_at)
+        "sort": [
+            {"created_at": {"order": "desc"}},  # Más recientes primero
+            {"chunk_id": {"order": "asc", "missing": "_last"}}
+        ],
+        "_source": SAMPLE_FIELDS  # Sin embedding: la dimensión sale del mapping
+    }
+    
+    if cursor:
+        search_query["search_after"] = cursor
+        # Las páginas siguientes solo listan: los recuentos ya llegaron con la primera
+        search_query["track_total_hits"] = False
+    else:
+        search_query["track_total_hits"] = True
+        search_query["aggs"] = {
+            field: {"terms": {"field": field, "size": VERIFY_MAX_BUCKETS}}
+            for field in BREAKDOWN_FIELDS
+        }
+        search_query["aggs"]["last_indexed_at"] = {"max": {"field": "created_at"}}
+        # Los buckets se cortan en VERIFY_MAX_BUCKETS: el número de archivos sale de una cardinality
+        # (exacta hasta precision_threshold, el máximo que admite OpenSearch)
+        search_query["aggs"]["unique_files"] = {"cardinality": {"field": "source_file", "precision_threshold": 40000}}
+    
+    return search_query
+
+
+def verify_tenant_documents(tenant_id: str, opensearch_client, page_size=10, cursor=None, source_file=None, document_type=None):
+    """
+    Estado de los documentos de un tenant leyendo solo su índice (propio o compartido)
+    
+    Los recuentos por source_file, document_type y content_type salen de
+    agregaciones, los documentos se devuelven sin vectores y el listado
+    completo se recorre con search_after usando next_cursor.
     
     Args:
         tenant_id: ID del tenant a verificar
         opensearch_client: Cliente OpenSearch configurado
+        page_size: Documentos por página
+        cursor: Valores search_after de la página anterior (None = primera página)
+        source_file: Filtro opcional por archivo
+        document_type: Filtro opcional por tipo de documento
     
     Returns:
-        Diccionario con estadísticas y samples de documentos
+        Diccionario con recuentos, página de documentos y cursor de la siguiente
     """
     try:
         print(f"📊 Buscando documentos para tenant_id: {tenant_id}")
         
-        # Query para buscar todos los documentos del tenant
-        search_query = {
-            "query": {
-                "term": {
-                    "tenant_id": tenant_id
-                }
-            },
-            "size": 10,  # Máximo 10 documentos para el sample
-            "sort": [
-                {"created_at": {"order": "desc"}}  # Más recientes primero
-            ]
-        }
+        # Índice donde está ubicado el tenant (propio o compartido por niveles)
+        placement = get_placement(opensearch_client, tenant_id)
+        index_name = placement["index"]
         
-        # Buscar en todos los índices que pueden contener documentos del tenant
-        # Patrón: rag-documents-*
-        index_pattern = "rag-documents-*"
+        print(f"🔎 Ejecutando búsqueda en índice: {index_name} (nivel {placement['tier']})")
         
-        print(f"🔎 Ejecutando búsqueda en patrón: {index_pattern}")
-        
-        # Ejecutar búsqueda
-        response = opensearch_client.search(
-            index=index_pattern,
-            body=search_query
-        )
+        index_metadata = get_index_metadata(opensearch_client, index_name)
+        response = {}
+        if index_metadata["exists"]:
+            try:
+                response = opensearch_client.search(
+                    index=index_name,
+                    body=build_verify_query(tenant_id, page_size, cursor, source_file, document_type)
+                )
+            except Exception as e:
+                if not is_index_not_found(e):
+                    raise
         
         hits = response.get('hits', {})
-        total_hits = hits.get('total', {}).get('value', 0)
         documents = hits.get('hits', [])
+        embedding_dimensions = (index_metadata.get("vector") or {}).get("dimension")
         
-        print(f"📈 Encontrados {total_hits} documentos para tenant {tenant_id}")
-        
-        # Analizar índices únicos
-        unique_indexes = set()
         document_samples = []
-        
         for doc in documents:
-            # Índice donde está almacenado
-            unique_indexes.add(doc['_index'])
-            
-            # Preparar sample del documento
             source = doc['_source']
+            content = source.get('content', '')
             document_samples.append({
                 "document_id": doc['_id'],
                 "document_hash": source.get('document_hash', 'N/A'),
                 "source_file": source.get('source_file', 'N/A'),
                 "document_type": source.get('document_type', 'N/A'),
                 "file_format": source.get('file_format', 'N/A'),
+                "content_type": source.get('content_type', 'N/A'),
                 "chunk_index": source.get('chunk_index', 0),
-                "content_preview": source.get('content', '')[:150] + '...' if len(source.get('content', '')) > 150 else source.get('content', ''),
-                "embedding_dimensions": len(source.get('embedding', [])),
+                "content_preview": content[:150] + '...' if len(content) > 150 else content,
+                "embedding_dimensions": embedding_dimensions,
                 "created_at": source.get('created_at', 'N/A')
             })
         
-        # Preparar respuesta
+        next_cursor = None
+        if len(documents) == page_size and documents and documents[-1].get('sort'):
+            next_cursor = encode_cursor(documents[-1]['sort'])
+        
         verification_result = {
             "tenant_id": tenant_id,
-            "total_documents": total_hits,
-            "indexes": list(unique_indexes),
+            "indexes": [index_name] if index_metadata["exists"] else [],
+            "embedding_dimensions": embedding_dimensions,
             "sample_documents": document_samples,
+            "next_cursor": next_cursor,
             "statistics": {
-                "unique_indexes_count": len(unique_indexes),
+                "unique_indexes_count": 1 if index_metadata["exists"] else 0,
                 "documents_shown": len(document_samples),
-                "search_pattern": index_pattern
-            },
-            "status": "success" if total_hits > 0 else "no_documents_found"
+                "index_searched": index_name,
+                "placement_tier": placement["tier"],
+                "shared_index": placement["shared"]
+            }
         }
         
+        if cursor is None:
+            total_hits = hits.get('total', {}).get('value', 0)
+            aggregations = response.get('aggregations', {})
+            verification_result["total_documents"] = total_hits
+            verification_result["breakdown"] = {
+                field: {
+                    "buckets": [
+                        {"key": bucket["key"], "count": bucket["doc_count"]}
+                        for bucket in aggregations.get(field, {}).get('buckets', [])
+                    ],
+                    "other_count": aggregations.get(field, {}).get('sum_other_doc_count', 0)
+                }
+                for field in BREAKDOWN_FIELDS
+            }
+            verification_result["statistics"]["unique_files_count"] = aggregations.get('unique_files', {}).get('value', 0)
+            verification_result["statistics"]["last_indexed_at"] = aggregations.get('last_indexed_at', {}).get('value_as_string')
+            verification_result["status"] = "success" if total_hits > 0 else "no_documents_found"
+            print(f"📈 Encontrados {total_hits} documentos para tenant {tenant_id}")
+        else:
+            verification_result["status"] = "success"
+        
         return verification_result
         
     except Exception as e:
@@ -147,4 +265,4 @@ def verify_tenant_documents(tenant_id: str, opensearch_client):
             "tenant_id": tenant_id,
             "error": f"Error buscando documentos: {str(e)}",
             "status": "error"
-        }
\ No newline at end of file
+        }
@@ -8,6 +8,8 @@ from aws_cdk import (
     aws_iam as iam,
     aws_opensearchserverless as opensearchserverless,
     aws_s3_notifications as s3n, 
+    aws_apigatewayv2 as apigatewayv2,
+    aws_apigatewayv2_integrations as apigatewayv2_integrations,
     CfnOutput
 )
 from aws_cdk.aws_lambda_python_alpha import PythonFunction, PythonLayerVersion
@@ -15,6 +17,8 @@ from constructs import Construct
 import json 
 from nuevorag.resources.create_lambdas import create_test_lambda, create_process_lambda, create_upload_lambda, create_verify_lambda, create_query_lambda
 from nuevorag.resources.create_opensearch import create_opensearch
+from nuevorag.resources.create_queues import create_ingest_queue
+from nuevorag.resources.create_state_machines import create_fanout_state_machine
 from nuevorag.resources.layers import create_langchain_layer
 
 class NuevoragStack(Stack):
@@ -28,17 +32,30 @@ class NuevoragStack(Stack):
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[
+                # Entradas de caché de embeddings sin uso se eliminan solas
+                s3.LifecycleRule(prefix="embedding-cache/", expiration=Duration.days(180)),
+                # Respuestas de /query: el TTL real lo aplica la Lambda, esto solo limpia restos
+                s3.LifecycleRule(prefix="query-cache/answers/", expiration=Duration.days(2)),
+                # Manifiestos y resultados de segmentos del fan-out de PDFs grandes
+                s3.LifecycleRule(prefix="fanout-jobs/", expiration=Duration.days(7))
+            ]
         )
 
         test_lambda = create_test_lambda(self, stack_variables['prefix'], langchain_layer)
         
-        process_lambda = create_process_lambda(self, stack_variables['prefix'], langchain_layer, None)
+        process_lambda = create_process_lambda(self, stack_variables['prefix'], langchain_layer, None, bucket)
         
-        verify_lambda = create_verify_lambda(self, stack_variables['prefix'], langchain_layer)
+        verify_lambda = create_verify_lambda(self, stack_variables['prefix'], langchain_layer, bucket)
         
-        query_lambda = create_query_lambda(self, stack_variables['prefix'], langchain_layer)
+        query_lambda = create_query_lambda(self, stack_variables['prefix'], langchain_layer, bucket)
         
-        vector_collection = create_opensearch(self, stack_variables['prefix'], process_lambda.role, verify_lambda.role, query_lambda.role)
+        query_stream_lambda = create_query_lambda(self, stack_variables['prefix'], langchain_layer, bucket, streaming=True)
+        
+        vector_collection = create_opensearch(
+            self, stack_variables['prefix'], process_lambda.role, verify_lambda.role, query_lambda.role,
+            extra_roles=[query_stream_lambda.role]
+        )
         
         process_lambda.add_environment("OPENSEARCH_ENDPOINT", f"https://{vector_collection.attr_collection_endpoint}")
         
@@ -48,10 +65,20 @@ class NuevoragStack(Stack):
         
         query_lambda.add_environment("OPENSEARCH_ENDPOINT", f"https://{vector_collection.attr_collection_endpoint}")
         
+        query_stream_lambda.add_environment("OPENSEARCH_ENDPOINT", f"https://{vector_collection.attr_collection_endpoint}")
+        
+
+        # Las subidas se encolan: la Lambda de proceso consume lotes con concurrencia acotada
+        ingest_queue, ingest_dlq = create_ingest_queue(self, stack_variables['prefix'], process_lambda, stack_variables)
+
+        # PDFs largos: se reparten por rangos de páginas entre invocaciones paralelas
+        fanout_state_machine = create_fanout_state_machine(
+            self, stack_variables['prefix'], process_lambda, bucket, stack_variables, dead_letter_queue=ingest_dlq
+        )
 
         bucket.add_event_notification(
             s3.EventType.OBJECT_CREATED,
-            s3n.LambdaDestination(process_lambda),
+            s3n.SqsDestination(ingest_queue),
             s3.NotificationKeyFilter(prefix="uploads/") 
         )
 
@@ -93,6 +120,24 @@ class NuevoragStack(Stack):
                 }
             }])
 
+        # /query en streaming: la API REST bufferiza la respuesta y corta a los 29 s,
+        # así que los tokens se empujan por WebSocket mientras Nova Pro genera
+        query_stream_integration = apigatewayv2_integrations.WebSocketLambdaIntegration(
+            f"{stack_variables['prefix']}-QueryStreamIntegration", query_stream_lambda
+        )
+        websocket_api = apigatewayv2.WebSocketApi(self, f"{stack_variables['prefix']}-QueryStreamApi",
+            connect_route_options=apigatewayv2.WebSocketRouteOptions(integration=query_stream_integration),
+            disconnect_route_options=apigatewayv2.WebSocketRouteOptions(integration=query_stream_integration),
+            default_route_options=apigatewayv2.WebSocketRouteOptions(integration=query_stream_integration)
+        )
+        websocket_api.add_route("query", integration=query_stream_integration)
+        websocket_stage = apigatewayv2.WebSocketStage(self, f"{stack_variables['prefix']}-QueryStreamStage",
+            web_socket_api=websocket_api,
+            stage_name="prod",
+            auto_deploy=True
+        )
+        websocket_api.grant_manage_connections(query_stream_lambda)
+
         CfnOutput(self, "ApiUrl",
             value=api.url,
             description="URL base del API Gateway"
@@ -118,11 +163,31 @@ class NuevoragStack(Stack):
             description="URL del endpoint /query para consultas RAG"
         )
         
+        CfnOutput(self, "QueryStreamEndpoint",
+            value=websocket_stage.url,
+            description="WebSocket de /query en streaming - enviar {\"action\": \"query\", ...}"
+        )
+        
         CfnOutput(self, "ProcessLambdaName",
             value=process_lambda.function_name,
             description="Nombre de la función Lambda que procesa archivos S3"
         )
         
+        CfnOutput(self, "IngestQueueUrl",
+            value=ingest_queue.queue_url,
+            description="Cola SQS de ingesta (notificaciones de uploads/)"
+        )
+        
+        CfnOutput(self, "IngestDLQUrl",
+            value=ingest_dlq.queue_url,
+            description="Archivos que fallaron tras todos los reintentos"
+        )
+        
+        CfnOutput(self, "FanoutStateMachineArn",
+            value=fanout_state_machine.state_machine_arn,
+            description="Step Functions que procesa PDFs largos por segmentos de páginas"
+        )
+        
         CfnOutput(self, "S3BucketName",
             value=bucket.bucket_name,
             description="Nombre del bucket S3 (sube archivos a la carpeta uploads/)"
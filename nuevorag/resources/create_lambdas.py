@@ -1,5 +1,6 @@
 from aws_cdk import (
     Duration,  
+    Size,
     aws_lambda as lambda_,
     aws_iam as iam,
 )
@@ -34,13 +35,61 @@ def create_test_lambda(app, prefix, layer):
     return test_lambda
 
 
-def create_process_lambda(app, prefix, layer, opensearch_collection):
+def configure_embedding_cache(function, bucket):
+    """
+    Activa la caché persistente de embeddings en S3 bajo el prefijo embedding-cache/
+    """
+    function.add_environment("EMBEDDING_CACHE_BACKEND", "s3")
+    function.add_environment("EMBEDDING_CACHE_BUCKET", bucket.bucket_name)
+    function.add_environment("EMBEDDING_CACHE_PREFIX", "embedding-cache/")
+    bucket.grant_read_write(function, "embedding-cache/*")
+
+
+def configure_query_cache(function, bucket):
+    """
+    Caché de respuestas de /query y versiones de índice por tenant bajo query-cache/
+    """
+    function.add_environment("QUERY_CACHE_BUCKET", bucket.bucket_name)
+    function.add_environment("QUERY_CACHE_PREFIX", "query-cache/")
+    bucket.grant_read_write(function, "query-cache/*")
+
+
+def configure_index_placement(function, bucket, read_only=False):
+    """
+    Modo de tenencia de índices y ubicación de cada tenant bajo index-placement/
+
+    Debe aplicarse igual a todas las Lambdas que leen o escriben en OpenSearch.
+    """
+    function.add_environment("TENANCY_MODE", "dedicated")       # dedicated o shared (overridable por tenant)
+    function.add_environment("SHARED_INDEX_PROFILE", "faiss-fp32")  # Perfil de los índices compartidos (filtrado eficiente)
+    function.add_environment("PLACEMENT_BUCKET", bucket.bucket_name)
+    function.add_environment("PLACEMENT_PREFIX", "index-placement/")
+    if read_only:
+        bucket.grant_read(function, "index-placement/*")
+    else:
+        bucket.grant_read_write(function, "index-placement/*")
+
+
+def create_process_lambda(app, prefix, layer, opensearch_collection, cache_bucket=None):
     """
     Crea la Lambda para procesar archivos subidos a S3
     """
     
     # Environment variables - se agregará OPENSEARCH_ENDPOINT después si es necesario
-    env_vars = {}
+    env_vars = {
+        "EMBEDDING_CONCURRENCY": "8",  # Peticiones simultáneas a Bedrock por invocación
+        "INGEST_BATCH_SIZE": "64",     # Chunks por lote embed → bulk en la ingesta en streaming
+        "PDF_EXTRACTION_WORKERS": "auto",  # Procesos de extracción: 'auto' = vCPUs disponibles
+        "PDF_EXTRACTOR": "pypdf2",         # Backend de extracción: pypdf2, pypdfium2 o pdfminer
+        "S3_READ_MODE": "ranged",          # ranged: GETs por rangos desde S3; download: copia a /tmp
+        "S3_BLOCK_SIZE": str(1024 * 1024), # Bytes por GET por rangos
+        "INDEX_PROFILE": "default",        # Perfil de índices nuevos: default, faiss-fp32, faiss-fp16, faiss-byte, compact
+        "IMAGE_REKOGNITION_MAX_SIDE": "1920",  # Lado mayor (px) de las imágenes enviadas a Rekognition
+        "IMAGE_EMBEDDING_MAX_SIDE": "1024",    # Lado mayor (px) de las imágenes enviadas a Titan
+        "IMAGE_MICROBATCH_MAX_BYTES": str(5 * 1024 * 1024),  # Imágenes de un lote hasta este tamaño comparten pool
+        "IMAGE_MICROBATCH_CONCURRENCY": "8",   # Imágenes del micro-lote en vuelo a la vez
+        "SPREADSHEET_ROWS_PER_CHUNK": "50"     # Filas de Excel/CSV por chunk (cada chunk repite la cabecera)
+    }
     if opensearch_collection:
         env_vars["OPENSEARCH_ENDPOINT"] = f"https://{opensearch_collection.attr_collection_endpoint}"
     
@@ -52,6 +101,7 @@ def create_process_lambda(app, prefix, layer, opensearch_collection):
         layers=[layer],    
         timeout=Duration.minutes(15),  # Más tiempo para procesamiento
         memory_size=2048,              # Más memoria para procesar archivos grandes
+        ephemeral_storage_size=Size.gibibytes(2),  # PDFs grandes se descargan a /tmp
         environment=env_vars
     )
 
@@ -125,6 +175,11 @@ def create_process_lambda(app, prefix, layer, opensearch_collection):
             )
         )
 
+    if cache_bucket:
+        configure_embedding_cache(process_lambda, cache_bucket)
+        configure_query_cache(process_lambda, cache_bucket)
+        configure_index_placement(process_lambda, cache_bucket)
+
     return process_lambda
 
 
@@ -167,7 +222,7 @@ def create_upload_lambda(app, prefix, layer, bucket):
     return upload_lambda
 
 
-def create_verify_lambda(app, prefix, layer):
+def create_verify_lambda(app, prefix, layer, cache_bucket=None):
 
     verify_lambda = PythonFunction(app, f"{prefix}-VerifyLambda",
         runtime=lambda_.Runtime.PYTHON_3_12,
@@ -192,21 +247,38 @@ def create_verify_lambda(app, prefix, layer):
         )
     )
 
+    if cache_bucket:
+        configure_index_placement(verify_lambda, cache_bucket, read_only=True)
+
     return verify_lambda
 
 
-def create_query_lambda(app, prefix, layer):
+def create_query_lambda(app, prefix, layer, cache_bucket=None, streaming=False):
+    """
+    Crea la Lambda de /query; con streaming=True la variante WebSocket que envía tokens según llegan
+    """
 
-    query_lambda = PythonFunction(app, f"{prefix}-QueryLambda",
+    query_lambda = PythonFunction(app, f"{prefix}-QueryStreamLambda" if streaming else f"{prefix}-QueryLambda",
         runtime=lambda_.Runtime.PYTHON_3_12,
         entry="functions",  
         handler="lambda_handler",    
-        index="query.py",           
+        index="query_stream.py" if streaming else "query.py",
         layers=[layer],    
         timeout=Duration.minutes(2),   
         memory_size=1024,              
         environment={
             # Se agregará OPENSEARCH_ENDPOINT en el stack principal
+            "SEMANTIC_CACHE_THRESHOLD": "0.92",     # Similitud coseno mínima para reutilizar una respuesta
+            "SEMANTIC_CACHE_MAX_ENTRIES": "512",    # Preguntas recordadas por tenant y contenedor
+            "SEMANTIC_CACHE_MAX_AGE_SECONDS": "3600",
+            "SEMANTIC_CACHE_MAX_TENANTS": "64",     # Tenants con caché semántica en memoria (LRU)
+            "RETRIEVAL_MODE": "hybrid",             # knn o hybrid (BM25 + kNN); overridable por tenant
+            "HYBRID_FUSION": "rrf",                 # rrf o weighted
+            "MMR_LAMBDA": "0.7",                    # 1 = solo relevancia, 0 = solo diversidad
+            "MMR_FETCH_K": "20",                    # Candidatos recuperados antes de diversificar
+            "CONTEXT_TOP_K": "5",                   # Chunks que llegan al contexto del LLM
+            "CONTEXT_TOKEN_BUDGET": "2000",         # Tokens de entrada máximos para el contexto
+            "INDEX_PROFILE": "default"              # Debe coincidir con el de la Lambda de proceso
         }
     )
 
@@ -225,6 +297,7 @@ def create_query_lambda(app, prefix, layer):
             effect=iam.Effect.ALLOW,
             actions=[
                 "bedrock:InvokeModel",
+                "bedrock:InvokeModelWithResponseStream",
                 "bedrock:ListFoundationModels",
                 "bedrock:GetFoundationModel"
             ],
@@ -232,4 +305,10 @@ def create_query_lambda(app, prefix, layer):
         )
     )
 
+    if cache_bucket:
+        configure_embedding_cache(query_lambda, cache_bucket)
+        configure_query_cache(query_lambda, cache_bucket)
+        configure_index_placement(query_lambda, cache_bucket, read_only=True)
+        query_lambda.add_environment("QUERY_CACHE_TTL_SECONDS", "3600")
+
     return query_lambda
\ No newline at end of file
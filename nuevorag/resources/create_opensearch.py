@@ -3,7 +3,7 @@ from aws_cdk import (
 )
 import json
 
-def create_opensearch(app, prefix, process_lambda_role, verify_lambda_role=None, query_lambda_role=None):
+def create_opensearch(app, prefix, process_lambda_role, verify_lambda_role=None, query_lambda_role=None, extra_roles=None):
 
     network_policy = opensearchserverless.CfnSecurityPolicy(
         app, f"{prefix}-network-policy",
@@ -45,6 +45,8 @@ def create_opensearch(app, prefix, process_lambda_role, verify_lambda_role=None,
         principals.append(verify_lambda_role.role_arn)
     if query_lambda_role:
         principals.append(query_lambda_role.role_arn)
+    for role in extra_roles or []:
+        principals.append(role.role_arn)
     
     data_access_policy = opensearchserverless.CfnAccessPolicy(
         app, f"{prefix}-data-access-policy",
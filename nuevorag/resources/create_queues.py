@@ -0,0 +1,54 @@
+from aws_cdk import (
+    Duration,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_event_sources,
+)
+
+
+# Valores por defecto de la ingesta encolada; se pueden cambiar desde stack_variables
+INGEST_QUEUE_DEFAULTS = {
+    "ingest_batch_size": 4,             # Mensajes (archivos) por invocación
+    "ingest_batching_window_seconds": 10,
+    "ingest_max_concurrency": 10,       # Invocaciones simultáneas como máximo (mínimo 2)
+    "ingest_max_receive_count": 3       # Intentos antes de mandar el mensaje a la DLQ
+}
+
+
+def create_ingest_queue(app, prefix, process_lambda, stack_variables=None):
+    """
+    Cola SQS entre las notificaciones de S3 y la Lambda de proceso, con DLQ
+
+    Una subida masiva se drena a ritmo constante (lotes de tamaño fijo y
+    concurrencia máxima) en lugar de lanzar una Lambda por archivo.
+    """
+    settings = {**INGEST_QUEUE_DEFAULTS, **{
+        key: value for key, value in (stack_variables or {}).items() if key in INGEST_QUEUE_DEFAULTS
+    }}
+
+    dead_letter_queue = sqs.Queue(app, f"{prefix}-IngestDLQ",
+        retention_period=Duration.days(14)
+    )
+
+    ingest_queue = sqs.Queue(app, f"{prefix}-IngestQueue",
+        # AWS recomienda 6 veces el timeout de la función para no re-entregar lotes en curso
+        visibility_timeout=Duration.seconds(6 * process_lambda.timeout.to_seconds()),
+        retention_period=Duration.days(4),
+        dead_letter_queue=sqs.DeadLetterQueue(
+            max_receive_count=settings["ingest_max_receive_count"],
+            queue=dead_letter_queue
+        )
+    )
+
+    process_lambda.add_event_source(lambda_event_sources.SqsEventSource(ingest_queue,
+        batch_size=settings["ingest_batch_size"],
+        max_batching_window=Duration.seconds(settings["ingest_batching_window_seconds"]),
+        max_concurrency=settings["ingest_max_concurrency"],
+        report_batch_item_failures=True
+    ))
+    # Mensajes de un lote procesados a la vez dentro de cada invocación
+    process_lambda.add_environment("INGEST_RECORD_CONCURRENCY", str(settings["ingest_batch_size"]))
+    # La promoción de tenants de nivel se encola aquí por pasos reanudables en lugar de correr dentro de la ingesta
+    process_lambda.add_environment("PLACEMENT_MIGRATION_QUEUE_URL", ingest_queue.queue_url)
+    ingest_queue.grant_send_messages(process_lambda)
+
+    return ingest_queue, dead_letter_queue
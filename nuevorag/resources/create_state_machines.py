@@ -0,0 +1,133 @@
+from aws_cdk import (
+    ArnFormat,
+    Duration,
+    Stack,
+    aws_iam as iam,
+    aws_stepfunctions as sfn,
+    aws_stepfunctions_tasks as tasks,
+)
+
+
+# Valores por defecto del fan-out de PDFs grandes; se pueden cambiar desde stack_variables
+FANOUT_DEFAULTS = {
+    "fanout_min_pages": 150,          # PDFs más cortos se procesan en una sola invocación
+    "fanout_pages_per_segment": 50,   # Páginas por worker
+    "fanout_max_concurrency": 10      # Segmentos en paralelo por documento
+}
+
+
+def create_fanout_state_machine(app, prefix, process_lambda, bucket, stack_variables=None, dead_letter_queue=None):
+    """
+    Máquina de estados del fan-out: Map con un worker por segmento de páginas y después el finalizador
+
+    Los tres papeles (coordinador, worker, finalizador) los cumple la misma Lambda
+    de proceso; los estados la invocan con {"fanout_stage": ...}. El estado de
+    cada trabajo vive en S3 bajo fanout-jobs/. Si el Map o el finalizador fallan
+    tras sus reintentos, el intento se marca como fallido y el PDF va a la DLQ de ingesta.
+    """
+    settings = {**FANOUT_DEFAULTS, **{
+        key: value for key, value in (stack_variables or {}).items() if key in FANOUT_DEFAULTS
+    }}
+    state_machine_name = f"{prefix}-PdfFanout"
+
+    segment_task = tasks.LambdaInvoke(app, f"{prefix}-FanoutSegment",
+        lambda_function=process_lambda,
+        payload=sfn.TaskInput.from_object({
+            "fanout_stage": "segment",
+            "job_id": sfn.JsonPath.string_at("$.job_id"),
+            "segment": sfn.JsonPath.number_at("$.segment")
+        }),
+        payload_response_only=True,
+        result_path=sfn.JsonPath.DISCARD
+    )
+    # Throttling de Bedrock o un timeout puntual: el segmento es idempotente y se repite entero
+    segment_task.add_retry(
+        errors=["States.ALL"],
+        interval=Duration.seconds(30),
+        max_attempts=2,
+        backoff_rate=2
+    )
+
+    segments_map = sfn.Map(app, f"{prefix}-FanoutSegments",
+        items_path="$.segments",
+        item_selector={
+            "job_id": sfn.JsonPath.string_at("$.job_id"),
+            "segment": sfn.JsonPath.number_at("$$.Map.Item.Value")
+        },
+        max_concurrency=settings["fanout_max_concurrency"],
+        result_path=sfn.JsonPath.DISCARD
+    )
+    segments_map.item_processor(segment_task)
+
+    finalize_task = tasks.LambdaInvoke(app, f"{prefix}-FanoutFinalize",
+        lambda_function=process_lambda,
+        payload=sfn.TaskInput.from_object({
+            "fanout_stage": "finalize",
+            "job_id": sfn.JsonPath.string_at("$.job_id")
+        }),
+        payload_response_only=True
+    )
+    finalize_task.add_retry(
+        errors=["States.ALL"],
+        interval=Duration.seconds(30),
+        max_attempts=2,
+        backoff_rate=2
+    )
+
+    failed_task = tasks.LambdaInvoke(app, f"{prefix}-FanoutMarkFailed",
+        lambda_function=process_lambda,
+        payload=sfn.TaskInput.from_object({
+            "fanout_stage": "failed",
+            "job_id": sfn.JsonPath.string_at("$.job_id"),
+            "execution": sfn.JsonPath.string_at("$$.Execution.Name"),
+            "error": sfn.JsonPath.object_at("$.error")
+        }),
+        payload_response_only=True,
+        result_path=sfn.JsonPath.DISCARD
+    )
+    failed_task.add_retry(
+        errors=["States.ALL"],
+        interval=Duration.seconds(10),
+        max_attempts=3,
+        backoff_rate=2
+    )
+    # La ejecución termina en error igualmente: visible en la consola y en las métricas ExecutionsFailed
+    failed_task.next(sfn.Fail(app, f"{prefix}-FanoutFailed", error="FanoutFailed", cause="Fan-out de PDF fallido"))
+
+    segments_map.add_catch(failed_task, errors=["States.ALL"], result_path="$.error")
+    finalize_task.add_catch(failed_task, errors=["States.ALL"], result_path="$.error")
+
+    state_machine = sfn.StateMachine(app, f"{prefix}-FanoutStateMachine",
+        state_machine_name=state_machine_name,
+        definition_body=sfn.DefinitionBody.from_chainable(segments_map.next(finalize_task)),
+        timeout=Duration.hours(6)
+    )
+
+    # ARN construido a partir del nombre: la Lambda arranca la máquina y la máquina
+    # invoca la Lambda, referenciar state_machine_arn crearía una dependencia circular
+    state_machine_arn = Stack.of(app).format_arn(
+        service="states",
+        resource="stateMachine",
+        resource_name=state_machine_name,
+        arn_format=ArnFormat.COLON_RESOURCE_NAME
+    )
+    process_lambda.add_environment("FANOUT_MODE", "stepfunctions")
+    process_lambda.add_environment("FANOUT_STATE_MACHINE_ARN", state_machine_arn)
+    process_lambda.add_environment("FANOUT_MIN_PAGES", str(settings["fanout_min_pages"]))
+    process_lambda.add_environment("FANOUT_PAGES_PER_SEGMENT", str(settings["fanout_pages_per_segment"]))
+    process_lambda.add_environment("FANOUT_BUCKET", bucket.bucket_name)
+    process_lambda.add_environment("FANOUT_PREFIX", "fanout-jobs/")
+    process_lambda.add_environment("FANOUT_EXECUTION_TIMEOUT_SECONDS", str(6 * 3600))
+    if dead_letter_queue:
+        process_lambda.add_environment("INGEST_DLQ_URL", dead_letter_queue.queue_url)
+        dead_letter_queue.grant_send_messages(process_lambda)
+    bucket.grant_read_write(process_lambda, "fanout-jobs/*")
+    process_lambda.add_to_role_policy(
+        iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["states:StartExecution"],
+            resources=[state_machine_arn]
+        )
+    )
+
+    return state_machine
@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# Las Lambdas importan sus módulos como helpers.x con functions/ como raíz (igual que en el paquete desplegado)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'functions'))
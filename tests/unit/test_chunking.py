@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from helpers.chunking import estimate_tokens, iter_text_chunks, normalize_text, split_text
+
+
+WORDS = "el contrato cliente factura importe vencimiento cláusula servicio proveedor 2024 3,5 % S.A. anexo".split()
+
+
+def synthetic_pages(pages=30, seed=3):
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        paragraphs = []
+        for _ in range(rng.randint(2, 5)):
+            sentences = [
+                ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 30))).capitalize() + rng.choice('.?!')
+                for _ in range(rng.randint(1, 6))
+            ]
+            paragraphs.append(' '.join(sentences))
+        result.append(normalize_text(f"Página {page + 1}.\n" + '\n\n'.join(paragraphs)))
+    return result
+
+
+def test_normalize_text_keeps_structure():
+    text = "Primera  línea\t con espacios\r\ninfor-\nmación\n\n\n\nOtro párrafo\x00"
+    assert normalize_text(text) == "Primera línea con espacios\ninformación\n\nOtro párrafo"
+
+
+def test_normalize_text_keeps_standalone_hyphen():
+    assert normalize_text("lista:\n-\nnada") == "lista:\n-\nnada"
+
+
+def test_split_text_offsets_match_source():
+    text = '\n'.join(synthetic_pages())
+    chunks = split_text(text, 200, 40)
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk.text
+        assert chunk.tokens == estimate_tokens(chunk.text)
+
+
+def test_split_text_respects_chunk_size_and_overlaps():
+    text = '\n'.join(synthetic_pages())
+    chunks = split_text(text, 200, 40)
+    assert all(chunk.tokens <= 200 for chunk in chunks)
+    for previous, following in zip(chunks, chunks[1:]):
+        # El siguiente empieza dentro del anterior (solape literal) o justo después
+        assert previous.start < following.start <= previous.end + 2
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(text)
+
+
+def test_split_text_without_overlap_covers_text_once():
+    text = '\n'.join(synthetic_pages(10))
+    chunks = split_text(text, 150, 0)
+    for previous, following in zip(chunks, chunks[1:]):
+        assert following.start >= previous.end
+
+
+def test_split_text_cuts_long_sentence_at_words():
+    text = ' '.join(['palabra'] * 2000)
+    chunks = split_text(text, 100, 10)
+    assert len(chunks) > 10
+    assert all(chunk.tokens <= 100 for chunk in chunks)
+    assert all(not chunk.text.startswith(' ') and not chunk.text.endswith(' ') for chunk in chunks)
+
+
+def test_split_text_empty():
+    assert split_text('', 100, 10) == []
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(50, 10), (200, 40), (400, 0)])
+def test_iter_text_chunks_matches_whole_document(chunk_size, chunk_overlap):
+    pages = synthetic_pages(40)
+    whole = split_text('\n'.join(pages), chunk_size, chunk_overlap)
+    streamed = list(iter_text_chunks(pages, chunk_size, chunk_overlap))
+    assert streamed == whole
+
+
+def test_iter_text_chunks_skips_empty_pieces():
+    pages = synthetic_pages(5)
+    with_blanks = [pages[0], '', pages[1], '', '', *pages[2:]]
+    assert list(iter_text_chunks(with_blanks, 80, 10)) == split_text('\n'.join(pages), 80, 10)
+
+
+def test_iter_text_chunks_custom_token_counter():
+    pages = synthetic_pages(8)
+
+    def count_words(text):
+        return len(text.split())
+
+    streamed = list(iter_text_chunks(pages, 60, 10, count_tokens=count_words))
+    assert streamed == split_text('\n'.join(pages), 60, 10, count_tokens=count_words)
+    assert all(count_words(chunk.text) <= 60 for chunk in streamed)
@@ -0,0 +1,92 @@
+from helpers.chunking import estimate_tokens
+from helpers.context_packing import ELISION, merge_adjacent_passages, pack_context, truncate_to_budget
+
+
+def document(content, source_file='a.pdf', chunk_index=0, score=1.0):
+    return {"content": content, "source_file": source_file, "chunk_index": chunk_index, "score": score}
+
+
+def test_everything_fits_is_kept_in_order():
+    content = "El contrato vence en marzo. El importe es de 300 euros. La firma fue en Madrid."
+    packed = pack_context("cuándo vence el contrato", [document(content)], 2000)
+    assert packed["context"] == f"[Documento 1]: {content}"
+    assert packed["passages"] == 1
+
+
+def test_keeps_most_relevant_sentences_with_elision():
+    sentences = [f"Frase de relleno número {i} sin interés alguno." for i in range(40)]
+    sentences[25] = "El plazo de garantía es de dos años."
+    packed = pack_context("plazo de garantía", [document(' '.join(sentences))], 30)
+
+    assert "El plazo de garantía es de dos años." in packed["context"]
+    assert packed["packed_tokens"] < packed["original_tokens"]
+    assert ELISION in packed["context"]
+
+
+def test_every_passage_keeps_its_best_sentence():
+    documents = [
+        document("Pago mensual. " * 50 + "El pago se hace por transferencia.", 'a.pdf', score=0.9),
+        document("Otro documento. El pago admite tarjeta.", 'b.pdf', score=0.5),
+    ]
+    packed = pack_context("cómo es el pago", documents, 60)
+    assert packed["passages"] == 2
+    assert "[Documento 2]:" in packed["context"]
+
+
+def test_sentence_longer_than_budget_is_truncated():
+    packed = pack_context('que es palabra', [document('palabra ' * 3000)], 2000)
+
+    assert packed["passages"] == 1
+    assert packed["context"].endswith(ELISION)
+    assert estimate_tokens(packed["context"]) <= 2000 + estimate_tokens("[Documento 1]: ")
+
+
+def test_truncated_sentence_leaves_room_for_other_passages():
+    documents = [
+        document('palabra ' * 3000, 'a.pdf', score=1.0),
+        document('Otra palabra corta.', 'b.pdf', score=0.5),
+    ]
+    packed = pack_context('que es palabra', documents, 2000)
+
+    assert packed["passages"] == 2
+    assert packed["context"].endswith("Otra palabra corta.")
+    # Lo que no usa el segundo pasaje vuelve a la frase recortada
+    assert packed["packed_tokens"] > 1900
+
+
+def test_tiny_budget_does_not_emit_fragments():
+    packed = pack_context('palabra', [document('palabra ' * 3000)], 20)
+    assert packed["context"] == ''
+    assert packed["passages"] == 0
+
+
+def test_no_documents():
+    packed = pack_context('algo', [], 2000)
+    assert packed["context"] == '' and packed["original_tokens"] == 0
+
+
+def test_truncate_to_budget_cuts_at_word_boundary():
+    truncated = truncate_to_budget('uno dos tres cuatro cinco seis siete ocho', 5)
+    assert truncated.endswith(f" {ELISION}")
+    assert estimate_tokens(truncated) <= 5
+    assert truncated[:-len(ELISION) - 1].split(' ')[-1] in 'uno dos tres cuatro cinco seis siete ocho'.split()
+
+
+def test_merge_adjacent_passages_removes_literal_overlap():
+    first = "Primera parte del texto que se solapa con la siguiente parte del documento."
+    second = "con la siguiente parte del documento. Y aquí sigue el resto."
+    passages = merge_adjacent_passages([
+        document(second, chunk_index=1, score=0.4),
+        document(first, chunk_index=0, score=0.8),
+        document("Suelto.", chunk_index=5, score=0.1),
+    ])
+
+    assert passages[0]["content"] == "Primera parte del texto que se solapa " + second
+    assert (passages[0]["first_index"], passages[0]["last_index"], passages[0]["score"]) == (0, 1, 0.8)
+    assert passages[1]["content"] == "Suelto."
+
+
+def test_truncate_to_budget_cuts_inside_a_word_without_spaces():
+    truncated = truncate_to_budget('x' * 600, 40)
+    assert truncated.startswith('x' * 100)
+    assert estimate_tokens(truncated) <= 40
@@ -0,0 +1,184 @@
+import random
+
+import pytest
+
+import helpers.fanout as fanout
+from helpers.rag_helpers import generate_chunk_id, generate_content_hash, get_source_document
+
+
+CHUNK_SIZE, CHUNK_OVERLAP = 60, 10
+TENANT = 't1'
+OBJECT_KEY = 'uploads/t1/general/doc.pdf'
+WORDS = "contrato cliente factura pago plazo servicio garantía entrega precio cláusula anexo firma".split()
+
+
+def make_pages(count, seed=5):
+    rng = random.Random(seed)
+    return [
+        f"Página {page + 1}. " + ' '.join(
+            ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 15))).capitalize() + '.'
+            for _ in range(rng.randint(3, 8))
+        )
+        for page in range(count)
+    ]
+
+
+def chunk_id(text):
+    return generate_chunk_id(TENANT, get_source_document(OBJECT_KEY), generate_content_hash(text))
+
+
+@pytest.fixture
+def fanout_job(monkeypatch):
+    """
+    Workers y finalizador reales con almacén en memoria; la extracción del PDF y
+    las llamadas a OpenSearch se sustituyen por las páginas dadas y registros de llamadas
+    """
+    calls = {"segment_chunks": [], "boundary_batches": [], "renumbered": [], "deleted": [], "ranges": []}
+    pages = []
+
+    def fake_iter_pdf_pages(source, workers=None, backend=None, start_page=0, end_page=None):
+        assert (source.bucket, source.key) == ("b", OBJECT_KEY)
+        calls["ranges"].append((start_page, end_page))
+        return iter(pages[start_page:end_page])
+
+    def fake_indexing_batches(batches, tenant_id, document_type, object_key, filename, existing_chunks=None,
+                              chunk_positions=None, finalize=True):
+        # Como opensearch_indexing_batches: chunk_positions guarda la primera aparición de cada chunk_id
+        seen = []
+        for start_index, chunks, _ in batches:
+            if chunk_positions is None:
+                calls["boundary_batches"].append((start_index, list(chunks)))
+            for index, text in enumerate(chunks, start_index):
+                seen.append(text)
+                if chunk_positions is not None:
+                    chunk_positions.setdefault(chunk_id(text), index)
+        if chunk_positions is not None:
+            calls["segment_chunks"].append(seen)
+        return {"success": True, "details": {"chunks_count": len(seen)}}
+
+    def fake_index_bulk(client, index_name, documents, tenant_id):
+        calls["renumbered"].extend(documents)
+        return True
+
+    def fake_delete_bulk(client, index_name, chunk_ids):
+        calls["deleted"].extend(chunk_ids)
+        return True
+
+    monkeypatch.setattr(fanout, '_store', fanout.MemoryFanoutStore())
+    monkeypatch.setattr(fanout, 'PDF_CHUNK_SIZE', CHUNK_SIZE)
+    monkeypatch.setattr(fanout, 'PDF_CHUNK_OVERLAP', CHUNK_OVERLAP)
+    monkeypatch.setattr(fanout, 'iter_pdf_pages', fake_iter_pdf_pages)
+    monkeypatch.setattr(fanout, 'opensearch_indexing_batches', fake_indexing_batches)
+    monkeypatch.setattr(fanout, 'embed_new_chunks', lambda chunks, known, dimensions: [None] * len(chunks))
+    monkeypatch.setattr(fanout, 'create_opensearch_client', lambda: object())
+    monkeypatch.setattr(fanout, 'get_placement', lambda client, tenant_id: {"index": f"rag-documents-{tenant_id}"})
+    monkeypatch.setattr(fanout, 'index_document_bulk', fake_index_bulk)
+    monkeypatch.setattr(fanout, 'delete_documents_bulk', fake_delete_bulk)
+    monkeypatch.setattr(fanout, 'invalidate_tenant_queries', lambda tenant_id: None)
+    monkeypatch.setattr(fanout, 'rebalance_tenant', lambda client, tenant_id: None)
+
+    def run(job_pages, segments, existing=None):
+        pages[:] = job_pages
+        store = fanout.get_fanout_store()
+        job = {
+            "job_id": "job", "mode": "local", "bucket": "b", "object_key": OBJECT_KEY, "object_size": 1,
+            "tenant_id": TENANT, "document_type": "general", "filename": "doc.pdf", "backend": "pypdf2",
+            "dimensions": 1024, "total_pages": len(job_pages), "segments": segments
+        }
+        store.put("job", 'manifest', job)
+        store.put("job", 'existing', existing or {})
+        for segment in range(len(segments)):
+            assert fanout.process_segment("job", segment)["success"]
+        assert calls["ranges"] == [tuple(pages_range) for pages_range in segments]
+        return fanout.finalize_fanout("job"), calls["segment_chunks"], calls
+
+    return run
+
+
+def test_hold_back_edges():
+    edges = {"head": '', "tail": ''}
+    assert list(fanout._hold_back_edges(['a', 'b', 'c', 'd'], edges, head=True, tail=True)) == ['b', 'c']
+    assert edges == {"head": 'a', "tail": 'd'}
+
+    edges = {"head": '', "tail": ''}
+    assert list(fanout._hold_back_edges(['a', 'b'], edges, head=False, tail=False)) == ['a', 'b']
+    assert edges == {"head": '', "tail": ''}
+
+
+def test_boundaries_are_restitched_between_segments(fanout_job):
+    pages = make_pages(12)
+    segments = [(0, 4), (4, 8), (8, 12)]
+    result, interiors, calls = fanout_job(pages, segments)
+
+    assert result["success"], result
+    assert len(calls["boundary_batches"]) == 2
+    for (start_index, chunks), left, right in zip(calls["boundary_batches"], segments, segments[1:]):
+        # Cada frontera arranca justo después de los chunks interiores ya numerados
+        assert chunks
+        assert any(f"Página {left[1]}." in chunk or f"Página {right[0] + 1}." in chunk for chunk in chunks)
+
+    first_boundary_start = calls["boundary_batches"][0][0]
+    assert first_boundary_start == len(interiors[0])
+
+
+def test_chunk_indexes_are_global_and_contiguous(fanout_job):
+    pages = make_pages(12)
+    segments = [(0, 4), (4, 8), (8, 12)]
+    result, interiors, calls = fanout_job(pages, segments)
+
+    final = {}
+    offset = 0
+    for segment, chunks in enumerate(interiors):
+        for local_index, text in enumerate(chunks):
+            final.setdefault(chunk_id(text), offset + local_index)
+        offset += len(chunks)
+        if segment < len(calls["boundary_batches"]):
+            start_index, boundary = calls["boundary_batches"][segment]
+            assert start_index == offset
+            for index, text in enumerate(boundary, offset):
+                final.setdefault(chunk_id(text), index)
+            offset += len(boundary)
+
+    assert result["details"]["chunks_count"] == offset
+    assert sorted(set(final.values())) == sorted(final.values())
+
+    # Solo se renumeran los chunks escritos con un índice local distinto del global
+    renumbered = {document["chunk_id"]: document["chunk_index"] for document in calls["renumbered"]}
+    first_segment_ids = {chunk_id(text) for text in interiors[0]}
+    assert not first_segment_ids & set(renumbered)
+    for text in interiors[1] + interiors[2]:
+        assert renumbered[chunk_id(text)] == final[chunk_id(text)]
+    assert result["details"]["chunks_renumbered"] == len(renumbered)
+
+
+def test_page_order_is_preserved_across_segments(fanout_job):
+    pages = make_pages(10)
+    segments = [(0, 5), (5, 10)]
+    _, interiors, calls = fanout_job(pages, segments)
+
+    ordered = interiors[0] + calls["boundary_batches"][0][1] + interiors[1]
+    markers = [int(word) for text in ordered for word in
+               [token.rstrip('.') for token in text.split() if token.rstrip('.').isdigit()]]
+    assert markers == sorted(markers)
+    assert set(markers) == set(range(1, 11))
+
+
+def test_stale_chunks_are_deleted(fanout_job):
+    pages = make_pages(8)
+    existing = {"obsoleto": {"content_hash": "x", "chunk_index": 0}}
+    result, interiors, calls = fanout_job(pages, [(0, 4), (4, 8)], existing)
+
+    assert calls["deleted"] == ["obsoleto"]
+    assert result["details"]["chunks_deleted"] == 1
+
+
+def test_missing_segment_fails(fanout_job, monkeypatch):
+    pages = make_pages(8)
+    store = fanout.MemoryFanoutStore()
+    original_get = store.get
+    monkeypatch.setattr(store, 'get', lambda job_id, name: None if name == 'segment-0001' else original_get(job_id, name))
+    monkeypatch.setattr(fanout, '_store', store)
+
+    result, _, _ = fanout_job(pages, [(0, 4), (4, 8)])
+    assert not result["success"]
+    assert "segmento 1" in result["message"]
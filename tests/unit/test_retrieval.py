@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from helpers.retrieval import maximal_marginal_relevance, reciprocal_rank_fusion, weighted_score_fusion
+
+
+def hits(*ids_and_scores):
+    return [{"_id": hit_id, "_score": score, "_source": {"content": hit_id}} for hit_id, score in ids_and_scores]
+
+
+def test_rrf_rewards_documents_in_both_lists():
+    knn = hits(("a", 0.9), ("b", 0.8), ("c", 0.7))
+    lexical = hits(("c", 12.0), ("a", 11.0), ("d", 3.0))
+    fused = reciprocal_rank_fusion((knn, lexical), (1.0, 1.0), k=60)
+
+    assert [hit["_id"] for hit in fused] == ["a", "c", "b", "d"]
+    assert fused[0]["_score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[1]["_score"] == pytest.approx(1 / 63 + 1 / 61)
+    # Los campos del hit original se conservan
+    assert fused[0]["_source"] == {"content": "a"}
+
+
+def test_rrf_ignores_score_scale():
+    knn = hits(("a", 0.9), ("b", 0.1))
+    lexical = hits(("b", 1000.0), ("a", 999.0))
+    fused = reciprocal_rank_fusion((knn, lexical), (1.0, 1.0))
+    assert fused[0]["_score"] == pytest.approx(fused[1]["_score"])
+
+
+def test_rrf_weights_break_ties():
+    knn = hits(("a", 0.9))
+    lexical = hits(("b", 5.0))
+    assert [hit["_id"] for hit in reciprocal_rank_fusion((knn, lexical), (1.0, 2.0))] == ["b", "a"]
+    assert [hit["_id"] for hit in reciprocal_rank_fusion((knn, lexical), (2.0, 1.0))] == ["a", "b"]
+
+
+def test_weighted_fusion_min_max_normalizes_each_list():
+    knn = hits(("a", 0.95), ("b", 0.90), ("c", 0.85))
+    lexical = hits(("c", 20.0), ("b", 10.0), ("d", 0.0))
+    fused = weighted_score_fusion((knn, lexical), (0.5, 0.5))
+    scores = {hit["_id"]: hit["_score"] for hit in fused}
+
+    assert scores["a"] == pytest.approx(0.5)
+    assert scores["b"] == pytest.approx(0.25 + 0.25)
+    assert scores["c"] == pytest.approx(0.0 + 0.5)
+    assert scores["d"] == pytest.approx(0.0)
+    assert fused[-1]["_id"] == "d"
+
+
+def test_weighted_fusion_single_hit_and_empty_list():
+    fused = weighted_score_fusion((hits(("a", 0.3)), []), (0.7, 0.3))
+    assert [(hit["_id"], hit["_score"]) for hit in fused] == [("a", pytest.approx(0.7))]
+
+
+def test_mmr_pure_relevance_orders_by_similarity():
+    query = [1.0, 0.0, 0.0]
+    candidates = np.array([[0.2, 1.0, 0.0], [1.0, 0.1, 0.0], [0.7, 0.7, 0.0]], dtype=np.float32)
+    assert maximal_marginal_relevance(query, candidates, 3, lambda_mult=1.0) == [1, 2, 0]
+
+
+def test_mmr_prefers_diverse_candidate_over_near_duplicate():
+    query = [1.0, 1.0, 0.0]
+    candidates = np.array([
+        [1.0, 0.9, 0.0],    # el más relevante
+        [1.0, 0.89, 0.0],   # casi idéntico al primero
+        [0.5, 1.0, 0.6],    # algo menos relevante pero distinto
+    ], dtype=np.float32)
+    assert maximal_marginal_relevance(query, candidates, 2, lambda_mult=1.0) == [0, 1]
+    assert maximal_marginal_relevance(query, candidates, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_drops_duplicates_above_threshold():
+    query = [1.0, 0.0]
+    candidates = np.array([[1.0, 0.0], [1.0, 0.0001], [0.0, 1.0]], dtype=np.float32)
+    assert maximal_marginal_relevance(query, candidates, 3, lambda_mult=0.7, duplicate_threshold=0.99) == [0, 2]
+
+
+def test_mmr_edge_cases():
+    assert maximal_marginal_relevance([1.0, 0.0], np.zeros((0, 2)), 3) == []
+    assert maximal_marginal_relevance([1.0, 0.0], np.array([[1.0, 0.0]]), 0) == []
+    # Vectores nulos no dividen por cero
+    assert sorted(maximal_marginal_relevance([0.0, 0.0], np.array([[0.0, 0.0], [1.0, 0.0]]), 2)) == [0, 1]